@@ -0,0 +1,141 @@
+"""
+# IRC event loop benchmark
+- Compares the old loop shape of IRC.run() (select with 10 ms timeout + 10 ms sleep)
+  against the new one (select blocking on the sockets + wake-up socket for other threads)
+- Measures:
+-- idle CPU time of the loop thread
+-- latency of inbound lines (server writes -> loop reads)
+-- latency of work queued from another thread (Discord / timers -> loop runs it)
+- Plain sockets stand in for the IRC-server connection, so the irc -library is not needed
+- Run from the repository root: python benchmarks/bench_irc_loop.py
+"""
+import collections
+import random
+import select
+import socket
+import threading
+import time
+
+IDLE_SECONDS = 3.0
+LINE_COUNT = 300
+CALL_COUNT = 300
+
+class OldLoop:
+    """ process_once(0.01) + time.sleep(0.01) - queued work is picked up on the next round """
+    def __init__(self, server_socket):
+        self.sock = server_socket
+        self.calls = collections.deque()
+        self.running = True
+
+    def call_in_loop(self, target, *arguments):
+        self.calls.append((target, arguments))
+
+    def run(self, on_line):
+        while self.running:
+            readable, w, e = select.select([self.sock], [], [], 0.01)
+            if readable:
+                read_lines(self.sock, on_line)
+            while self.calls:
+                target, arguments = self.calls.popleft()
+                target(*arguments)
+            time.sleep(0.01)
+
+class NewLoop:
+    """ select() blocks until the server socket or the wake-up socket is readable """
+    def __init__(self, server_socket):
+        self.sock = server_socket
+        self.calls = collections.deque()
+        self.running = True
+        self.wakeup_receiver, self.wakeup_sender = socket.socketpair()
+        self.wakeup_receiver.setblocking(False)
+        self.wakeup_sender.setblocking(False)
+
+    def call_in_loop(self, target, *arguments):
+        self.calls.append((target, arguments))
+        try:
+            self.wakeup_sender.send(b"\0")
+        except BlockingIOError:
+            pass
+
+    def run(self, on_line):
+        while self.running:
+            readable, w, e = select.select([self.sock, self.wakeup_receiver], [], [], 1.0)
+            if self.wakeup_receiver in readable:
+                try:
+                    while self.wakeup_receiver.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            if self.sock in readable:
+                read_lines(self.sock, on_line)
+            while self.calls:
+                target, arguments = self.calls.popleft()
+                target(*arguments)
+
+def read_lines(sock, on_line):
+    data = sock.recv(65536)
+    for line in data.split(b"\n"):
+        if line:
+            on_line(line)
+
+def percentiles(values):
+    values = sorted(values)
+    pick = lambda p: values[min(int(len(values) * p / 100), len(values) - 1)] * 1000
+    return f"p50 {pick(50):6.2f} ms  p99 {pick(99):6.2f} ms  max {values[-1] * 1000:6.2f} ms"
+
+def bench(loop_class):
+    server, client = socket.socketpair()
+    loop = loop_class(client)
+    line_latencies = []
+    call_latencies = []
+    cpu = {}
+
+    def on_line(line):
+        line_latencies.append(time.perf_counter() - float(line))
+
+    def loop_thread():
+        start_cpu = time.thread_time()
+        loop.run(on_line)
+        cpu["total"] = time.thread_time() - start_cpu
+
+    # Idle CPU : the loop with no traffic at all
+    thread = threading.Thread(target=loop_thread)
+    thread.start()
+    idle_cpu_start = {}
+    loop.call_in_loop(lambda: idle_cpu_start.setdefault("cpu", time.thread_time()))
+    time.sleep(IDLE_SECONDS)
+    idle_cpu_end = {}
+    loop.call_in_loop(lambda: idle_cpu_end.setdefault("cpu", time.thread_time()))
+    time.sleep(0.1)
+    idle_cpu = idle_cpu_end["cpu"] - idle_cpu_start["cpu"]
+
+    # Inbound lines at random intervals
+    for i in range(LINE_COUNT):
+        time.sleep(random.random() * 0.01)
+        server.send(f"{time.perf_counter()}\n".encode())
+
+    # Work queued from another thread
+    for i in range(CALL_COUNT):
+        time.sleep(random.random() * 0.01)
+        queued = time.perf_counter()
+        loop.call_in_loop(lambda queued=queued: call_latencies.append(time.perf_counter() - queued))
+
+    time.sleep(0.1)
+    loop.running = False
+    loop.call_in_loop(lambda: None)
+    thread.join()
+    server.close()
+    client.close()
+    return idle_cpu, line_latencies, call_latencies
+
+def main():
+    random.seed(3)
+    for name, loop_class in (("old (poll + sleep)", OldLoop), ("new (select + wake-up)", NewLoop)):
+        idle_cpu, line_latencies, call_latencies = bench(loop_class)
+        print(f"{name}")
+        print(f"  idle CPU      : {idle_cpu * 1000:.1f} ms over {IDLE_SECONDS:.0f} s idle")
+        print(f"  inbound line  : {percentiles(line_latencies)}")
+        print(f"  queued work   : {percentiles(call_latencies)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+# IRC -> Discord markdown benchmark
+- Translates a corpus of IRC-lines (plain chat, URLs, bold / italic / colors, odd whitespace) to Discord markdown
+- Compares the old replace-based irc_to_disc_text against the single scan ircformat.irc_to_markdown
+- Verifies first the hand written lines against their expected markdown, and counts the corpus lines the old translator
+  gives differently: it closed a '**' the user typed, left the formats open on a reset (\x0f) and turned its
+  placeholder -texts into markdown
+- Run from the repository root: python benchmarks/bench_irc_to_markdown.py
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ircformat
+
+CORPUS_SIZE = 50000
+ROUNDS = 5
+
+# Hand written lines that the bridge sees on IRC
+SAMPLE_LINES = [
+    ("hello everyone", "hello everyone"),
+    ("anyone tried the new release yet?", "anyone tried the new release yet?"),
+    ("check this out https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=1s_x", "check this out https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=1s_x"),
+    ("<https://example.org/some_page_with_underscores>", "<https://example.org/some_page_with_underscores>"),
+    ("\x02important\x02 meeting at 13:37", "**important** meeting at 13:37"),
+    ("\x1ditalic\x1d and \x02\x1dbold italic\x1d\x02", "_italic_ and **_bold italic_**"),
+    ("\x0304red text\x0f and \x0312,01blue on black\x03", "red text and blue on black"),
+    ("\x02unclosed bold", "**unclosed bold**"),
+    ("\x02bold \x1dboth\x0f plain", "**bold _both_** plain"),
+    ("**already markdown** here", "**already markdown** here"),
+    ("a lone ** stays", "a lone ** stays"),
+    ("tabs\tand  double  spaces ", "tabs and double spaces"),
+    ("hyvää huomenta kaikille 😀", "hyvää huomenta kaikille 😀"),
+    ("\x1funderline is not supported\x1f", "underline is not supported"),
+    ("a_b_c snake_case_names", "a_b_c snake_case_names"),
+    ("price: 3 * 4 = 12 *not* ***really***", "price: 3 * 4 = 12 *not* ***really***"),
+]
+
+WORDS = ["the", "bridge", "irc", "discord", "ok", "lol", "hyvää", "😀", "https://example.org/a_b", "\x02bold\x02",
+         "\x1dit\x1d", "\x0304,12col\x03", "\x0f", "*", "**", "_x_", "\t", "  "]
+
+def old_irc_to_disc_text(message):
+    """ The previous IRC.irc_to_disc_text """
+    bold_italic = 0
+    regexc = re.compile(r"\x03(\d{1,2}(,\d{1,2})?)?", re.UNICODE)
+    message = message.replace("\x1d", "\\x1d")
+    msplit = message.split()
+    for i in range(len(msplit)):
+        mi = msplit[i]
+        if mi.startswith("http") or mi.startswith("<http"):
+            msplit[i] = mi.replace("_", "pholderunderdash95130")
+    message = " ".join(msplit)
+    message = message.replace(r"\x31", "")
+    message = message.replace("\x0f", "")
+    message = message.replace(chr(2) + chr(29), "***")
+    message = message.replace(chr(29) + chr(2), "***")
+    message = message.replace(chr(2), "**")
+    if message.count(chr(29)) % 2 != 0:
+        message = f"{message} {chr(29)}"
+    message = message.replace("\\x1d", "_")
+    message = regexc.sub("", message)
+    if message.count("***") % 2 != 0:
+        message = message + "***"
+        bold_italic = 1
+    if message.count("**") % 2 != 0:
+        if bold_italic == 0:
+            message = message + "**"
+    message = message.replace("pholderunderdash95130", "_")
+    return message
+
+def make_corpus():
+    """ The sample lines, plus generated lines - mostly plain chat, every 4th line with formatting """
+    corpus = [line for line, expected in SAMPLE_LINES]
+    plain = WORDS[:9]
+    while len(corpus) < CORPUS_SIZE:
+        words = WORDS if len(corpus) % 4 == 0 else plain
+        corpus.append(" ".join(random.choice(words) for i in range(random.randint(2, 30))))
+    return corpus
+
+def bench(translate, corpus):
+    """ Returns the best time of ROUNDS translations of the corpus """
+    best = None
+    for i in range(ROUNDS):
+        begin = time.perf_counter()
+        for line in corpus:
+            translate(line)
+        elapsed = time.perf_counter() - begin
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    random.seed(42)
+    corpus = make_corpus()
+    for line, expected in SAMPLE_LINES:
+        got = ircformat.irc_to_markdown(line)
+        if got != expected:
+            print(f"Wrong output for {line!r}: {got!r} != {expected!r}")
+            sys.exit(1)
+    differing = sum(1 for line in corpus if old_irc_to_disc_text(line) != ircformat.irc_to_markdown(line))
+    print(f"{len(corpus)} lines ({differing} translated differently by the old one), best of {ROUNDS} rounds")
+
+    old_time = bench(old_irc_to_disc_text, corpus)
+    new_time = bench(ircformat.irc_to_markdown, corpus)
+    print(f"{'old irc_to_disc_text':<22} {old_time:>8.3f}s {old_time / len(corpus) * 1e6:>7.2f} us/line")
+    print(f"{'irc_to_markdown':<22} {new_time:>8.3f}s {new_time / len(corpus) * 1e6:>7.2f} us/line")
+
+if __name__ == "__main__":
+    main()
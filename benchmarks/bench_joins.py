@@ -0,0 +1,144 @@
+"""
+# Channel join benchmark
+- A local stand-in for an IRC-server (threaded sockets) registers the bridge and answers every joined channel
+  like a real server: the JOIN, the topic (332) and the NAMES (353 / 366)
+- The real bridge (ircc.IRC on its IRCLoop, with a stand-in for the Discord -side) connects to it, and joins
+  CHANNELS channel sets on the end of the MOTD: measured is the time from the end of the MOTD until the bridge has
+  handled every channel's NAMES, and the JOIN -lines the stand-in server got (TARGMAX JOIN = MAX_TARGETS)
+- The old slow-join is no longer in the code: its column is an ESTIMATE from its schedule, not a measurement
+  (a timer per channel 0.4 s apart, the 2 s sleep in on_join for every channel, a JOIN + TOPIC + WHO line per channel)
+- Run from the repository root: python benchmarks/bench_joins.py
+"""
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ircc
+import timers
+
+CHANNELS = (10, 40, 120)
+MAX_TARGETS = ""         # TARGMAX "JOIN:" = no limit (the lines are still kept within 510 bytes)
+USERS_PER_CHANNEL = 50
+TIMEOUT = 60
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInClient)
+        self.join_lines = 0
+        self.motd_ended = None   # perf_counter() when the end of the MOTD was sent
+
+class StandInClient(socketserver.StreamRequestHandler):
+    """ Registers the client (without IRCv3) and answers the JOINs """
+
+    def send(self, lines):
+        self.wfile.write(("\r\n".join(lines) + "\r\n").encode("utf-8"))
+
+    def handle(self):
+        nick = "*"
+        names = " ".join(f"user{i}" for i in range(USERS_PER_CHANNEL))
+        for raw in self.rfile:
+            words = raw.decode("utf-8", "replace").rstrip("\r\n").split(" ")
+            command = words[0].upper()
+            if command == "NICK":
+                nick = words[1]
+            elif command == "USER":
+                self.send([f":irc.local 001 {nick} :Welcome", f":irc.local 005 {nick} TARGMAX=JOIN:{MAX_TARGETS} :are supported"])
+                self.server.motd_ended = time.perf_counter()
+                self.send([f":irc.local 376 {nick} :End of MOTD"])
+            elif command == "JOIN":
+                self.server.join_lines += 1
+                replies = []
+                for channel in words[1].split(","):
+                    replies.append(f":{nick}!bot@127.0.0.1 JOIN {channel}")
+                    replies.append(f":irc.local 332 {nick} {channel} :Topic of {channel}")
+                    replies.append(f":irc.local 353 {nick} = {channel} :@{nick} {names}")
+                    replies.append(f":irc.local 366 {nick} {channel} :End of /NAMES list.")
+                self.send(replies)
+            elif command == "PING":
+                self.send([f":irc.local PONG irc.local :{words[-1].lstrip(':')}"])
+            elif command == "QUIT":
+                return
+
+class StandInDiscord:
+    """ The Discord -side of the bridge: takes everything, does nothing """
+    is_running = 1
+    last_used_channel = None
+
+    def __getattr__(self, name):
+        return lambda *arguments, **keywords: None
+
+    def get_updated_known_users(self):
+        return {}
+
+    def get_discord_channel_topic(self, *arguments):
+        return ""
+
+    def resolve_mentions(self, text):
+        return text
+
+def join_through_bridge(port, channels):
+    """ Returns (seconds from the end of the MOTD until the bridge has every channel's NAMES, JOIN -lines sent) """
+    settings = json.load(open("settings.json", encoding="utf-8"))
+    settings["irc"].update({"server": "127.0.0.1", "port": port, "alternative_servers": [], "ircv3": False})
+    server = StandInServer.instances[port]
+    server.join_lines = 0
+
+    loop = ircc.IRCLoop()
+    bridge = ircc.IRC(settings, loop)
+    bridge.set_discord(StandInDiscord())
+    bridge.set_thread_lock(threading.Lock())
+    bridge.debug_print = lambda *arguments, **keywords: None
+    bridge.irc_channel_sets = {channel: {"real_chan": f"discord-{i}"} for i, channel in enumerate(channels)}
+    synced = set()
+    done = threading.Event()
+    relay_names = bridge.send_irc_names_to_discord
+
+    def on_names(channel, names):
+        # (the NAMES of a channel are complete & handled when they are relayed to Discord)
+        relay_names(channel, names)
+        synced.add(channel)
+        if len(synced) == len(channels):
+            done.set()
+
+    bridge.send_irc_names_to_discord = on_names
+    threading.Thread(target=loop.run, daemon=True).start()
+    if not done.wait(TIMEOUT):
+        raise Exception(f"Only {len(synced)}/{len(channels)} channels synced in {TIMEOUT} seconds")
+    elapsed = time.perf_counter() - server.motd_ended
+
+    loop.call_in_loop(bridge.disconnect_all, "done")
+    time.sleep(0.2)
+    bridge.stop_loop()
+    # The next run's bridge uses the same timer names
+    with timers.condition:
+        for timer in list(timers.timers.values()):
+            timers.remove_timer(timer)
+    return elapsed, server.join_lines
+
+def main():
+    logging.getLogger("ircc").addHandler(logging.NullHandler()) # (no error log file from the benchmark)
+    timers.set_thread_lock(threading.Lock())
+    threading.Thread(target=timers.run, daemon=True).start()
+    server = StandInServer()
+    port = server.server_address[1]
+    StandInServer.instances = {port: server}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{'channels':>8} {'old (estimate)':>15} {'old lines':>10} {'bridge':>9} {'JOIN lines':>11}")
+    for count in CHANNELS:
+        channels = [f"#bridged-channel-{i}" for i in range(count)]
+        old_time = 0.1 + 0.4 * (count - 1) + 2 * count
+        elapsed, join_lines = join_through_bridge(port, channels)
+        print(f"{count:>8} {old_time:>14.1f}s {3 * count:>10} {elapsed:>8.3f}s {join_lines:>11}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
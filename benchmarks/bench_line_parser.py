@@ -0,0 +1,107 @@
+"""
+# IRC line parser benchmark
+- A corpus of server lines like on a busy network: mostly PRIVMSGs, joins / parts / quits, modes & a few numerics
+- Compares, per line:
+-- the old on_all_raw (str() of the argument list + a chain of substring searches)
+-- the irc-library's own regex parse of a line (what it does for every line anyway)
+-- ircproto.parse_line (full parse) and ircproto.LineDispatcher (peek the command, parse only the handled lines)
+- Run from the repository root: python benchmarks/bench_line_parser.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import irc.client
+import ircproto
+
+CORPUS_SIZE = 200000
+ROUNDS = 5
+
+def make_corpus():
+    nicks = [f"user{i}" for i in range(500)]
+    words = ["hello", "the", "bridge", "332", "topic", "lol", "https://example.org/", "ok", "hyvää", "what"]
+    kinds = ["privmsg"] * 80 + ["join"] * 5 + ["part"] * 4 + ["quit"] * 5 + ["mode"] * 3 + ["tagged"] * 2 + ["numeric"]
+    corpus = []
+    for i in range(CORPUS_SIZE):
+        nick = random.choice(nicks)
+        source = f":{nick}!~{nick}@host-{i % 97}.example.org"
+        kind = random.choice(kinds)
+        channel = f"#channel{random.randint(1, 20)}"
+        if kind == "privmsg":
+            corpus.append(f"{source} PRIVMSG {channel} :" + " ".join(random.choice(words) for j in range(random.randint(1, 25))))
+        elif kind == "join":
+            corpus.append(f"{source} JOIN {channel}")
+        elif kind == "part":
+            corpus.append(f"{source} PART {channel} :bye")
+        elif kind == "quit":
+            corpus.append(f"{source} QUIT :Ping timeout: 240 seconds")
+        elif kind == "mode":
+            corpus.append(f":ChanServ!ChanServ@services. MODE {channel} +o {nick}")
+        elif kind == "tagged":
+            corpus.append(f"@time=2024-01-01T00:00:00.000Z;account={nick} {source} PRIVMSG {channel} :tagged line")
+        else:
+            corpus.append(f":irc.example.org 332 bridgebot {channel} :Welcome to {channel} | rules: be nice")
+    return corpus
+
+def old_on_all_raw(line):
+    """ The previous IRC.on_all_raw (dispatching only) """
+    splitArgs = str([line])
+    if " 020 " in splitArgs:
+        return "020"
+    elif " 001 " in splitArgs:
+        return "001"
+    elif " 331 " in splitArgs:
+        return "331"
+    elif " 332 " in splitArgs:
+        return "332"
+    elif " 332 " in splitArgs:
+        return "333"
+    elif " 263 " in splitArgs:
+        return "263"
+    return None
+
+def library_parse(line):
+    """ The regex parse that irc.client.ServerConnection._process_line does for every line """
+    grp = irc.client._rfc_1459_command_regexp.match(line).group
+    return grp("prefix"), grp("command"), grp("argument")
+
+def make_dispatcher():
+    dispatcher = ircproto.LineDispatcher()
+    for numeric in ("020", "001", "263", "331", "332", "333"):
+        dispatcher.add_handler(numeric, lambda prefix, params: None)
+    return dispatcher
+
+def bench(function, corpus):
+    """ Returns the best time of ROUNDS passes over the corpus """
+    best = None
+    for i in range(ROUNDS):
+        begin = time.perf_counter()
+        for line in corpus:
+            function(line)
+        elapsed = time.perf_counter() - begin
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    random.seed(42)
+    corpus = make_corpus()
+
+    # The old raw handler takes any line mentioning " 332 " as a topic reply
+    dispatcher = make_dispatcher()
+    old_hits = sum(1 for line in corpus if old_on_all_raw(line) != None)
+    new_hits = sum(1 for line in corpus if dispatcher.dispatch(line))
+    print(f"{len(corpus)} lines, best of {ROUNDS} rounds - lines dispatched: old {old_hits}, new {new_hits}")
+
+    print(f"{'parser':<28} {'time':>8} {'lines/s':>12}")
+    for name, function in (("old on_all_raw", old_on_all_raw),
+                           ("irc-library regex parse", library_parse),
+                           ("ircproto.parse_line", ircproto.parse_line),
+                           ("ircproto.LineDispatcher", dispatcher.dispatch)):
+        elapsed = bench(function, corpus)
+        print(f"{name:<28} {elapsed:>7.3f}s {len(corpus) / elapsed:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
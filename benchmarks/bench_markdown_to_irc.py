@@ -0,0 +1,129 @@
+"""
+# Discord markdown -> IRC benchmark
+- Translates Discord messages (short chat and long pastes) to IRC control codes
+- Compares the old irc_dressup (split/join + five count & replace -passes) against ircformat.markdown_to_irc
+- Checks first that both give the same output for well-formed markdown: the hand written messages
+  and a generated corpus of them, plus every benchmarked message (the old one mis-handles
+  mixed / unpaired markers, snake_case & __underline__, so those are not compared)
+- Known limit: at markdown -heavy density (30 %) markdown_to_irc is about as fast as the old one, not faster -
+  every marker is a step of the Python -loop, where the old one ran its C -level replace passes over the whole text
+  (one regex -pass over the tokens was tried: the regex alternation costs more than the loop it saves)
+- Unpaired markers (the marker stack) are timed too - only the time, the old one's output differs there
+- Run from the repository root: python benchmarks/bench_markdown_to_irc.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ircformat
+
+CORPUS_SIZE = 50000
+ROUNDS = 5
+
+# Well-formed messages - both translators agree on these
+SAME_OUTPUT = [
+    "hello everyone",
+    "this is *important*",
+    "this is **really** important",
+    "***very*** important",
+    "_slanted_ text",
+    "a * b = c",
+    "```print('hello')```",
+    "see https://example.org/some_page_here for more",
+    "<https://example.org/no_embed> *look*",
+    "  extra   spaces  around  ",
+    "[R] <nick> **bold** and *italic*",
+]
+
+PLAIN_WORDS = ["hello", "world", "the", "bridge", "relays", "hyvää", "😀", "ok", "messages", "today", "what", "about"]
+MARKDOWN_WORDS = ["**bold**", "*italic*", "https://example.org/a_b", "`code`", "_it_"]
+# Well-formed markdown for the generated corpus: pairs around one or more words, code blocks, URLs, odd whitespace
+CORPUS_WORDS = PLAIN_WORDS + MARKDOWN_WORDS + ["***both***", "**two words**", "*three plain words*", "_it too_",
+    "```block```", "```two words```", "<https://example.org/x_y>", "**bold**,", "(*italic*)", "**ok!**", "  ", "\t"]
+# Share of the words with markdown / URLs: plain chat, typical chat, markdown-heavy
+DENSITIES = [0.0, 0.05, 0.3]
+# Words that stay on the marker stack unpaired: openers piling up, closers without an opener
+UNPAIRED_WORDS = ["*x", "y_", "a", "_b", "**c", "d~~"]
+
+def old_dressup_replace(m, substr, replacement):
+    if m.count(substr) == 1:
+        return m
+    m = m.replace(substr, replacement)
+    return m
+
+def old_irc_dressup(m):
+    """ The previous discordc.irc_dressup """
+    msplit = m.split()
+    for i in range(len(msplit)):
+        if msplit[i].startswith("http") or msplit[i].startswith("<http"):
+            msplit[i] = msplit[i].replace("_", "underdashreplacementplaceholderdiscordbotregexsucks")
+    m = " ".join(msplit)
+    m = old_dressup_replace(m, "***", "\x1d" + "\x02")
+    m = old_dressup_replace(m, "**", "\x02")
+    m = old_dressup_replace(m, "*", "\x1d")
+    m = old_dressup_replace(m, "```", "")
+    m = old_dressup_replace(m, "_", "\x1d")
+    m = m.replace("underdashreplacementplaceholderdiscordbotregexsucks", "_")
+    return m
+
+def make_word(density):
+    if random.random() < density:
+        return random.choice(MARKDOWN_WORDS)
+    return random.choice(PLAIN_WORDS)
+
+def make_messages(count, min_words, max_words, density):
+    return [" ".join(make_word(density) for j in range(random.randint(min_words, max_words))) for i in range(count)]
+
+def make_corpus():
+    """ The hand written messages, plus generated well-formed ones: mostly short, some long """
+    corpus = list(SAME_OUTPUT)
+    while len(corpus) < CORPUS_SIZE:
+        words = 300 if len(corpus) % 50 == 0 else random.randint(1, 20)
+        corpus.append(" ".join(random.choice(CORPUS_WORDS) for i in range(words)))
+    return corpus
+
+def check_same_output(messages):
+    """ Exit if the old & new translations differ for any of the messages """
+    for message in messages:
+        expected = old_irc_dressup(message)
+        got = ircformat.markdown_to_irc(message)
+        if got != expected:
+            print(f"Output differs for {message!r}: {expected!r} != {got!r}")
+            sys.exit(1)
+
+def bench(translate, messages):
+    """ Returns the best time of ROUNDS translations of the messages """
+    best = None
+    for i in range(ROUNDS):
+        begin = time.perf_counter()
+        for message in messages:
+            translate(message)
+        elapsed = time.perf_counter() - begin
+        if best == None or elapsed < best:
+            best = elapsed
+    return best
+
+def main():
+    random.seed(42)
+    corpus = make_corpus()
+    check_same_output(corpus)
+    print(f"{len(corpus)} well-formed messages, identical output, best of {ROUNDS} rounds")
+
+    print(f"{'messages':<24} {'markdown':>9} {'old irc_dressup':>16} {'markdown_to_irc':>16}")
+    for density in DENSITIES:
+        for name, messages in (("20000 short (3-20 w)", make_messages(20000, 3, 20, density)),
+                               ("2000 long (200-400 w)", make_messages(2000, 200, 400, density))):
+            check_same_output(messages)
+            old_time = bench(old_irc_dressup, messages)
+            new_time = bench(ircformat.markdown_to_irc, messages)
+            print(f"{name:<24} {density:>8.0%} {old_time:>15.3f}s {new_time:>15.3f}s")
+
+    messages = [" ".join(random.choice(UNPAIRED_WORDS) for j in range(2000)) for i in range(200)]
+    old_time = bench(old_irc_dressup, messages)
+    new_time = bench(ircformat.markdown_to_irc, messages)
+    print(f"{'200 unpaired (2000 w)':<24} {'-':>9} {old_time:>15.3f}s {new_time:>15.3f}s")
+
+if __name__ == "__main__":
+    main()
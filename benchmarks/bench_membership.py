@@ -0,0 +1,109 @@
+"""
+# IRC channel membership benchmark
+- 50 channels of 2000 users each (nicks drawn from a shared pool, so users are on several channels)
+- Compares the old caches (channel -> nick -dicts + a global nick -> status -dict, scanned channel by channel)
+  against ircstate.MembershipStore with its nick -> channels reverse index
+- Measures the "which channels is this nick on" -lookup (routing of quits / nick changes to Discord),
+  quits and nick changes
+- Run from the repository root: python benchmarks/bench_membership.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ircstate
+
+CHANNEL_COUNT = 50
+USERS_PER_CHANNEL = 2000
+NICK_POOL = 40000
+OPERATIONS = 5000
+
+class OldCaches:
+    """ The previous IRC.irc_channels_lists & irc_user_statuses, and the loops over them """
+
+    def __init__(self):
+        self.irc_channels_lists = {}
+        self.irc_user_statuses = {}
+
+    def add(self, channel, nick, prefix):
+        self.irc_user_statuses[nick] = prefix
+        if channel not in self.irc_channels_lists:
+            self.irc_channels_lists[channel] = {}
+        self.irc_channels_lists[channel][nick] = {"host": "?"}
+
+    def get_channels_of(self, nick):
+        """ send_to_matching_discord """
+        return [channel for channel in self.irc_channels_lists if nick in self.irc_channels_lists[channel]]
+
+    def quit(self, nick):
+        """ pop_from_channels """
+        for channel in self.irc_channels_lists:
+            if nick in self.irc_channels_lists[channel]:
+                self.irc_channels_lists[channel].pop(nick)
+
+    def rename(self, oldnick, newnick):
+        """ on_nick """
+        for channel in self.irc_channels_lists:
+            members = self.irc_channels_lists[channel]
+            if oldnick in members:
+                prev = members[oldnick]
+                members.pop(oldnick)
+                members[newnick] = prev
+
+class NewStore:
+    """ The same operations on the MembershipStore """
+
+    def __init__(self):
+        self.members = ircstate.MembershipStore()
+
+    def add(self, channel, nick, prefix):
+        self.members.add(channel, nick, modes=prefix)
+
+    def get_channels_of(self, nick):
+        return self.members.get_channels_of(nick)
+
+    def quit(self, nick):
+        self.members.remove_nick(nick)
+
+    def rename(self, oldnick, newnick):
+        self.members.rename(oldnick, newnick)
+
+def make_rosters():
+    pool = [f"user{i}" for i in range(NICK_POOL)]
+    return {f"#channel{c}": random.sample(pool, USERS_PER_CHANNEL) for c in range(CHANNEL_COUNT)}
+
+def timed(function, arguments):
+    begin = time.perf_counter()
+    for argument in arguments:
+        function(*argument)
+    return time.perf_counter() - begin
+
+def run(cache_class, rosters, lookups, quits, renames):
+    """ Returns the seconds of (fill, lookups, quits, renames) """
+    cache = cache_class()
+    fill = timed(cache.add, [(channel, nick, random.choice(("", "", "+", "@"))) for channel, nicks in rosters.items() for nick in nicks])
+    return (fill,
+            timed(cache.get_channels_of, lookups),
+            timed(cache.quit, quits),
+            timed(cache.rename, renames))
+
+def main():
+    random.seed(42)
+    rosters = make_rosters()
+    on_channels = sorted({nick for nicks in rosters.values() for nick in nicks})
+    lookups = [(random.choice(on_channels),) for i in range(OPERATIONS)]
+    quitters = random.sample(on_channels, OPERATIONS * 2)
+    quits = [(nick,) for nick in quitters[:OPERATIONS]]
+    renames = [(nick, nick + "_") for nick in quitters[OPERATIONS:]]
+
+    print(f"{CHANNEL_COUNT} channels x {USERS_PER_CHANNEL} users ({len(on_channels)} distinct nicks), {OPERATIONS} operations each")
+    print(f"{'implementation':<16} {'fill':>9} {'lookups':>9} {'quits':>9} {'renames':>9}")
+    for name, cache_class in (("old dict-scans", OldCaches), ("MembershipStore", NewStore)):
+        random.seed(1)
+        results = run(cache_class, rosters, lookups, quits, renames)
+        print(f"{name:<16} " + " ".join(f"{seconds:>8.3f}s" for seconds in results))
+
+if __name__ == "__main__":
+    main()
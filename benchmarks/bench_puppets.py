@@ -0,0 +1,159 @@
+"""
+# Puppet pool benchmark
+- A local stand-in for an IRC-server (threaded sockets): registers the clients (001), refuses the taken nicks (433)
+  and counts the PRIVMSGs it receives
+- A burst of Discord traffic (USERS users x MESSAGES messages each) is delivered to the server:
+-- through the bot: every line waits on the bot connection's one flood budget (the "[R] <name> message" -relaying)
+-- through puppets.PuppetPool: every user has an own connection & flood budget
+- Prints the time until the server has received all the lines, and the nicks the puppets got
+- Run from the repository root: python benchmarks/bench_puppets.py
+"""
+import collections
+import os
+import socketserver
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import irc.client
+import ircqueue
+import puppets
+import timers
+
+USERS = 10
+MESSAGES = 4
+CHANNEL = "#bench"
+BOT_FLOOD = (2.0, 5)     # The bridge's default flood_rate & flood_burst
+PUPPET_FLOOD = (1.0, 4)  # The default puppet_flood_rate & puppet_flood_burst
+TAKEN_NICKS = {"user0[d]"} # Taken on the server - the puppet has to pick another one
+TIMEOUT = 120
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInClient)
+        self.lock = threading.Lock()
+        self.privmsgs = 0
+        self.nicks = set(TAKEN_NICKS)
+
+    def count_privmsg(self):
+        with self.lock:
+            self.privmsgs += 1
+
+    def take_nick(self, nick):
+        """ Returns True if the nick was free (and now is this client's) """
+        with self.lock:
+            if nick in self.nicks:
+                return False
+            self.nicks.add(nick)
+            return True
+
+class StandInClient(socketserver.StreamRequestHandler):
+    """ The handful of server replies the bridge needs: 001 / 433 / JOIN echo """
+
+    def send(self, line):
+        self.wfile.write(f"{line}\r\n".encode("utf-8"))
+
+    def handle(self):
+        nick = None
+        registered = False
+        for raw in self.rfile:
+            words = raw.decode("utf-8", "replace").rstrip("\r\n").split(" ")
+            command = words[0].upper()
+            if command == "NICK":
+                if not self.server.take_nick(words[1]):
+                    self.send(f":irc.local 433 {nick or '*'} {words[1]} :Nickname is already in use")
+                    continue
+                nick = words[1]
+                if not registered:
+                    registered = True
+                    self.send(f":irc.local 001 {nick} :Welcome to the stand-in network")
+            elif command == "JOIN":
+                self.send(f":{nick}!bench@127.0.0.1 JOIN {words[1]}")
+            elif command == "PRIVMSG":
+                self.server.count_privmsg()
+            elif command == "QUIT":
+                return
+
+def run_until_delivered(reactor, server, expected, flush, get_wait):
+    """ Drive the reactor until the server has counted 'expected' PRIVMSGs - returns the elapsed seconds """
+    begin = time.perf_counter()
+    while server.privmsgs < expected:
+        if time.perf_counter() - begin > TIMEOUT:
+            raise Exception(f"Only {server.privmsgs}/{expected} lines delivered in {TIMEOUT} seconds")
+        wait = get_wait()
+        reactor.process_once(min(0.2, wait) if wait != None else 0.2)
+        flush()
+    return time.perf_counter() - begin
+
+def bench_bot(port, server):
+    """ All the users' lines through the one bot connection """
+    reactor = irc.client.Reactor()
+    welcomed = []
+    reactor.add_global_handler("welcome", lambda connection, event: welcomed.append(True))
+    connection = reactor.server()
+    connection.connect("127.0.0.1", port, "bridgebot")
+    while not welcomed:
+        reactor.process_once(0.1)
+    queue = ircqueue.OutboundQueue(ircqueue.TokenBucket(*BOT_FLOOD))
+    state = {"wait": None}
+
+    def flush():
+        state["wait"] = queue.flush(lambda line: connection.privmsg(line[0], line[1]))
+
+    begin_count = server.privmsgs
+    for message in range(MESSAGES):
+        for user in range(USERS):
+            queue.put(CHANNEL, (CHANNEL, f"[R] <user{user}> message {message}"))
+    flush()
+    elapsed = run_until_delivered(reactor, server, begin_count + USERS * MESSAGES, flush, lambda: state["wait"])
+    connection.disconnect("done")
+    return elapsed
+
+def bench_puppets(port, server):
+    """ Every user's lines through the user's own puppet connection """
+    reactor = irc.client.Reactor()
+    # The pool connects on the timers' connect pool and hands the sockets back through call_in_loop (run in flush)
+    loop_calls = collections.deque()
+    call_in_loop = lambda target, *arguments: loop_calls.append((target, arguments))
+    fallback = lambda channel, line: print(f"fell back to the bot: {line}")
+    pool_settings = {"puppets": True, "puppet_max": USERS, "puppet_flood_rate": PUPPET_FLOOD[0], "puppet_flood_burst": PUPPET_FLOOD[1]}
+    pool = puppets.PuppetPool(reactor, lambda: [("127.0.0.1", port)], pool_settings, call_in_loop, fallback, debug_print=lambda text: None)
+
+    def flush():
+        while loop_calls:
+            target, arguments = loop_calls.popleft()
+            target(*arguments)
+        pool.flush()
+
+    begin_count = server.privmsgs
+    for message in range(MESSAGES):
+        for user in range(USERS):
+            if not pool.send(f"id{user}", f"user{user}", CHANNEL, f"message {message}", f"[R] <user{user}> message {message}"):
+                raise Exception(f"Puppet of user{user} did not take the message")
+    elapsed = run_until_delivered(reactor, server, begin_count + USERS * MESSAGES, flush, pool.get_outbound_wait)
+    nicks = sorted(puppet.nick for puppet in pool.puppets.values())
+    pool.shutdown("done")
+    reactor.process_once(0.1)
+    return elapsed, nicks
+
+def main():
+    server = StandInServer()
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    timers.set_thread_lock(threading.Lock())
+    threading.Thread(target=timers.run, daemon=True).start()
+
+    print(f"{USERS} users x {MESSAGES} messages = {USERS * MESSAGES} lines to {CHANNEL}")
+    bot_time = bench_bot(port, server)
+    print(f"{'through the bot':<22} {bot_time:>7.2f}s  (flood_rate {BOT_FLOOD[0]}/s, burst {BOT_FLOOD[1]})")
+    puppet_time, nicks = bench_puppets(port, server)
+    print(f"{'through the puppets':<22} {puppet_time:>7.2f}s  (puppet_flood_rate {PUPPET_FLOOD[0]}/s, burst {PUPPET_FLOOD[1]} per puppet)")
+    print(f"puppet nicks: {' '.join(nicks)}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
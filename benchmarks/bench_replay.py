@@ -0,0 +1,104 @@
+"""
+# Traffic replay on a simulated clock
+- Replays an hour of bridge traffic timers (IRC message parts, Discord send delays,
+  URL lookups, status rotation, nick keeping ...) through timers.py on a SimulatedClock
+- The hour runs in (a few) seconds, and the timer stats show the lateness per timer family
+- Run from the repository root: python benchmarks/bench_replay.py [simulated seconds] [messages per second]
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import clock
+import timers
+
+fired = {"count": 0}
+
+def target(*arguments):
+    fired["count"] += 1
+
+def keep_set_nick_loop():
+    """ Like IRC.keep_set_nick_loop - re-adds itself every 10 seconds """
+    target()
+    timers.add_timer("recover_botname", 10, keep_set_nick_loop)
+
+def set_status():
+    """ Like Discord.set_status - re-adds itself every 300 seconds """
+    target()
+    timers.add_timer("set_status", 300, set_status)
+
+def relay_discord_message(state, parts):
+    """ Timers of one Discord -> IRC message: split parts, URL lookup """
+    if parts > 1:
+        send_delay = 0.1
+        for i in range(parts):
+            timers.add_timer("", send_delay, target)
+            send_delay += 0.4
+    timers.add_timer("", 1, target)
+
+def relay_irc_message(state):
+    """ Timers of one IRC -> Discord message: Discord send staggering (like send_discord_message), URL lookup """
+    now = clock.now()
+    if now - state["lastcall"] < 1:
+        state["delay"] += 0.1
+        timers.add_timer("", state["delay"], target)
+    else:
+        state["delay"] = 0
+    state["lastcall"] = now
+    timers.add_timer("", 1, target)
+
+def run_due_timers_until(sim, until):
+    """ Fast-forward the simulated clock from timer to timer, up to the given time """
+    while True:
+        with timers.condition:
+            wait_time = timers.get_wait_time(sim.time())
+        if wait_time == None or sim.time() + wait_time > until:
+            break
+        sim.set_time(sim.time() + wait_time)
+        timers.check_timers()
+    sim.set_time(until)
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 3600.0
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    random.seed(7)
+    timers.set_thread_lock(threading.Lock())
+
+    sim = clock.SimulatedClock(1700000000.0)
+    clock.set_clock(sim)
+    start = sim.time()
+    state = {"lastcall": 0, "delay": 0}
+
+    # Startup timers - channel joins & the self-repeating loops
+    for i in range(10):
+        timers.add_timer(f"join-#channel{i}", 0.1 + i * 0.4, target)
+    timers.add_timer("keep-botnick", 10, keep_set_nick_loop)
+    set_status()
+
+    begin = time.perf_counter()
+    messages = 0
+    event_time = start
+    while True:
+        event_time += random.expovariate(rate)
+        if event_time >= start + duration:
+            break
+        run_due_timers_until(sim, event_time)
+        if random.random() < 0.5:
+            relay_discord_message(state, random.choice((1, 1, 1, 2, 3)))
+        else:
+            relay_irc_message(state)
+        messages += 1
+    run_due_timers_until(sim, start + duration)
+    elapsed = time.perf_counter() - begin
+
+    print(f"Replayed {duration:.0f} s of traffic ({messages} messages, {fired['count']} timers fired) in {elapsed:.2f} s"
+          f" ({duration / elapsed:.0f}x real time)")
+    for family, stats in timers.get_timer_stats()["families"].items():
+        late = stats["lateness"]
+        print(f"  {family:<16} fired {late['count']:>7}  late ms p50 {late['p50']*1000:5.1f}  p99 {late['p99']*1000:5.1f}  max {late['max']*1000:5.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+# Message splitter benchmark
+- Splits relayed-message -like texts (short chat, long pastes, Finnish & emoji text) to IRC-lines
+- Compares the old re.split -based, character -counting split_msg against ircformat.split_message
+- Also shows the longest produced line in UTF-8 bytes: the old splitter goes over the budget with non-ASCII text
+- Run from the repository root: python benchmarks/bench_split.py
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import ircformat
+
+MESSAGE_COUNT = 20000
+BUDGET = 479 - len("botsircname!~botsname@host.example.org PRIVMSG #irc-channel :")
+
+WORDS = {
+    "ascii": ["hello", "world", "the", "bridge", "relays", "messages", "https://example.org/some/path", "ok", "lol"],
+    "finnish": ["hyvää", "päivää", "kääntäjä", "öljy", "äiti", "yö", "sää", "tänään", "hölmö"],
+    "emoji": ["😀", "👍🏽", "🎉🎉", "hi", "❤️", "nice", "🚀", "ok"],
+}
+
+def old_split_msg(msg, max_chars):
+    """ The previous IRC.split_msg: re.split, string concatenation, characters instead of bytes """
+    all_pieces = []
+    current_piece = ""
+    msgsplit = re.split(r'(\s+)', msg)
+    for part in msgsplit:
+        if len(current_piece) + len(part) <= max_chars:
+            current_piece += part
+        else:
+            if current_piece:
+                all_pieces.append(current_piece.strip())
+            current_piece = part
+    if current_piece:
+        all_pieces.append(current_piece.strip())
+    return all_pieces
+
+def make_messages(words):
+    """ Mostly short chat lines, with every 10th message a long paste """
+    messages = []
+    for i in range(MESSAGE_COUNT):
+        count = random.randint(3, 20) if i % 10 else random.randint(100, 300)
+        messages.append(" ".join(random.choice(words) for j in range(count)))
+    return messages
+
+def bench(split, messages):
+    """ Returns (seconds, lines, longest line in bytes) """
+    begin = time.perf_counter()
+    results = [split(msg, BUDGET) for msg in messages]
+    elapsed = time.perf_counter() - begin
+    lines = sum(len(pieces) for pieces in results)
+    longest = max(len(piece.encode("utf-8")) for pieces in results for piece in pieces)
+    return elapsed, lines, longest
+
+def main():
+    random.seed(42)
+    print(f"{MESSAGE_COUNT} messages per text type, budget {BUDGET} bytes per line")
+    print(f"{'text':<8} {'implementation':<16} {'time':>9} {'lines':>8} {'longest':>9}")
+    for name, words in WORDS.items():
+        messages = make_messages(words)
+        for implementation, split in (("old split_msg", old_split_msg), ("split_message", ircformat.split_message)):
+            elapsed, lines, longest = bench(split, messages)
+            print(f"{name:<8} {implementation:<16} {elapsed:>8.3f}s {lines:>8} {longest:>8}B")
+
+if __name__ == "__main__":
+    main()
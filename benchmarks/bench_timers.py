@@ -0,0 +1,133 @@
+"""
+# Timer benchmark
+- 100k short timers (like the message-part & Discord send-delay timers during a flood)
+- Compares the old dict-scan timers (100 ms polling, full scan per poll) against
+  the heap -scheduler (the default) and the opt-in timing wheel -mode of timers.py
+- Best of ROUNDS runs, each column also relative to the dict scan: the insert is a regression
+  (a Timer handle, the lock & the stats per timer vs. one dict entry), paid back on the expire
+- Run from the repository root: python benchmarks/bench_timers.py
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import timers
+
+TIMER_COUNT = 100000
+CANCEL_COUNT = 10000
+MAX_DELAY = 10.0  # seconds
+POLL_STEP = 0.1   # the old loop's sleep
+ROUNDS = 3
+
+def noop():
+    pass
+
+class DictScanTimers:
+    """ The previous timers.py implementation: a dict, scanned in full on every 100 ms poll """
+    def __init__(self):
+        self.timers = {}
+        self.unnamed_index = 0
+
+    def add_timer(self, name, currtime, delay, target, *arguments):
+        if name == "":
+            name = f"ID#{str(self.unnamed_index)}"
+            self.unnamed_index += 1
+        self.timers[name] = {"time": currtime + float(delay), "target": target, "arguments": arguments}
+
+    def cancel_timer(self, name):
+        self.timers.pop(name)
+
+    def check_timers(self, currtime):
+        for i in self.timers.copy():
+            timer = self.timers[i]
+            if currtime >= timer["time"]:
+                self.timers.pop(i)
+                timer["target"](*timer["arguments"])
+
+def bench_dict_scan(delays, cancels):
+    """ Returns (insert, cancel, expire) -seconds for the old dict scan """
+    old = DictScanTimers()
+    start = time.time()
+    begin = time.perf_counter()
+    for delay in delays:
+        old.add_timer("", start, delay, noop)
+    insert_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    for i in cancels:
+        old.cancel_timer(f"ID#{i}")
+    cancel_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    now = start
+    while old.timers:
+        now += POLL_STEP
+        old.check_timers(now)
+    expire_time = time.perf_counter() - begin
+    return insert_time, cancel_time, expire_time
+
+def bench_timers_module(delays, cancels, use_wheel):
+    """ Returns (insert, cancel, expire) -seconds for timers.py (heap only, or timing wheel -mode) """
+    timers.use_timing_wheel = use_wheel
+    timers.wheel = None
+    timers.timers.clear()
+    timers.timer_heap.clear()
+    timers.cancelled_in_heap = 0
+
+    start = time.time()
+    begin = time.perf_counter()
+    handles = [timers.add_timer("", delay, noop) for delay in delays]
+    insert_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    for i in cancels:
+        handles[i].cancel()
+    cancel_time = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    now = start
+    fired = 0
+    while timers.timers:
+        now += POLL_STEP
+        with timers.condition:
+            due_timers = timers.pop_due_timers(now)
+        timers.run_targets(due_timers)
+        fired += len(due_timers)
+    expire_time = time.perf_counter() - begin
+    assert fired == len(delays) - len(cancels)
+    return insert_time, cancel_time, expire_time
+
+def best_of(bench):
+    """ Returns the best (insert, cancel, expire) -seconds of ROUNDS runs, per column """
+    runs = [bench() for i in range(ROUNDS)]
+    return tuple(min(column) for column in zip(*runs))
+
+def main():
+    timers.set_thread_lock(threading.Lock())
+    random.seed(42)
+    delays = [random.random() * MAX_DELAY for i in range(TIMER_COUNT)]
+    cancels = random.sample(range(TIMER_COUNT), CANCEL_COUNT)
+
+    print(f"{TIMER_COUNT} timers (0 - {MAX_DELAY} s), {CANCEL_COUNT} cancelled, expired in {POLL_STEP} s steps")
+    print(f"{'implementation':<22} {'insert':>17} {'cancel':>17} {'expire':>17}")
+    results = [
+        ("dict scan", best_of(lambda: bench_dict_scan(delays, cancels))),
+        ("heap (default)", best_of(lambda: bench_timers_module(delays, cancels, 0))),
+        ("timing wheel (opt-in)", best_of(lambda: bench_timers_module(delays, cancels, 1))),
+    ]
+    baseline = results[0][1]
+    for name, times in results:
+        columns = " ".join(f"{seconds:>8.3f}s (x{seconds / base:>4.1f})" for seconds, base in zip(times, baseline))
+        print(f"{name:<22} {columns}")
+
+    # The regressions against the old dict scan, spelled out
+    for name, times in results[1:]:
+        slower = [column for column, seconds, base in zip(("insert", "cancel", "expire"), times, baseline) if seconds > base]
+        if slower:
+            print(f"{name}: slower than the dict scan on {', '.join(slower)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import threading
+import time
+
+class RealClock:
+    """
+    # Real Clock
+    - The wall clock - used by default
+    """
+
+    def time(self):
+        """ Returns the current time in seconds (since epoch) """
+        return time.time()
+
+    def sleep(self, seconds):
+        """ Sleep (block the calling thread) for the given seconds """
+        time.sleep(seconds)
+
+    def wait(self, condition, timeout):
+        """ Wait on a (held) threading.Condition until notified or until the timeout (None = no timeout) """
+        return condition.wait(timeout)
+
+    def watch(self, condition):
+        """ The real time moves by itself - nothing to notify """
+        pass
+
+class SimulatedClock:
+    """
+    # Simulated Clock
+    - Virtual time that only moves when advanced - for benchmarks & replays of traffic
+    - advance() / set_time() fast-forward the clock and wake up everyone waiting on it,
+      so for example the timer thread runs the timers that became due
+    - sleep() does not block, it fast-forwards the clock instead
+    - A thread that reads the time & then waits (like the timer thread) registers its condition with watch() first:
+      the time is moved & the waiters are looked up under the clock's lock, and notified under their condition,
+      so an advance between the read & the wait is never missed
+    """
+
+    def __init__(self, start_time=0.0):
+        self.now = float(start_time)
+        self.lock = threading.Lock() # Guards the time & the waiters
+        self.waiting = {}            # Condition -> count of the threads waiting on it through this clock
+        self.watched = set()         # Conditions notified on every move of the clock (see watch)
+
+    def time(self):
+        """ Returns the current simulated time """
+        return self.now
+
+    def sleep(self, seconds):
+        """ Fast-forward the clock by the given seconds """
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        """ Fast-forward the clock by the given seconds """
+        with self.lock:
+            if seconds > 0:
+                self.now += seconds
+            conditions = self.watched.union(self.waiting)
+        self.notify(conditions)
+
+    def set_time(self, new_time):
+        """ Set the simulated time (never backwards) & wake up the waiters """
+        with self.lock:
+            if new_time > self.now:
+                self.now = float(new_time)
+            conditions = self.watched.union(self.waiting)
+        self.notify(conditions)
+
+    def notify(self, conditions):
+        """ Wake up the threads waiting on the conditions - the clock's lock must not be held (a waiter holds its condition while it takes the clock's lock) """
+        for condition in conditions:
+            with condition:
+                condition.notify_all()
+
+    def watch(self, condition):
+        """ Notify the condition on every move of the clock - register before reading the time that a wait is based on """
+        with self.lock:
+            self.watched.add(condition)
+
+    def wait(self, condition, timeout):
+        """
+        # Wait
+        - Wait on a (held) threading.Condition until notified, or until the clock is advanced to the timeout (simulated seconds)
+        - A timeout that has already passed (<= 0) returns right away, like a real wait would
+        - returns False if the timeout was reached
+        """
+        with self.lock:
+            if timeout != None and timeout <= 0:
+                return False
+            deadline = None if timeout == None else self.now + timeout
+            self.waiting[condition] = self.waiting.get(condition, 0) + 1
+        try:
+            # The clock only moves in set_time, which notifies: wake up on that or on the condition's own notify
+            condition.wait()
+        finally:
+            with self.lock:
+                self.waiting[condition] -= 1
+                if self.waiting[condition] == 0:
+                    del self.waiting[condition]
+        return deadline == None or self.now < deadline
+
+current_clock = RealClock()
+clock_listeners = [] # Functions called with (old clock, new clock) when the clock is changed
+
+def get_clock():
+    """ Returns the clock currently in use """
+    return current_clock
+
+def set_clock(new_clock):
+    """
+    # Set Clock
+    - Change the clock shared by timers / IRC / Discord (e.g. to a SimulatedClock for benchmarks)
+    - Notify the clock listeners (timers re-schedules its timers on the new clock)
+    """
+    global current_clock
+    old_clock = current_clock
+    current_clock = new_clock
+    for listener in list(clock_listeners):
+        listener(old_clock, new_clock)
+
+def add_clock_listener(listener):
+    """ Register a function to be called with (old clock, new clock) whenever the clock is changed """
+    clock_listeners.append(listener)
+
+def now():
+    """ Returns the current time from the clock in use """
+    return current_clock.time()
+
+def sleep(seconds):
+    """ Sleep for the given seconds on the clock in use """
+    current_clock.sleep(seconds)
+
+def wait(condition, timeout):
+    """ Wait on a (held) threading.Condition on the clock in use """
+    return current_clock.wait(condition, timeout)
+
+def watch(condition):
+    """ Have the clock in use notify the condition whenever it moves (a SimulatedClock - the real time needs no notifying) """
+    current_clock.watch(condition)
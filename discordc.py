@@ -7,8 +7,10 @@ import atexit
 from datetime import timedelta
 from dataclasses import dataclass, field
 import logging
-import time
+import threading
 import timers
+import clock
+import ircformat
 import re
 
 settings = None
@@ -29,6 +31,113 @@ class DiscordUserInfo:
     status: str
     guilds: set = field(default_factory=set)
 
+@dataclass
+class CoalescedLine:
+    """ Utility data struct class for a Discord author's messages waiting to be sent to IRC as one line """
+    author_id: str
+    line: str
+    timer: object = None
+
+# Mention name ranks - when several users go by the same name, the lowest rank wins
+MENTION_DISPLAY_NAME = 0
+MENTION_NICK = 1
+MENTION_USER_NAME = 2
+
+class MentionIndex:
+    """
+    # Mention Index
+    - Case-folded trie of the names that Discord users can be @mentioned by from IRC (display name, nick, user name)
+    - Updated member by member as they join / leave / rename, instead of scanning all the users for every word
+    - resolve() replaces all the @mentions of a message in one scan, names with spaces included
+    """
+
+    def __init__(self):
+        self.root = {}       # Trie of case-folded names: char -> node, node[""] = {user_id: rank}
+        self.user_names = {} # user_id -> the case-folded names of the user in the trie
+        self.lock = threading.Lock()
+
+    def add_user(self, user_id, names):
+        """ Index (or re-index) a user with the given (name, rank) -pairs """
+        with self.lock:
+            self.remove_user_names(user_id)
+            folded_names = set()
+            for name, rank in names:
+                if not name:
+                    continue
+                folded = name.casefold()
+                node = self.root
+                for char in folded:
+                    node = node.setdefault(char, {})
+                users = node.setdefault("", {})
+                users[user_id] = min(rank, users.get(user_id, rank))
+                folded_names.add(folded)
+            self.user_names[user_id] = folded_names
+
+    def remove_user(self, user_id):
+        """ Forget a user (left the server) """
+        with self.lock:
+            self.remove_user_names(user_id)
+
+    def remove_user_names(self, user_id):
+        """ Remove the user's names from the trie & prune the emptied branches (call with the lock held) """
+        for folded in self.user_names.pop(user_id, ()):
+            path = [self.root]
+            for char in folded:
+                path.append(path[-1][char])
+            del path[-1][""][user_id]
+            if not path[-1][""]:
+                del path[-1][""]
+            for depth in range(len(folded), 0, -1):
+                if path[depth]:
+                    break
+                del path[depth - 1][folded[depth - 1]]
+
+    def match_at(self, message, start):
+        """ 
+        # Match At
+        - Find the longest indexed name in the message starting from start (just after an @)
+        - The name has to end at a word boundary (so '@nick:' matches 'nick', '@nickname' does not)
+        - returns (end of the name, user_id) - or (start, None) if no name matches
+        """
+        node = self.root
+        best = (start, None)
+        for position in range(start, len(message)):
+            for char in message[position].casefold():
+                node = node.get(char)
+                if node == None:
+                    return best
+            users = node.get("")
+            if users != None:
+                following = message[position + 1:position + 2]
+                if following == "" or not (following.isalnum() or following == "_"):
+                    best_rank = min(users.values())
+                    best_users = [user_id for user_id, rank in users.items() if rank == best_rank]
+                    if len(best_users) == 1: # An ambiguous name does not ping anyone
+                        best = (position + 1, best_users[0])
+        return best
+
+    def resolve(self, message):
+        """ Replace the @mentions of known users in the message with Discord mentions (<@user_id>) - returns the message """
+        at = message.find("@")
+        if at < 0:
+            return message
+        output = []
+        position = 0
+        with self.lock:
+            while at >= 0:
+                # Mentions start a word
+                if at == 0 or message[at - 1].isspace():
+                    end, user_id = self.match_at(message, at + 1)
+                    if user_id != None:
+                        output.append(message[position:at])
+                        output.append(f"<@{user_id}>")
+                        position = end
+                        at = message.find("@", end)
+                        continue
+                at = message.find("@", at + 1)
+        output.append(message[position:])
+        return "".join(output)
+
 class Discord:
     """ 
         # Discord -bot Utility Handler/Wrapper Class
@@ -61,6 +170,7 @@ class Discord:
 
         # Discord - variables / caches
         self.known_users: dict[str, DiscordUserInfo] = {} # Dictionary for the discord - users
+        self.mention_index = MentionIndex()                # Names of the discord -users for resolving IRC @mentions
         self.statusindex = 0     # Index for Discord status run-through
         self.timesleep = 0
         self.sendmymsg_lastcall = 0
@@ -70,6 +180,13 @@ class Discord:
         self.temp_status_message = ""
         self.discord_error_spam_timer = 0
 
+        # Coalescing of message bursts: consecutive messages from one author to one channel within the
+        # window (seconds) are sent to IRC as one line - 0 disables coalescing (see settings.json)
+        self.coalesce_window = discord_settings.get("coalesce_window", 0)
+        self.coalesce_separator = discord_settings.get("coalesce_separator", " | ")
+        self.coalesced: dict[tuple, CoalescedLine] = {} # (irc-network name, irc-channel) -> line waiting for the window to pass
+        self.coalesce_lock = threading.Lock()
+
         # Init logger & Create a FileHandler for logging to a file
         self.discord_logger = logging.getLogger('discordc')
         self.discord_logger.setLevel(logging.ERROR)
@@ -118,10 +235,10 @@ class Discord:
         irc.sent_quit_on()
         timers.shutdown_timers()
         if exiting == False:
-            timers.add_timer("", self.timesleep+1, irc.connection.disconnect, f'!! {irc.get_word("quitmessage")} {uptime} *({reason})* !!')
+            timers.add_timer("", self.timesleep+1, irc.disconnect_all, f'!! {irc.get_word("quitmessage")} {uptime} *({reason})* !!')
             asyncio.run_coroutine_threadsafe(do_async_stuff(self.die, self.timesleep + 3), discord_bot.loop)
         else:        
-            irc.connection.disconnect(f'!! {irc.get_word("quitmessage")} {uptime} *({reason})* !!')
+            irc.disconnect_all(f'!! {irc.get_word("quitmessage")} {uptime} *({reason})* !!')
 
     #####################################
     #        SEND MESSAGES              # 
@@ -140,11 +257,9 @@ class Discord:
         #debug_print(f"[Discord] debug ircmsg: disc_chan:{discord_chan} sender: {sender} msg: {message}")
 
         if sender:
-            ircUserStatuses = irc.get_irc_user_statuses()
-            if sender in ircUserStatuses:
-                statusPrefix = ircUserStatuses[sender]
-            else:
-                statusPrefix = ""
+            # The sender's status on the IRC-channel bridged to this Discord-channel
+            irc_chan = settings["channel_sets"][str(discord_chan.id)]["irc_chan"]
+            statusPrefix = get_irc_of(discord_chan.id).get_user_prefix(irc_chan, sender)
             ircDisplayname = f"{settings['irc']['ircNickPrefix']}{statusPrefix}{sender}{settings['irc']['ircNickPostfix']}"
         else:
             ircDisplayname = "[IRC]" # Bot messages through webhook
@@ -176,14 +291,63 @@ class Discord:
             debug_print(f"[Discord] Error: {e}")
             error_report_to_irc_disc_problem(e)
     
+    def send_coalesced_to_irc(self, irc_network, irc_chan, author_id, line, part):
+        """
+        # Send Coalesced to IRC
+        - Relay a Discord message to IRC (irc_network = the IRC of the channel's network), merged with the author's previous messages within the coalescing window
+        - line : the full relayed line (relay tag & nick + message), used when starting a new line
+        - part : the message alone, appended (with the separator) to the author's waiting line
+        - A message from another author, or one that would not fit on one IRC-line, sends the waiting line first
+        """
+        if self.coalesce_window <= 0:
+            irc_network.send_irc_message(irc_chan, line)
+            return
+
+        key = (irc_network.network_name, irc_chan)
+        with self.coalesce_lock:
+            pending = self.coalesced.get(key)
+            if pending != None:
+                merged = f"{pending.line}{self.coalesce_separator}{part}"
+                if pending.author_id == author_id and ircformat.get_byte_length(merged) <= irc_network.get_split_limit(irc_chan):
+                    pending.line = merged
+                    return
+                self.send_pending_to_irc(irc_network, irc_chan, pending)
+
+            # Lines that need splitting anyway go out right away
+            if ircformat.get_byte_length(line) > irc_network.get_split_limit(irc_chan):
+                irc_network.send_irc_message(irc_chan, line)
+                return
+            pending = CoalescedLine(author_id, line)
+            pending.timer = timers.add_timer(f"coalesce-{irc_network.network_name}-{irc_chan}", self.coalesce_window, self.flush_coalesced, irc_network, irc_chan, pending)
+            self.coalesced[key] = pending
+
+    def flush_coalesced(self, irc_network, irc_chan, pending=None):
+        """ 
+        # Flush Coalesced
+        - Send the line waiting for the coalescing window on the channel now
+        - With pending given (from the window timer), only that line is sent - a newer line is left waiting for its own timer
+        - Call before relaying anything else to the channel, so the messages keep their order on IRC
+        """
+        with self.coalesce_lock:
+            waiting = self.coalesced.get((irc_network.network_name, irc_chan))
+            if waiting == None or (pending != None and waiting is not pending):
+                return
+            self.send_pending_to_irc(irc_network, irc_chan, waiting)
+
+    def send_pending_to_irc(self, irc_network, irc_chan, pending):
+        """ Send a waiting coalesced line & stop its window timer (call with the coalesce_lock held) """
+        del self.coalesced[(irc_network.network_name, irc_chan)]
+        pending.timer.cancel()
+        irc_network.send_irc_message(irc_chan, pending.line)
+
     def send_discord_message(self, discord_chan, message):
         """
         # Send Discord Message
         - Send messages to the discord through slowed/timed/filtered util
         """
         if self.sendmymsg_lastcall == 0:
-            self.sendmymsg_lastcall = time.time()
-        ctime = time.time()
+            self.sendmymsg_lastcall = clock.now()
+        ctime = clock.now()
         diff = ctime - self.sendmymsg_lastcall
         if diff < 1:
             self.sendmymsg_delay += 0.1
@@ -226,6 +390,45 @@ class Discord:
         self.update_known_users()
         return self.known_users
 
+    def remember_member(self, member, channels):
+        """ Cache a Discord member (seen on the given bridged channels) to known users & the mention index """
+        new_user_info = DiscordUserInfo(
+            user_id = member.id,
+            user_name = member.name,
+            user_nick = member.display_name,
+            status = member.status,
+            guilds = set(channels)
+        )
+        self.known_users[member.display_name] = new_user_info
+        self.mention_index.add_user(member.id, [
+            (member.display_name, MENTION_DISPLAY_NAME),
+            (member.nick, MENTION_NICK),
+            (member.global_name, MENTION_NICK),
+            (member.name, MENTION_USER_NAME),
+        ])
+
+    def forget_member(self, member, display_name=None):
+        """ Remove a Discord member from known users (by the given / current display name) & the mention index """
+        if display_name == None:
+            display_name = member.display_name
+        user_in_dict = self.known_users.get(display_name)
+        if user_in_dict != None and user_in_dict.user_id == member.id:
+            del self.known_users[display_name]
+        self.mention_index.remove_user(member.id)
+
+    def get_bridged_channels_of(self, member):
+        """ Returns the bridged Discord channels that the member can see """
+        channels = []
+        for item in settings["channel_sets"]:
+            channel = settings["channel_sets"][item].get("real_chan")
+            if channel != None and channel.permissions_for(member).read_messages:
+                channels.append(channel)
+        return channels
+
+    def resolve_mentions(self, message):
+        """ Replace @mentions of known Discord users in an IRC-message with working Discord mentions """
+        return self.mention_index.resolve(message)
+
     def update_known_users(self):
         """
         # Fetches all user-data from connected Discord servers/channels
@@ -251,14 +454,7 @@ class Discord:
 
             # Save the users to bots discord-user-dictionary
             for member in all_members_in_channel:
-                new_user_info = DiscordUserInfo(
-                    user_id = member.id,
-                    user_name = member.name,
-                    user_nick = member.display_name,
-                    status = member.status,
-                    guilds = {currentChannel}
-                )
-                self.known_users[member.display_name] = new_user_info
+                self.remember_member(member, {currentChannel})
         debug_print("[Discord] Known users / details updated") # Debug print all member infos
 
     #####################################
@@ -347,6 +543,10 @@ class Discord:
 #          MISC. UTILITIES          # 
 ##################################### 
 
+def get_irc_of(channel_id):
+    """ Returns the IRC (-network) bridged to a Discord-channel: the channel set's "network", or the default network """
+    return irc.get_network(settings["channel_sets"][str(channel_id)].get("network"))
+
 def debug_print(message):
     """ debug print - with thread lock to the console """
     global thread_lock
@@ -374,29 +574,13 @@ def get_urls_from_attachments(attach):
             add = " | "
     return urls
 
-def dressup_replace(m, substr, replacement):
-    """ Util function for replacing substrings with another substrings within a string (?) """
-    if m.count(substr) == 1:
-        return m
-    m = m.replace(substr, replacement)
-    return m
-
 def irc_dressup(m):
     """ Helper function which will process a string to make it IRC-compatible
+    - Discord markdown (bold / italic / underline / strikethrough) to IRC control codes, code & URLs kept as they are
+    - (single scan of the message, see ircformat.markdown_to_irc)
     - returns the IRC compatible string
     """
-    msplit = m.split()
-    for i in range(len(msplit)):
-        if msplit[i].startswith("http") or msplit[i].startswith("<http"):
-            msplit[i] = msplit[i].replace("_", "underdashreplacementplaceholderdiscordbotregexsucks")
-    m = " ".join(msplit)
-    m = dressup_replace(m, "***", "\x1d" + "\x02")
-    m = dressup_replace(m, "**", "\x02")
-    m = dressup_replace(m, "*", "\x1d")
-    m = dressup_replace(m, "```", "")
-    m = dressup_replace(m, "_", "\x1d")
-    m = m.replace("underdashreplacementplaceholderdiscordbotregexsucks", "_")
-    return m
+    return ircformat.markdown_to_irc(m)
 
 def get_reference(reference_message, pin, new_msg_author, webhookid):
     """ 
@@ -562,6 +746,53 @@ async def on_presence_update(before, after):
         user_in_dict = discordc.known_users[dname]
         user_in_dict.status = str(after.status)
 
+#####################################
+#  Discord -member handling         #
+#####################################
+def is_bridged_server(guild):
+    """ True if the guild is the Discord server that is bridged (see settings) """
+    return str(guild.id) == discord_settings["server"]
+
+@discord_bot.event
+async def on_member_join(member):
+    """ New member on the server - index for mentions if they can see a bridged channel """
+    if not is_bridged_server(member.guild):
+        return
+    channels = discordc.get_bridged_channels_of(member)
+    if channels:
+        discordc.remember_member(member, channels)
+
+@discord_bot.event
+async def on_member_remove(member):
+    """ Member left the server - forget them """
+    if is_bridged_server(member.guild):
+        discordc.forget_member(member)
+
+@discord_bot.event
+async def on_member_update(before, after):
+    """ Member changed their server nickname (or roles) - re-index the names """
+    if not is_bridged_server(after.guild) or (before.display_name == after.display_name and before.nick == after.nick):
+        return
+    discordc.forget_member(before)
+    channels = discordc.get_bridged_channels_of(after)
+    if channels:
+        discordc.remember_member(after, channels)
+
+@discord_bot.event
+async def on_user_update(before, after):
+    """ User changed their user name / global display name - re-index the names """
+    if before.name == after.name and before.global_name == after.global_name:
+        return
+    server = discord_bot.get_guild(int(discord_settings["server"]))
+    member = server.get_member(after.id) if server != None else None
+    if member == None:
+        return
+    user_in_dict = discordc.known_users.get(before.display_name) or discordc.known_users.get(member.display_name)
+    if user_in_dict == None or user_in_dict.user_id != member.id:
+        return # Not on the bridged channels
+    discordc.forget_member(member, before.display_name)
+    discordc.remember_member(member, user_in_dict.guilds)
+
 #####################################
 #  Discord -edit handling           #
 #####################################
@@ -591,13 +822,14 @@ async def on_message_edit(before, after):
     
         # Get channel & message details
         irc_chan = settings["channel_sets"][str(before.channel.id)]["irc_chan"]
+        irc_network = get_irc_of(before.channel.id)
         author = str(before.author.display_name)
 
         # fix timestamp & Format as HH-MM 
         timeFormatted = give_local_timestamp_string(before.created_at)
 
         # Update last used channels
-        irc.last_used_channel = after.channel
+        irc_network.last_used_channel = after.channel
         discordc.last_used_channel = after.channel
 
         cleanedBefore = irc_dressup(beforecontent)
@@ -606,8 +838,9 @@ async def on_message_edit(before, after):
 
         editMessage = f'{discord_settings["relayTagUsed"]}{discord_settings["relayNickPrefix"]}{author}{discord_settings["relayNickPostfix"]} {cleanedAfter} ([EDIT] {timeFormatted} <{author}> {shortMessage})'
 
-        # and Relay to IRC
-        irc.send_irc_message(irc_chan, editMessage)
+        # and Relay to IRC (after the author's possibly still waiting messages)
+        discordc.flush_coalesced(irc_network, irc_chan)
+        irc_network.send_irc_message(irc_chan, editMessage)
 
         # debug print on console log
         debug_print("[Discord] " + editMessage)
@@ -637,12 +870,13 @@ async def on_reaction_add(reaction, user):
         content = msg.clean_content
         author = msg.author
 
+        irc_chan = settings["channel_sets"][str(channel_id)]["irc_chan"]
+        irc_network = get_irc_of(channel_id)
+
         # Update last used channels
-        irc.last_used_channel = reaction.message.channel
+        irc_network.last_used_channel = reaction.message.channel
         discordc.last_used_channel = reaction.message.channel
 
-        irc_chan = settings["channel_sets"][str(channel_id)]["irc_chan"]
-
         # fix timestamp & Format as HH-MM 
         timeFormatted = give_local_timestamp_string(msg.created_at)
 
@@ -657,8 +891,9 @@ async def on_reaction_add(reaction, user):
         # fix some of the "known" formatting problems with current formats/syntaxes
         fixedMessage = do_extra_tag_cleanups(fixedMessage)
 
-        # Relay to IRC
-        irc.send_irc_message(irc_chan, fixedMessage)
+        # Relay to IRC (after the possibly still waiting messages)
+        discordc.flush_coalesced(irc_network, irc_chan)
+        irc_network.send_irc_message(irc_chan, fixedMessage)
 
         # debug print on console log
         debug_print("[Discord] " + fixedMessage)
@@ -690,8 +925,7 @@ async def on_message(message):
         return
 
     #==================================
-    # Update last used channels
-    irc.last_used_channel = message.channel
+    # Update last used channel
     discordc.last_used_channel = message.channel
 
     ref = ""
@@ -713,8 +947,10 @@ async def on_message(message):
         return
     
     #==================================
-    # Get matching irc-channel
+    # Get matching irc-channel (& the IRC-network it is on)
     irc_chan = settings["channel_sets"][channel_id]["irc_chan"]
+    irc_network = get_irc_of(channel_id)
+    irc_network.last_used_channel = message.channel
 
     #==================================
     # Detect if a message was pinned
@@ -767,12 +1003,23 @@ async def on_message(message):
     ###################################
 
     # Fix the discord message to include author & send to IRC
-    fixedMessage = f'{discord_settings["relayTagUsed"]}{discord_settings["relayNickPrefix"]}{message.author.display_name}{discord_settings["relayNickPostfix"]} {content}'
+    # (only the message is markdown - the display name is relayed as it is)
+    ircContent = irc_dressup(content)
+    fixedMessage = f'{discord_settings["relayTagUsed"]}{discord_settings["relayNickPrefix"]}{message.author.display_name}{discord_settings["relayNickPostfix"]} {ircContent}'
     # Send the fixed discord-message to IRC:
-    irc.send_irc_message(irc_chan, irc_dressup(fixedMessage))
+    # - commands are not coalesced, so that the bot's reply comes after the command on IRC
+    if content.startswith("!"):
+        discordc.flush_coalesced(irc_network, irc_chan)
+        irc_network.send_irc_message(irc_chan, fixedMessage)
+    # - puppet mode: from the user's own IRC-connection (through the bot, if the user can't have one)
+    elif irc_network.puppets.enabled:
+        discordc.flush_coalesced(irc_network, irc_chan)
+        irc_network.send_as_discord_user(authorid, message.author.display_name, irc_chan, ircContent, fixedMessage)
+    else:
+        discordc.send_coalesced_to_irc(irc_network, irc_chan, authorid, fixedMessage, ircContent)
 
-    # Scrape URL's from discord messages and relay the titles to IRC
-    timers.add_timer("", 1, irc.try_to_process_message_urls, content, irc_chan)
+    # Scrape URL's from discord messages and relay the titles to IRC (on the I/O pool)
+    timers.add_timer("", 1, irc_network.try_to_process_message_urls, content, irc_chan, executor=timers.EXEC_IO)
 
     ###################################
     #  USER & BOT OPERATOR COMMANDS   #
@@ -795,11 +1042,11 @@ async def on_message(message):
 
         # Bot irc nickname change
         if cmd == "!nick" and len(contentsplit) == 2:
-            irc.change_bot_ircnick(contentsplit[1])
+            irc_network.change_bot_ircnick(contentsplit[1])
             
         # Add given IRC-user to ignore join/part/quit -list
         elif cmd == "!ignorequits" and len(contentsplit) == 2:
-            irc.ignore_user_joinsquits(irc_chan, contentsplit[1])
+            irc_network.ignore_user_joinsquits(irc_chan, contentsplit[1])
 
     #==================================
     # Public commands block
@@ -818,29 +1065,29 @@ async def on_message(message):
     # Bridge uptime commmand - Simply sends the bot's uptime to Discord and IRC.
     elif cmd == "!status" or cmd == "!tila":
         uptime = irc.get_uptime()
-        irc.send_irc_and_discord(irc_chan, f'{irc.get_word("bridge_uptime")} {uptime}')
+        irc_network.send_irc_and_discord(irc_chan, f'{irc.get_word("bridge_uptime")} {uptime}')
     
     # Who are around in linked IRC-channel
     elif cmd == "!who" or cmd == "!ketä" or cmd == "!kuka":
-        irc.query_irc_names_to_discord(irc_chan)
+        irc_network.query_irc_names_to_discord(irc_chan)
     
     # Topic of the linked IRC-channel
     elif cmd == "!topic" or cmd == "!otsikko":
-        irc.query_irc_topic_to_discord(irc_chan)
+        irc_network.query_irc_topic_to_discord(irc_chan)
             
-    # Report the current BTC/USD value to both linked channels
+    # Report the current BTC/USD value to both linked channels (http-request -> on the I/O pool)
     elif cmd == "!btc":
-        irc.report_btc_usd_valuation(irc_chan)
+        timers.add_timer("", 0, irc_network.report_btc_usd_valuation, irc_chan, executor=timers.EXEC_IO)
             
     # Report the current MSTR/USD value to both linked channels
     elif cmd == "!mstr":
-        irc.report_mstr_valuation(irc_chan)
+        timers.add_timer("", 0, irc_network.report_mstr_valuation, irc_chan, executor=timers.EXEC_IO)
 
     # Report the current market value for requested market symbol through yahoo finance
     elif cmd == "!stock" or cmd == "!value" or cmd == "!kurssi":
         if len(contentsplit) == 2:
             symbol_to_query = contentsplit[1]
-            irc.get_and_report_stock_value(irc_chan, symbol_to_query)
+            timers.add_timer("", 0, irc_network.get_and_report_stock_value, irc_chan, symbol_to_query, executor=timers.EXEC_IO)
 
     # Change language
     elif cmd == "!speak" or cmd == "!viännä" or cmd == "!puhu":
@@ -954,14 +1201,7 @@ async def on_ready():
             for member in all_members_in_channel:
                 print(f"[Discord]  - name:{member.name} / nick: {member.nick} / display: {member.display_name} (id:{member.id} (status: {member.status}))")
                 # Save the users to bot-dictionary
-                new_user_info = DiscordUserInfo(
-                    user_id = member.id,
-                    user_name = member.name,
-                    user_nick = member.display_name,
-                    status = member.status,
-                    guilds = {currentChannel}
-                )
-                discordc.known_users[member.display_name] = new_user_info       
+                discordc.remember_member(member, {currentChannel})
 
         # Discord initialization ok
         discordc.connected_to_discord = 1
@@ -969,5 +1209,6 @@ async def on_ready():
         if discordc.temp_status_message != "":
             discordc.set_status(discordc.temp_status_message)
 
-        # Give channels to irc
-        irc.set_irc_channel_sets(settings["channel_sets"])
+        # Give channels to irc (each network takes the channel sets bridged to it)
+        for network in irc.loop.networks.values():
+            network.set_irc_channel_sets(settings["channel_sets"])
@@ -1,14 +1,190 @@
 import irc.client
+import collections
 import logging
+import select
+import socket
+import threading
 import time
 import timers
+import clock
+import ircqueue
+import ircformat
+import ircstate
+import ircproto
+import ircreconnect
+import puppets
 import re
 import requests               # 
 from bs4 import BeautifulSoup # requests and bs4 are for http-page requests and the page Title + video Duration reporting to IRC
 
 settings = None
 irc_settings = None
-bot_words = None
+# Flat lookup tables of the used language (English merged in as the fallback): (words, help texts, IRC-safe help texts)
+# - rebuilt & swapped in one assignment by build_localization_tables() when the language changes
+localization_tables = ({}, {}, {})
+
+def build_localization_tables(language):
+    """
+    # Build Localization Tables
+    - Merge the language's words & help texts over the English ones (the fallback for missing words)
+    - Pre-render the IRC-variants of the help texts (no line breaks on IRC)
+    - returns the (words, help texts, IRC-safe help texts) -tuple
+    """
+    english = settings["localization"]["en"]
+    words = {word: text for word, text in english.items() if word != "help_dict"}
+    help_texts = dict(english["help_dict"])
+    if language != "en":
+        words.update({word: text for word, text in settings["localization"][language].items() if word != "help_dict"})
+        help_texts.update(settings["localization"][language].get("help_dict", {}))
+    irc_help_texts = {command: text.replace("\n", "-") for command, text in help_texts.items()}
+    return (words, help_texts, irc_help_texts)
+
+# Query type token of our WHOX -queries ("WHO #channel %tchnf,152") - tells our replies from the others
+whox_token = "152"
+
+# Name of the IRC-network configured in the "irc" -settings (the channel sets without a "network")
+default_network = "default"
+
+def get_network_settings(network_name):
+    """ Returns the settings of an IRC-network: the "irc" -settings, with the network's own settings from "irc_networks" over them """
+    network_settings = dict(irc_settings)
+    if network_name != default_network:
+        if network_name not in settings.get("irc_networks", {}):
+            print(f"[IRC] No settings for IRC-network '{network_name}' in irc_networks")
+            raise Exception(f"Unknown IRC-network '{network_name}'")
+        network_settings.update(settings["irc_networks"][network_name])
+    return network_settings
+
+class IRCLoop:
+    """
+        # IRC event loop
+        - One reactor & one thread for the connections to all the IRC-networks
+        - Blocks on the sockets of the connections until there is data from a server,
+          work queued by other threads (call_in_loop) or a timeout
+        - The networks (IRC -objects) are kept by their names in self.networks
+    """
+
+    def __init__(self):
+        # init Reactor - the IRC-event -handler
+        self.reactor = irc.client.Reactor()
+        irc.client.ServerConnection.buffer_class.encoding = "utf-8"
+        irc.client.ServerConnection.buffer_class.errors = "replace"        
+
+        self.is_running = 0
+        self.networks = {}                 # Network name -> IRC
+
+        # Event loop wake-up: other threads (Discord / timers) queue work for the IRC-thread with call_in_loop(),
+        # and write a byte to the wake-up socket to interrupt the loop's select() right away
+        self.loop_thread = None
+        self.loop_timeout = 1.0            # Max seconds the loop blocks on select() (the reactor's own timeouts are processed at least this often)
+        self.loop_calls = collections.deque()
+        self.wakeup_receiver, self.wakeup_sender = socket.socketpair()
+        self.wakeup_receiver.setblocking(False)
+        self.wakeup_sender.setblocking(False)
+
+    def add_network(self, network):
+        """ Add an IRC-network (IRC -object) to be driven by this loop """
+        self.networks[network.network_name] = network
+
+    def on_error(self, message):
+        """ Report a loop error (through the first network - the networks share the log) """
+        next(iter(self.networks.values())).on_error(message)
+
+    def run(self):
+        """
+        # Run IRC 
+        - Start the IRC-bot loop
+        - Connect to the servers of all the networks
+        - Keep processing IRC events
+        - Keep connections and handle the events until shutdown -signal received
+        """
+        self.is_running = 1
+        self.loop_thread = threading.current_thread()
+
+        # Initialize connection variables 
+        # & Connect to IRC-servers
+        for network in list(self.networks.values()):
+            network.start()
+        # ... if a connection fails, we will receive fail/disconnect event,
+        #     and the re-connecting is handled then from the event loop.
+
+        # IRC-bots event handling -loop
+        # - blocks on the sockets until there is data from the servers or work queued by other threads
+        while self.is_running:
+            try:
+                self.process_loop_once(self.loop_timeout)
+            except Exception as e:
+                self.on_error(f"Caught an error : {e}")
+
+    def stop(self):
+        """ Stop the irc-bot-loop """
+        self.is_running = 0
+
+    def process_loop_once(self, timeout):
+        """
+        # Process Loop Once
+        - Wait (select) until a server connection has data, the wake-up socket is written or the timeout passes
+        - Process the incoming IRC data & the reactor's timeouts
+        - Run the work queued by other threads through call_in_loop()
+        - Send what the flood controls of the networks let out
+        """
+        # Wake up also when the flood control of a network lets the next queued line out
+        for network in self.networks.values():
+            if network.outbound_wait != None:
+                timeout = min(timeout, network.outbound_wait)
+            puppet_wait = network.puppets.get_outbound_wait()
+            if puppet_wait != None:
+                timeout = min(timeout, puppet_wait)
+
+        sockets = self.reactor.sockets
+        sockets.append(self.wakeup_receiver)
+        readable, writable, errored = select.select(sockets, [], [], timeout)
+
+        if self.wakeup_receiver in readable:
+            readable.remove(self.wakeup_receiver)
+            self.drain_wakeups()
+        if readable:
+            self.reactor.process_data(readable)
+        self.reactor.process_timeout()
+        self.run_loop_calls()
+        for network in self.networks.values():
+            if network.outbound_queue.length > 0:
+                network.flush_outbound()
+            network.puppets.flush()
+
+    def call_in_loop(self, target, *arguments):
+        """
+        # Call in Loop
+        - Queue a function call to be run on the IRC-thread (IRC event loop)
+        - Wakes up the loop right away, if it is waiting for sockets
+        - Use this from the other threads (Discord / timers) for the outbound IRC-work
+        """
+        self.loop_calls.append((target, arguments))
+        try:
+            self.wakeup_sender.send(b"\0")
+        except (BlockingIOError, InterruptedError):
+            pass # The wake-up socket is already full = the loop is going to wake up anyway
+
+    def drain_wakeups(self):
+        """ Read the wake-up bytes out of the wake-up socket """
+        try:
+            while self.wakeup_receiver.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def run_loop_calls(self):
+        """ Run the function calls queued for the IRC-thread """
+        while self.loop_calls:
+            target, arguments = self.loop_calls.popleft()
+            try:
+                target(*arguments)
+            except Exception as e:
+                self.on_error(f"Error with queued call {getattr(target, '__name__', target)} : {e}")
+
+    def is_loop_thread(self):
+        """ Returns True if called from the IRC-thread (IRC event loop) itself """
+        return threading.current_thread() is self.loop_thread
 
 class IRC:
     """
@@ -28,154 +204,289 @@ class IRC:
             IRC-channel, when url-message found in Discord/IRC
     """
 
-    def __init__(self, settings_):##nik, srv, prt):
-        """ Save the bot-/bridge-settings and initialize logger and irc-bot """
+    def __init__(self, settings_, loop, network_name=default_network):##nik, srv, prt):
+        """ 
+        Save the bot-/bridge-settings and initialize logger and irc-bot 
+        - loop : the IRCLoop driving the connection (shared by all the networks)
+        - network_name : the network's name in "irc_networks" -settings (default_network = the "irc" -settings)
+        """
         
-        # Start Logger & File handler
+        # Start Logger & File handler (once - the networks share the log)
         self.irc_logger = logging.getLogger('ircc')
         self.irc_logger.setLevel(logging.ERROR)
 
-        irc_file_handler = logging.FileHandler('log_ircc_errors.log')  # Log to this file
-        irc_file_handler.setLevel(logging.ERROR)
+        if not self.irc_logger.handlers:
+            irc_file_handler = logging.FileHandler('log_ircc_errors.log')  # Log to this file
+            irc_file_handler.setLevel(logging.ERROR)
 
-        irclogformatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        irc_file_handler.setFormatter(irclogformatter)
-        self.irc_logger.addHandler(irc_file_handler)
+            irclogformatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            irc_file_handler.setFormatter(irclogformatter)
+            self.irc_logger.addHandler(irc_file_handler)
 
         # Save global settings
         global settings
         global irc_settings
-        global bot_words
         settings = settings_
         irc_settings = settings["irc"]
         # Save language & Used bot words
         used_language = settings["localization"]["used_language"]
-        bot_words = settings["localization"][used_language]
+        global localization_tables
+        localization_tables = build_localization_tables(used_language)
 
-        # init Reactor - the IRC-event -handler
-        self.reactor = irc.client.Reactor()
-        irc.client.ServerConnection.buffer_class.encoding = "utf-8"
-        irc.client.ServerConnection.buffer_class.errors = "replace"        
+        # The shared event loop & its Reactor - the IRC-event -handler
+        self.loop = loop
+        self.reactor = loop.reactor
+        self.network_name = network_name
+        self.network_settings = get_network_settings(network_name)
+        loop.add_network(self)
 
         # set configurations from the settings
         self.is_running = 0
         self.irc_connection_successful = 0
 
         ## ! See the settings.json "comments" - for details concerning the settings !
-        self.nick = irc_settings["bot_nickname"]
-        self.server = irc_settings["server"]
-        self.port = irc_settings["port"]
-        self.bot_hostname = irc_settings["bot_hostname"]
+        self.nick = self.network_settings["bot_nickname"]
+        self.server = self.network_settings["server"]
+        self.port = self.network_settings["port"]
+        self.bot_hostname = self.network_settings["bot_hostname"]
         self.connection = self.reactor.server()
         self.connection.sent_quit = 0
-        self.bot_realname = irc_settings["bot_realname"]
+        self.bot_realname = self.network_settings["bot_realname"]
         self.callbacksAdded = 0
+        # Handlers of the raw lines: the numerics the irc-library does not give us as named events (on IRCnet)
+        self.raw_handlers = ircproto.LineDispatcher()
+        self.raw_handlers.add_handler("020", self.on_rpl_connecting)
+        self.raw_handlers.add_handler("001", self.on_rpl_welcome)
+        self.raw_handlers.add_handler("263", self.on_rpl_tryagain)
+        self.raw_handlers.add_handler("331", self.on_rpl_notopic)
+        self.raw_handlers.add_handler("332", self.on_rpl_topic)
+        self.raw_handlers.add_handler("333", self.on_rpl_topicwhotime)
+        self.raw_handlers.add_handler("396", self.on_rpl_hosthidden)
+        # IRCv3 (see ircproto.CapNegotiation): the capability negotiation & the pushed away -states / batches
+        self.raw_handlers.add_handler("CAP", self.on_cap)
+        self.raw_handlers.add_handler("AWAY", self.on_away)
+        self.raw_handlers.add_handler("BATCH", self.on_batch)
+        self.ircv3 = self.network_settings.get("ircv3", True) # Ask for the IRCv3 capabilities when connecting
+        self.caps = ircproto.CapNegotiation()  # Capabilities of the current connection (none enabled without IRCv3)
+        self.batches = {}                  # Open BATCHes: reference -> {"type", "params", "channels": {channel: [nicks]}}
+        self.echo_pending = collections.deque(maxlen=100) # (channel, text, send time) of our lines waiting for their echo-message
+        self.late_line_age = 60            # Seconds - lines relayed to Discord later than this get their server-time shown
+        self.echo_sample_interval = 5      # Min seconds between the send-lag samples from the echoes
+        self.last_echo_sample = 0
 
         self.nick_prefix_in_discord = irc_settings['ircNickPrefix']
         self.nick_postfix_in_discord = irc_settings['ircNickPostfix']
         ## ! See the settings.json "comments" - for details concerning the settings !
         self.network = ""                  # Cached IRC-server Network's name (IRCnet / Quakenet etc..)
 
-        self.disconnectretries = 0         # Counter for disconnect retries
-        self.maxConnectRetries = 10        # How many connecting-retries allowed before failing
+        # Connection state machine: connecting (the servers raced in parallel) -> registering -> connected -> waiting (backoff) -> connecting ..
+        self.connection_state = ircreconnect.STATE_DISCONNECTED
+        self.servers = ircreconnect.get_server_list(self.network_settings) # (host, port) -list: "server" first, then the "alternative_servers"
+        self.current_server = None         # (host, port) of the server connected to
+        self.reconnect_backoff = ircreconnect.Backoff(self.network_settings.get("reconnect_delay_min", 2), self.network_settings.get("reconnect_delay_max", 300))
+        self.connect_timeout = self.network_settings.get("connect_timeout", 10)   # Seconds for a server to answer a TCP-connection
+        self.connect_stagger = self.network_settings.get("connect_stagger", 0.5)  # Seconds before racing the next server in parallel
+        self.register_timeout = 60         # Seconds for a connected server to welcome (001) us
+        self.maxConnectRetries = 10        # Failed attempts in a row before Discord is told (the attempts go on)
 
         self.irc_channel_sets = {}         # The full irc-channel - discord -channel/webhooks -dictionary
-        self.irc_channels_lists = {}       # Irc-channel <-> Irc-nicknames dictionary cache        
-        self.irc_user_statuses = {}        # Dict / cache for irc user channel-statuses @todo : could/should combine channel lists & user status to one dict
-        # @todo - in addition to caching just name + status ++ add also channel?
+        self.members = ircstate.MembershipStore() # Irc-channel <-> Irc-nicknames (host & channel-statuses) cache, with nick -> channels index
+        self.names_buffers = {}            # NAMES -replies (353) per channel, collected until the end of names (366)
+        self.who_buffers = {}              # WHO -replies (352 / WHOX 354) per channel: nick -> (flags, host), collected until the end of WHO (315)
+        self.whox = False                  # Server supports WHOX (ISUPPORT) - WHO asks only the needed fields
+        self.roster_cache_ttl = 300        # Seconds the channel rosters are kept over a reconnect
+        self.roster_cached_at = None       # When the connection was lost (rosters kept since)
+        self.chanmodes = ircstate.default_chanmodes # Server's CHANMODES -feature: which channel modes take parameters
+        self.targmax = {}                  # Server's TARGMAX -feature: command -> max targets per line (None = no limit)
+        self.chanlimit = {}                # Server's CHANLIMIT -feature: channel prefixes -> max channels to be on (None = no limit)
+        self.joining = set()               # Channels with a JOIN sent, waiting for the server's answer
+        self.join_fallback_delay = 5       # Seconds to wait for the end of the MOTD before joining anyway
         self.known_discord_users = {}      # IRC-bot -side cache of Discord-users
 
         self.myprivmsg_line = ""           # Cache of received last private line
+        self.split_limits = {}             # Cache of per-channel message byte budgets (cleared when myprivmsg_line changes)
         self.last_used_channel = ""     # Cache of last used discord channel
         self.channel_spam_prots = {}
+
+        # Outbound queue & flood control: lines per second and burst size (see settings.json)
+        # - the rate learned earlier for the server is applied once connected to it (see apply_learned_send_rate)
+        flood_bucket = ircqueue.TokenBucket(self.network_settings.get("flood_rate", 2.0), self.network_settings.get("flood_burst", 5))
+        self.outbound_queue = ircqueue.OutboundQueue(flood_bucket)
+        self.outbound_wait = None          # Seconds until the queued lines can continue (None = nothing queued)
+
+        # Adaptive send-rate: tuned at runtime from the PING/PONG lag & the server's throttling replies
+        self.send_rate = ircqueue.AdaptiveRate(flood_bucket, self.network_settings.get("flood_rate_min", 0.5), self.network_settings.get("flood_rate_max", 10.0))
+        self.lag_check_interval = 30       # Seconds between the lag-measuring PINGs
+        self.lag_ping = None               # (token, send time) of the PING waiting for its PONG
+        self.last_server_error = ""        # Last ERROR-message from the server (tells the reason of a disconnect)
+
+        # Puppet mode: active Discord users get their own IRC-connections on this network (see puppets.py & settings.json)
+        self.puppets = puppets.PuppetPool(self.reactor, self.get_puppet_servers, self.network_settings, self.call_in_loop, self.send_message, self.debug_print)
+        self.puppet_reap_interval = 60     # Seconds between the checks for idle puppets
       
     #####################################
     #        CORE RUN / STOP            # 
     #####################################
     
-    def run(self):
+    def start(self):
         """
-        # Run IRC 
-        - Start the IRC-bot loop
-        - Connect to server
-        - Keep processing IRC events
-        - Keep connection and handle the events until shutdown -signal received
+        # Start IRC 
+        - Called by the IRCLoop on its thread
+        - Connect to server (the loop keeps processing the IRC events)
         """
-        self.debug_print("[IRC] Starting irc-bot loop")
+        self.debug_print(f"[IRC] Starting irc-bot on network {self.network_name}")
 
         self.is_running = 1
-        self.start_time= int(time.time())
+        self.start_time= int(clock.now())
 
         # Initialize connection variables 
         # & Connect to IRC-server
         self.connect()
-        # ... if the connection fails, we will receive fail/disconnect event,
-        #     and the re-connecting is handled then from the event loop.
 
-        # IRC-bots event handling -loop
-        loop_process_time = 0.01 # 0.2 original -> 0.1, but fast messages not beying relayed still (?)
-        while self.is_running:
-            try:
-                self.reactor.process_once(loop_process_time)
-                time.sleep(loop_process_time)
-            except Exception as e:
-                self.on_error(f"Caught an error : {e}")
+    def call_in_loop(self, target, *arguments):
+        """ Queue a function call to be run on the IRC-thread (see IRCLoop.call_in_loop) """
+        self.loop.call_in_loop(target, *arguments)
+
+    def is_loop_thread(self):
+        """ Returns True if called from the IRC-thread (IRC event loop) itself """
+        return self.loop.is_loop_thread()
+
+    def add_handler(self, event_type, handler):
+        """ Add an IRC-event handler for this network's connection (the reactor & its handlers are shared by all the networks) """
+        def handle_own_events(connection, event):
+            if connection is self.connection:
+                return handler(connection, event)
+        self.reactor.add_global_handler(event_type, handle_own_events)
+
+    def get_network(self, network_name):
+        """ Returns the IRC -object of a network by its name (None = the default network) """
+        if network_name == None:
+            network_name = default_network
+        if network_name not in self.loop.networks:
+            self.debug_print(f"[IRC] Unknown IRC-network '{network_name}'")
+            raise Exception(f"Unknown IRC-network '{network_name}'")
+        return self.loop.networks[network_name]
 
     def connect(self):
         """ 
         # Connect to the irc server 
-        - Connect - and Retry connecting if it fails - to the IRC-server
-        - Add IRC-event message handlers
+        - Add IRC-event message handlers (once)
+        - Race the TCP-connections to the network's servers on the connect pool (see ircreconnect.race_connect),
+          the winner is registered on the IRC-thread (on_server_socket)
+        - Failures are retried with a growing delay (schedule_reconnect)
         """
-        self.debug_print("[IRC] Connecting to irc server ...")
+        if self.connection_state == ircreconnect.STATE_STOPPED or not self.is_running:
+            return
+        self.connection_state = ircreconnect.STATE_CONNECTING
+        self.debug_print(f"[IRC] Connecting to irc server ({', '.join(f'{host}:{port}' for host, port in self.servers)}) ...")
         self.discord.set_status("Connecting to IRC...")        
+
+        # Add event handlers / callbacks (but only once)
+        if self.callbacksAdded == 0:
+            self.add_handler("all_raw_messages", self.on_all_raw) # ! Should remove the RAW-messages after connection establishment to not spam !
+            self.add_handler("pubmsg", self.on_pubmsg)
+            self.add_handler("join", self.on_join)
+            self.add_handler("part", self.on_part)
+            self.add_handler("namreply", self.on_namreply)
+            self.add_handler("endofnames", self.on_endofnames)
+            self.add_handler("mode", self.on_mode)
+            self.add_handler("action", self.on_pubmsg)
+            self.add_handler("quit", self.on_quit)
+            self.add_handler("welcome", self.on_connect)
+            self.add_handler("endofmotd", self.on_endofmotd)
+            self.add_handler("nomotd", self.on_endofmotd)
+            for join_error in ("channelisfull", "inviteonlychan", "bannedfromchan", "badchannelkey", "toomanychannels"):
+                self.add_handler(join_error, self.on_join_failed)
+            self.add_handler("nicknameinuse", self.on_nicknameinuse)
+            self.add_handler("kick", self.on_kick)
+            self.add_handler("featurelist", self.on_featurelist)
+            self.add_handler("nick", self.on_nick)
+            self.add_handler("disconnect", self.on_disconnect)
+            self.add_handler("ping", self.on_ping)
+            self.add_handler("pong", self.on_pong)
+            self.add_handler("error", self.on_error_event)
+            self.add_handler("whoreply", self.on_whoreply)
+            self.add_handler("whospcrpl", self.on_whospcrpl)
+            self.add_handler("endofwho", self.on_endofwho)
+            self.add_handler("privmsg", self.on_privmsg)
+            self.add_handler("topic", self.on_topic)
+            #self.add_handler("privnotice", self.on_privnotice)
+            # Numeral hooks/handlers ("331" etc.) do not exist in the irc-library (it names them "notopic" ..)
+            # -> The numerics are dispatched from the Raw Handler through self.raw_handlers (see __init__)
+            self.callbacksAdded = 1            
+
+        # The TCP-connects block - they are raced on the connect pool
+        ircreconnect.race_connect(self.servers, self.on_race_done, self.connect_timeout, self.connect_stagger)
+
+    def on_race_done(self, sock, server, error):
+        """ The race to the servers is decided (on a pool / timer thread) - hand the socket or the error to the IRC-thread """
+        if error != None:
+            self.call_in_loop(self.on_connect_failed, str(error))
+            return
+        self.call_in_loop(self.on_server_socket, sock, server)
+
+    def on_server_socket(self, sock, server):
+        """ A server answered - register on it with the connected socket """
+        if self.connection_state != ircreconnect.STATE_CONNECTING:
+            sock.close() # Stopped meanwhile
+            return
+        host, port = server
+        self.connection_state = ircreconnect.STATE_REGISTERING
+        self.current_server = server
+        self.debug_print(f"[IRC] Connected to {host}:{port}, registering ...")
+        self.apply_learned_send_rate()
+        self.caps = ircproto.CapNegotiation()
         try:
-            c = self.connection
-
-            # Add event handlers / callbacks (but only once)
-            if self.callbacksAdded == 0:
-                c.add_global_handler("all_raw_messages", self.on_all_raw) # ! Should remove the RAW-messages after connection establishment to not spam !
-                c.add_global_handler("pubmsg", self.on_pubmsg)
-                c.add_global_handler("join", self.on_join)
-                c.add_global_handler("part", self.on_part)
-                c.add_global_handler("namreply", self.on_namreply)
-                c.add_global_handler("action", self.on_pubmsg)
-                c.add_global_handler("quit", self.on_quit)
-                c.add_global_handler("welcome", self.on_connect)
-                c.add_global_handler("nicknameinuse", self.on_nicknameinuse)
-                c.add_global_handler("kick", self.on_kick)
-                c.add_global_handler("featurelist", self.on_featurelist)
-                c.add_global_handler("nick", self.on_nick)
-                c.add_global_handler("disconnect", self.on_disconnect)
-                c.add_global_handler("ping", self.on_ping)
-                c.add_global_handler("error", self.on_error_event)
-                c.add_global_handler("whoreply", self.on_whoreply)
-                c.add_global_handler("privmsg", self.on_privmsg)
-                c.add_global_handler("topic", self.on_topic)
-                #c.add_global_handler("privnotice", self.on_privnotice)
-                # Numeral hooks/handlers do not seem to work for some reason on IRCnet ?
-                # -> Currently parsing these from Raw Events and calling these from the Raw Handler.. 
-                ## c.add_global_handler("331", self.on_rpl_notopic)
-                ## c.add_global_handler("332", self.on_rpl_topic)
-                ## c.add_global_handler("333", self.on_rpl_topicwhotime)
-                self.callbacksAdded = 1            
-            
-            c.connect(self.server, self.port, self.nick, None, self.bot_hostname, self.bot_realname)
-            # With successfull connection - add all callbacks
-            if self.connection:
-                self.debug_print("[IRC] Connecting ...")
+            # IRCv3: "CAP LS" before NICK / USER holds the registration until CAP END (servers without IRCv3 ignore it)
+            if self.ircv3:
+                sock.sendall(b"CAP LS 302\r\n")
+            self.connection.connect(host, port, self.nick, None, self.bot_hostname, self.bot_realname, connect_factory=lambda server_address: sock)
+        except (irc.client.ServerConnectionError, OSError) as e:
+            sock.close()
+            self.on_connect_failed(str(e))
+            return
+        if f"{self.network_name}-register" in timers.timers:
+            timers.cancel_timer(f"{self.network_name}-register")
+        timers.add_timer(f"{self.network_name}-register", self.register_timeout, self.call_in_loop, self.on_register_timeout)
+
+    def get_puppet_servers(self):
+        """ The servers for the puppets: the one the bot is connected to first, then the rest of the list """
+        current_server = self.current_server
+        if current_server == None:
+            return list(self.servers)
+        return [current_server] + [server for server in self.servers if server != current_server]
+
+    def on_register_timeout(self):
+        """ The server accepted the connection but never welcomed us - drop it (on_disconnect tries again) """
+        if self.connection_state != ircreconnect.STATE_REGISTERING:
+            return
+        self.on_error(f"[IRC] No welcome from {self.current_server[0]} in {self.register_timeout} seconds")
+        self.connection.disconnect("Registration timed out")
 
-            # Retry if unsuccessfull conncetion
-            else:
-                self.debug_print(f"[IRC] Problem connecting to server ... retrying")
-                self.connect() # retry
-                return
-            
-        # Retry if exception while connecting
-        except Exception as e:
-            self.on_error(f"[IRC] Problem connecting to server : {e} - retrying")
-            self.connect() # retry
+    def on_connect_failed(self, reason):
+        """ None of the servers could be connected - try again later """
+        self.on_error(f"[IRC] Problem connecting to server : {reason}")
+        self.schedule_reconnect()
+
+    def schedule_reconnect(self):
+        """ 
+        # Schedule Reconnect
+        - Wait for the next connection attempt - the delay grows with the failed attempts in a row (capped, with jitter)
+        - Discord is told once, when maxConnectRetries attempts in a row have failed - the attempts go on
+        """
+        if self.connection_state == ircreconnect.STATE_STOPPED or not self.is_running:
             return
+        self.connection_state = ircreconnect.STATE_WAITING
+        delay = self.reconnect_backoff.next_delay()
+        if self.reconnect_backoff.attempts == self.maxConnectRetries:
+            self.debug_print(f"[IRC] Failed to connect {self.maxConnectRetries} times, still trying.")
+            self.discord.send_to_all_discord_channels(f'`{self.get_word("retried")} {self.maxConnectRetries} {self.get_word("times_no_success")}: {self.network_name}`')
+
+        # Replace the old reconnection timer if there for some reason is/was any
+        if f"{self.network_name}-reconn" in timers.timers:
+            timers.cancel_timer(f"{self.network_name}-reconn")
+        timers.add_timer(f"{self.network_name}-reconn", delay, self.call_in_loop, self.connect)
+        self.debug_print(f"[IRC] Reconnecting in {delay:.1f} seconds (attempt {self.reconnect_backoff.attempts})")
         
     def bridge_shutdown(self, message):
         """ 
@@ -200,56 +511,126 @@ class IRC:
         # save current runtime settings AFTER Announcement - as we unload the discord channels before saving settings
         self.save_settings_to_json()
         
-        # shutdown
-        time.sleep(2)
-        self.discord.shutdown(reason)
+        # shutdown - in a while, when the announcements have been sent (the IRC-thread keeps running meanwhile)
+        if f"bridge-shutdown-{self.network_name}" not in timers.timers:
+            timers.add_timer(f"bridge-shutdown-{self.network_name}", 2, self.discord.shutdown, reason)
 
     def stop_loop(self):
-        """ Stop the main irc-bot-loop """
-        self.is_running = 0
+        """ Stop the main irc-bot-loop (of all the networks) """
+        for network in self.loop.networks.values():
+            network.is_running = 0
+        self.loop.stop()
 
     def sent_quit_on(self):
-        """ Set quit/shutdown variable as reaction to event """
-        self.connection.sent_quit = 1
+        """ Set quit/shutdown variable as reaction to event (on all the networks) """
+        for network in self.loop.networks.values():
+            network.connection.sent_quit = 1
+
+    def disconnect_all(self, message):
+        """ Disconnect the connections of all the networks with a quit message """
+        for network in self.loop.networks.values():
+            network.puppets.shutdown(message)
+            network.connection.disconnect(message)
 
     #####################################
     #        SEND MESSAGES              # 
     #####################################
 
-    def send_message(self, channel, msg, action=False):
-        """ Send a given message to a referred channel (as "action" if requested) """
+    def send_message(self, channel, msg, action=False, priority=ircqueue.PRIORITY_CHAT):
+        """ 
+        # Send Message
+        - Send a given message to a referred channel (as "action" if requested)
+        - The message parts are queued to the outbound queue (per-channel order kept) and sent 
+          as fast as the flood control allows
+        - priority : ircqueue.PRIORITY_CHAT for chat, ircqueue.PRIORITY_NOISE for bot noise (URL previews, announcements..)
+        """
+        # Sending happens on the IRC-thread - queue the sends from the other threads
+        if not self.is_loop_thread():
+            self.call_in_loop(self.send_message, channel, msg, action, priority)
+            return
         if not self.connection.is_connected():
             return
         
         # Split the message into suitable parts
         #self.debug_print(self.get_myprivmsg_line(channel))
-        msg_parts = self.split_msg(msg, 479 - len(self.get_myprivmsg_line(channel))) # Need to split the messages to shorter pieces to ensure no missing words !
-
-        # Check for split/multi message send
-        if len(msg_parts) > 1:          
-            # Send each part with a consistent delay
-            send_delay = 0.1  
-            for part in msg_parts:
-                # time.sleep(0.5)  # Fixed delay between messages
-                if action:
-                    #self.connection.action(channel, f"{part}")
-                    #self.debug_print(f"send part-action {channel} : {part}")
-                    timers.add_timer("", send_delay, self.connection.action, channel, f"{part}")
-                else:
-                    #self.connection.privmsg(channel, f"{part}")
-                    #self.debug_print(f"send part-msg {channel} : {part}")
-                    timers.add_timer("", send_delay, self.connection.privmsg, channel, f"{part}")
-                send_delay += 0.4                
-        # Send a single message with no delay
-        else: 
-            for part in msg_parts:
-                if action:
-                    #self.debug_print(f"send action {channel} : {part}")
-                    self.connection.action(channel, f"{part}")
-                else:
-                    #self.debug_print(f"send msg {channel} : {part}")
-                    self.connection.privmsg(channel, f"{part}")
+        msg_parts = self.split_msg(msg, self.get_split_limit(channel)) # Need to split the messages to shorter pieces to ensure no missing words !
+
+        for part in msg_parts:
+            self.outbound_queue.put(channel, (channel, part, action), priority)
+        self.flush_outbound()
+
+    def send_as_discord_user(self, user_id, name, channel, message, fallback_line):
+        """
+        # Send as Discord User
+        - Send a Discord user's message through the user's own puppet connection (puppet mode)
+        - If the puppet can not take it (puppet mode off / pool full / connecting failed), 
+          the bot relays the 'fallback_line' ('[R] <name> message') as before
+        """
+        if not self.is_loop_thread():
+            self.call_in_loop(self.send_as_discord_user, user_id, name, channel, message, fallback_line)
+            return
+        if not self.puppets.send(user_id, name, channel, message, fallback_line):
+            self.send_message(channel, fallback_line)
+
+    def reap_idle_puppets(self):
+        """ self-repeating timer: disconnect the puppets of the Discord users who have gone quiet """
+        if not self.is_running:
+            return
+        timers.add_timer(f"puppets-reap-{self.network_name}", self.puppet_reap_interval, self.reap_idle_puppets)
+        self.call_in_loop(self.puppets.reap_idle)
+
+    def flush_outbound(self):
+        """ Send the queued outbound lines that the flood control allows right now - and remember when to try again """
+        if not self.connection.is_connected():
+            self.outbound_queue.clear()
+            self.outbound_wait = None
+            return
+        self.outbound_wait = self.outbound_queue.flush(self.send_outbound_line)
 
+    def send_lag_ping(self):
+        """
+        # Send Lag Ping
+        - self-repeating timer: PINGs the server with a token, the PONG tells the current lag (see on_pong)
+        - The lag grows when the server starts delaying our lines - a sign of sending too fast
+        """
+        if not self.is_running:
+            return
+        timers.add_timer(f"irc-lagcheck-{self.network_name}", self.lag_check_interval, self.send_lag_ping)
+        self.call_in_loop(self.send_lag_ping_in_loop)
+
+    def send_lag_ping_in_loop(self):
+        """ Send the lag-measuring PING from the IRC-thread """
+        if not self.connection.is_connected():
+            self.lag_ping = None
+            return
+        currtime = clock.now()
+        token = f"lag-{currtime:.3f}"
+        self.lag_ping = (token, currtime)
+        self.connection.ping(token)
+
+    def update_send_rate(self, rate):
+        """ Remember the learned send-rate per server (the one connected to) - saved to settings.json with the other runtime settings """
+        if "learned_flood_rates" not in irc_settings:
+            irc_settings["learned_flood_rates"] = {}
+        server = self.current_server[0] if self.current_server != None else self.server
+        irc_settings["learned_flood_rates"][server] = round(rate, 2)
+
+    def apply_learned_send_rate(self):
+        """ Connected to a server: start from the rate learned earlier for it (or the configured flood_rate), clamped to flood_rate_min / _max """
+        rate = irc_settings.get("learned_flood_rates", {}).get(self.current_server[0], self.network_settings.get("flood_rate", 2.0))
+        rate = self.send_rate.reset(rate)
+        self.debug_print(f"[IRC] Send-rate for {self.current_server[0]}: {rate:.2f} lines/s")
+
+    def send_outbound_line(self, line):
+        """ Send a single line from the outbound queue to the IRC-server """
+        channel, part, action = line
+        # IRCv3 echo-message: the server sends the line back once it has handled it - the wait is the send-lag
+        if self.caps.has("echo-message"):
+            self.echo_pending.append((channel, part, clock.now()))
+        if action:
+            self.connection.action(channel, part)
+        else:
+            self.connection.privmsg(channel, part)
 
     def send_irc_message(self, irc_chan, message):
         """ The IRC-Bot sends a given message to the referred channel """
@@ -268,16 +649,21 @@ class IRC:
             self.discord.send_discord_message(self.last_used_channel, message)
 
     def send_to_all_irc_channels(self, message):
-        """ Send message to all joined/known IRC-channels """
+        """ Send message to all joined/known IRC-channels (on all the networks) """
+        for network in self.loop.networks.values():
+            for irc_chan in network.irc_channel_sets:
+                network.send_irc_message(irc_chan, message)
+
+    def send_to_bridged_discord_channels(self, message):
+        """ Send message to the Discord-channels bridged to this network's IRC-channels """
         for irc_chan in self.irc_channel_sets:
-            self.send_irc_message(irc_chan, message)
+            self.discord.send_discord_message(self.irc_channel_sets[irc_chan]["real_chan"], message)
 
     def send_to_matching_discord(self, nick, message):
         """ Sends message to a DISCORD channel where the matching nickname / user is found """
-        for each_channel in self.irc_channels_lists:
-            if nick in self.irc_channels_lists[each_channel]:
-                if each_channel in self.irc_channel_sets:
-                    self.discord.send_irc_msg_to_discord(self.irc_channel_sets[each_channel]["real_chan"], None, message) # self.discord.send_discord_message(self.irc_channel_sets[each_channel]["real_chan"], message)
+        for each_channel in self.members.get_channels_of(nick):
+            if each_channel in self.irc_channel_sets:
+                self.discord.send_irc_msg_to_discord(self.irc_channel_sets[each_channel]["real_chan"], None, message) # self.discord.send_discord_message(self.irc_channel_sets[each_channel]["real_chan"], message)
 
     ############################################
     #            MISC UTILITIES                # 
@@ -296,17 +682,18 @@ class IRC:
         """
         # Change IRC Bot Language
         - take in parameter of new 'language code'
-        - Change bot's bot_word -dictioanry to refer to new language
+        - Rebuild the bot's localization tables for the new language
         """
         global settings
         if new_language == "used_language" or new_language == "_c13" or new_language == settings["localization"]["used_language"]:
             return # these are not valid language -options, other can be added. (or we dont want to change to same language we already using)
         
-        global bot_words
+        global localization_tables
         if new_language in settings["localization"]:
-            # if new language found, change IRC-bot language
+            # if new language found, change IRC-bot language (tables built first, then swapped in at once)
+            new_tables = build_localization_tables(new_language)
             settings["localization"]["used_language"] = new_language
-            bot_words = settings["localization"][new_language]
+            localization_tables = new_tables
             # Announce new language on all channels
             self.send_to_all_irc_channels(f"{self.get_word('new_language_announce')}")
             self.discord.send_to_all_discord_channels(f"{self.get_word('new_language_announce')}")
@@ -343,6 +730,21 @@ class IRC:
         """ Return a private message lien froma given channel (?) """
         return f"{self.myprivmsg_line} {channel} :"
 
+    def set_myprivmsg_line(self, source):
+        """ Cache the bot's own PRIVMSG-line prefix (nick!user@host) - and forget the byte budgets counted from the old one """
+        myprivmsg_line = f"{source} PRIVMSG"
+        if myprivmsg_line != self.myprivmsg_line:
+            self.myprivmsg_line = myprivmsg_line
+            self.split_limits.clear()
+
+    def get_split_limit(self, channel):
+        """ Returns how many bytes (UTF-8) of message text fit on one PRIVMSG-line to the channel (the rest is split to the next line) """
+        limit = self.split_limits.get(channel)
+        if limit == None:
+            limit = 479 - ircformat.get_byte_length(self.get_myprivmsg_line(channel))
+            self.split_limits[channel] = limit
+        return limit
+
     def set_discord(self, disc):
         """ Sets the global discord -variable from given param """
         self.discord = disc
@@ -361,7 +763,7 @@ class IRC:
         - calculated from the start time at request
         """
         result = ""
-        uptime = int(time.time()) - self.start_time
+        uptime = int(clock.now()) - self.start_time
         if raw == True:
             return uptime
         day = uptime // (24 * 3600)
@@ -395,65 +797,66 @@ class IRC:
         self.irc_channel_sets = {}
         for item in sets:
             value = sets[item]
+            if value.get("network", default_network) != self.network_name:
+                continue # Bridged to another network
             self.irc_channel_sets[value["irc_chan"]] = {"discord_chan": item, "webhook": value["webhook"], "real_chan": value["real_chan"]}
             self.channel_spam_prots[value["irc_chan"]] = {"topic_asked":0, "topic_told": 0, "topic":"", "names_asked": 0, "names_told" : 0, "names":""}
 
         # If IRC-connection is already established when receiving the channels, join to them
         if self.irc_connection_successful == 1:
-            self.slow_join_to_set_channels()
+            self.join_set_channels()
     
     def pop_from_channels(self, nick):
-        """ Removes the given nickname/users from a channel cache """
-        for each_channel in self.irc_channels_lists:
-            if nick in self.irc_channels_lists[each_channel]:
-                if each_channel in self.irc_channel_sets:
-                    self.irc_channels_lists[each_channel].pop(nick)
+        """ Removes the given nickname/users from all the channel caches - returns the channels the nick was on """
+        return self.members.remove_nick(nick)
 
     def is_on_channel(self, channel, nick):
         """ Returns true if a requested nickname is found from a given channel, false if not """
-        if nick in self.irc_channels_lists[channel]:
-            return True
-        else:
-            return False
+        return self.members.is_on(channel, nick)
 
     def query_irc_names_to_discord(self, channel):
-        """ Function which flags / implicates that the irc users are requested to discord as information """
+        """ 
+        # Query IRC Names to Discord
+        - Relay the users of an IRC-channel to Discord (!who)
+        - Answered from the channel member cache (kept up to date by the JOIN/PART/QUIT/KICK/NICK/MODE -events),
+          without asking the server
+        - Only if the channel's member list is not known yet, the names are requested from the server
+        """
+        # The member cache is updated on the IRC-thread - read it there
+        if not self.is_loop_thread():
+            self.call_in_loop(self.query_irc_names_to_discord, channel)
+            return
+        if channel in self.members.channels:
+            self.send_irc_names_to_discord(channel, self.members.format_names(channel, self.get_word("away")))
+            return
+
         # Check for channel specific spam prot
         if channel in self.channel_spam_prots:
             oldNamesTime = self.channel_spam_prots[channel]["names_asked"]
-            curTime = int(time.time()) # self.debug_print(f"spamtest names_asked | oldTime {oldNamesTime} curtime {curTime}")
+            curTime = int(clock.now()) # self.debug_print(f"spamtest names_asked | oldTime {oldNamesTime} curtime {curTime}")
             if oldNamesTime == 0 or oldNamesTime + 5 < curTime:
                 self.channel_spam_prots[channel]["names_asked"] = curTime     
             else: # self.debug_print("spamtest names_asked blocked")
                 return
         self.connection.names(channel)
 
-    def update_irc_users(self, channel, names):
-        """ Known irc users & statuses per channel - caching  """
-        splitNames = names.split()
-        prefix = ""
-        actual_name = ""
+    def update_irc_users(self, channel, entries):
+        """ 
+        # Update IRC Users
+        - Known irc users & statuses per channel - caching
+        - entries is the complete NAMES -list of the channel (all the 353 -replies), applied as a diff
+        """
+        names = {}
+        for entry in entries:
+            modes, nick, host = self.members.split_names_entry(entry)
+            names[nick] = (modes, host)
+        joined, left = self.members.replace_channel(channel, names)
 
-        for name in splitNames:
-            if name.startswith(("@", "+")):
-                prefix = name[0]
-                actual_name = name[1:]
-            else:
-                prefix = ""
-                actual_name = name
-            # update statuses
-            self.irc_user_statuses[actual_name] = prefix
-
-            # update the channel lists
-            if channel not in self.irc_channels_lists:
-                self.irc_channels_lists[channel] = {}
-            self.irc_channels_lists[channel][actual_name] = {"host": "?"}
-            
-        self.debug_print(f"[IRC] Users updated on channel :{str(channel)} {str(self.irc_user_statuses)}")
+        self.debug_print(f"[IRC] Users updated on channel :{str(channel)} ({len(names)} users, {len(joined)} new, {len(left)} gone)")
 
-    def get_irc_user_statuses(self):
-        """ Return the currently cachec IRC-users & their statuses """
-        return self.irc_user_statuses
+    def get_user_prefix(self, channel, nick):
+        """ Return the cached status-prefix ('@' / '+' / "") of an IRC-user on a channel """
+        return self.members.get_prefix(channel, nick)
     
     def get_word(self, request_word):
         """ 
@@ -462,16 +865,7 @@ class IRC:
         - returns the correct word by currently used language
         - or fallback to english word (or return error if requesting invalid word)
         """
-        # Get the word from currently used language
-        for word in bot_words:
-            if word == request_word:
-                return bot_words[word]
-        # Try to fallback and get the word from english
-        for word in settings["localization"]["en"]:
-            if word == request_word:
-                return settings["localization"]["en"][word]        
-        # return error
-        return "<missingword>"
+        return localization_tables[0].get(request_word, "<missingword>")
     
     def get_help(self, req_help):
         """ 
@@ -480,33 +874,36 @@ class IRC:
         - returns the correct help text by currently used language
         - or fallback to english"
         """        
-        # Get the word from currently used language
-        for word in bot_words["help_dict"]:
-            if word == req_help:
-                return bot_words["help_dict"][word]
-        # Try to fallback and get the word from english
-        for word in settings["localization"]["en"]["help_dict"]:
-            if word == req_help:
-                return settings["localization"]["en"]["help_dict"][word]        
-        # return error
-        return "<missingword>"
+        return localization_tables[1].get(req_help, "<missingword>")
+
+    def get_irc_help(self, req_help):
+        """ Same as get_help, but the IRC-safe variant (line breaks replaced) """
+        return localization_tables[2].get(req_help, "<missingword>")
         
     def get_help_dict(self):
-        """ Returns the by current language used help-dictionary  """
-        return bot_words["help_dict"]
+        """ Returns the by current language used help-dictionary (with the English fallbacks) """
+        return localization_tables[1]
     
     def change_bot_ircnick(self, new_botnick):
         """ Allows changeing of the bot's IRC name (in case of reconnects / auto-renames etc) - for bot operators only """        
         self.connection.nick(new_botnick)
         # Also change the bot nickname to (runtime) settings, to prevent auto nick name recovery
-        global irc_settings
-        irc_settings["bot_name"] = new_botnick
+        self.set_network_setting("bot_nickname", new_botnick)
+
+    def set_network_setting(self, key, value):
+        """ Change a setting of this IRC-network at runtime: in the network's settings in use, and in the settings saved to settings.json
+            ("irc" for the default network - network_settings is only a copy of it - or the network's own in "irc_networks") """
+        self.network_settings[key] = value
+        if self.network_name == default_network:
+            irc_settings[key] = value
+        else:
+            settings["irc_networks"][self.network_name][key] = value
 
     def try_to_get_original_nickname(self):
         """ The bot tries to use the originally set nickname again (which might have been lost on reconnect etc..) """        
         cnick = self.connection.get_nickname()
-        if cnick != irc_settings["bot_nickname"]:
-            newnick = irc_settings["bot_nickname"]
+        if cnick != self.network_settings["bot_nickname"]:
+            newnick = self.network_settings["bot_nickname"]
             self.connection.nick(newnick)
 
     def keep_set_nick_loop(self):
@@ -514,7 +911,7 @@ class IRC:
         # Try to recover the original nickname
         self.try_to_get_original_nickname()   
         # Check again in 10 seconds  
-        timers.add_timer("recover_botname", 10, self.keep_set_nick_loop)        
+        timers.add_timer(f"keep-botnick-{self.network_name}", 10, self.keep_set_nick_loop)        
       
     def ignore_user_joinsquits(self, irc_channel, user_to_ignore):
         """ if there is a known IRC-user causing join/part/quit -spam on the channel, you can set the nicknames with this function to ignore 
@@ -551,7 +948,7 @@ class IRC:
         # Check for channel specific spam prot
         if channel in self.channel_spam_prots:
             oldTopicTime = self.channel_spam_prots[channel]["topic_asked"]
-            curTime = int(time.time()) # self.debug_print(f"spamtest topic_asked | oldTime {oldTopicTime} curtime {curTime}")
+            curTime = int(clock.now()) # self.debug_print(f"spamtest topic_asked | oldTime {oldTopicTime} curtime {curTime}")
             if oldTopicTime == 0 or oldTopicTime + 5 < curTime:
                 self.channel_spam_prots[channel]["topic_asked"] = curTime
             else: # self.debug_print("spamtest topic_asked blocked")
@@ -573,78 +970,20 @@ class IRC:
         Processes and re-formats a given IRC message to be properly fit for sending to Discord.
         
         - Removes IRC color codes and formatting.
-        - Escapes underscores in URLs.
         - Converts IRC-style formatting to Markdown-compatible Discord formatting.
+        - (single scan of the message, see ircformat.irc_to_markdown)
         """
-        bold_italic = 0
-        # Use raw string for regex to avoid SyntaxWarning
-        regexc = re.compile(r"\x03(\d{1,2}(,\d{1,2})?)?", re.UNICODE)
-        
-        # Replace specific IRC formatting characters
-        message = message.replace("\x1d", "\\x1d")  # Temporarily escape underline
-        msplit = message.split()
-        
-        # Replace underscores in URLs with placeholder
-        for i in range(len(msplit)):
-            mi = msplit[i]
-            if mi.startswith("http") or mi.startswith("<http"):
-                msplit[i] = mi.replace("_", "pholderunderdash95130")
-        
-        # Rejoin the split message
-        message = " ".join(msplit)
-        
-        # Remove additional IRC formatting codes
-        message = message.replace(r"\x31", "")
-        message = message.replace("\x0f", "")
-        message = message.replace(chr(2) + chr(29), "***")
-        message = message.replace(chr(29) + chr(2), "***")
-        message = message.replace(chr(2), "**")
-        
-        # Ensure underline formatting is even
-        if message.count(chr(29)) % 2 != 0:
-            message = f"{message} {chr(29)}"
-        
-        # Restore escaped underline and clean up IRC color codes
-        message = message.replace("\\x1d", "_")
-        message = regexc.sub("", message)  # Remove color codes
-        
-        # Ensure Markdown bold/italic formatting is even
-        if message.count("***") % 2 != 0:
-            message = message + "***"
-            bold_italic = 1
-        if message.count("**") % 2 != 0:
-            if bold_italic == 0:
-                message = message + "**"
-        
-        # Restore underscores in URLs
-        message = message.replace("pholderunderdash95130", "_")
-        
-        return message
+        return ircformat.irc_to_markdown(message)
     
-    def split_msg(self, msg, max_chars):
+    def split_msg(self, msg, max_bytes):
         """        
         # Split Message
         - Split by spaces while preserving IRC formatting codes
-        - Processes a given string to an list/array of string with maximum character length
+        - Processes a given string to an list/array of string with maximum length in UTF-8 bytes
+        - Words longer than the limit are cut, without cutting multibyte characters or color codes
         - returns the processed string array/list
         """
-        all_pieces = []
-        current_piece = ""
-
-        msgsplit = re.split(r'(\s+)', msg)  # Retain whitespace as part of tokens
-        
-        for part in msgsplit:
-            if len(current_piece) + len(part) <= max_chars:
-                current_piece += part  # Append to the current piece
-            else:
-                if current_piece:  # Add the full piece to the list
-                    all_pieces.append(current_piece.strip())
-                current_piece = part  # Start a new piece
-                
-        if current_piece:  # Add the remaining part
-            all_pieces.append(current_piece.strip())
-   
-        return all_pieces
+        return ircformat.split_message(msg, max_bytes)
 
     def send_irc_topic_to_discord(self, topicString, irc_channel):
         """ 
@@ -657,7 +996,7 @@ class IRC:
         if irc_channel in self.channel_spam_prots:
             oldTopicTime = self.channel_spam_prots[irc_channel]["topic_told"]
             oldTopic = self.channel_spam_prots[irc_channel]["topic"]
-            curTime = int(time.time())  # self.debug_print(f"spamtest topic_told | oldTime {oldTopicTime} curtime {curTime}")
+            curTime = int(clock.now())  # self.debug_print(f"spamtest topic_told | oldTime {oldTopicTime} curtime {curTime}")
             if oldTopicTime == 0 or oldTopicTime + 5 < curTime:
                 self.channel_spam_prots[irc_channel]["topic_told"] = curTime
                 self.channel_spam_prots[irc_channel]["topic"] = topicString
@@ -679,31 +1018,11 @@ class IRC:
         # Debugs / Spam checks      
         self.debug_print(f"[IRC] Topic to [Discord] : {topicString}")
 
-    def process_and_send_topic_string(self, topicArgs):
+    def send_topic_reply(self, irc_channel, topicstring):
         """ 
-        # Utility to extract topic and get the known IRC-channel 
-        - then send the formatted channel-topic-info string
-          to matching discord channel
+        # Utility to send a topic reply (331 / 332) of an IRC-channel
+        - as the formatted channel-topic-info string to matching discord channel
         """
-
-        topicstring = re.sub(r'^:[^:]*:', '', str(topicArgs))
-
-        # Try to extract the irc-channel from the event reply itself
-        irc_channel = self.extract_first_irc_channel(topicArgs)
-        # ! Old way as backup: !
-        if irc_channel is None:
-            # @todo - better way to figure out the channel
-            #  becouse this does not work at bot join
-            irc_channel = "?"
-            for item in self.irc_channel_sets:
-                if self.irc_channel_sets[item]["real_chan"] == self.last_used_channel:
-                    irc_channel = item
-                    break
-            # The actual problem / bug lies in the fact that the 331/332/333 topic event 
-            # replies are a single plain string, from which there is no readily parsed
-            # IRC-channel to target these queries to @todo : parse the irc-channel 
-            # from the full event -sttring...
-
         # Format & fix the topic string to channel and to discord message
         fullTopicString = f'{self.get_word("topic_word")} @ {irc_channel} : **{topicstring}**'
 
@@ -718,7 +1037,7 @@ class IRC:
 
     def get_page_soup(self, url):
         """ Returns the Beautiful Soup -parse of html-page from URL address 
-        - Should call this by non-blocking means (timers) / from separate thread, to not block the event handlers """
+        - Should call this by non-blocking means (timers with executor=timers.EXEC_IO), to not block the event handlers """
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         } # Present ourself as a web-browser when making the page-requests, as some sites do not otherwise care to respond.
@@ -872,25 +1191,25 @@ class IRC:
             fullInfoString = f"({fullInfoString})"
             
             if (fullInfoString): # Send the title + duration info-string
-                self.send_message(irc_channel, fullInfoString)
+                self.send_message(irc_channel, fullInfoString, priority=ircqueue.PRIORITY_NOISE)
             if (description):    # Send the short-description info-string
                 description_string = f"({self.discord.give_short_version_of_message(description, 400)})"
-                self.send_message(irc_channel, description_string)
+                self.send_message(irc_channel, description_string, priority=ircqueue.PRIORITY_NOISE)
    
     def try_to_process_message_urls(self, message, irc_channel):
         """ Wrapper for processing the message URLs with exception handling 
-         - use this through timers/async to not block the threads while
-           processing the URLs """
+         - use this through timers on the I/O pool (executor=timers.EXEC_IO) to not
+           block the threads while processing the URLs """
         try:
             self.process_message_urls(message, irc_channel)
         except Exception as e:
             self.on_error(f"Problem with URL processing : {e}")
 
-    def print_discord_topic_to_irc(self, discord_chan, irc_chan):    
+    def print_discord_topic_to_irc(self, discord_chan, irc_chan, priority=ircqueue.PRIORITY_CHAT):    
             """ Print discord channel topic on the IRC channel  """
             topic = self.discord.get_discord_channel_topic(discord_chan)
             discordTopicMessage = f'[Discord] #{discord_chan} - {self.get_word("topic_is")}: {topic}'
-            self.send_message(irc_chan, discordTopicMessage)
+            self.send_message(irc_chan, discordTopicMessage, priority=priority)
 
     ################################################################
     #                                   
@@ -906,6 +1225,33 @@ class IRC:
             return
         return
 
+    def on_pong(self, connection, event):
+        """ Event handling for PONG-replies - measure the lag of our own lag-check PING and tune the send-rate """
+        if connection != self.connection or self.lag_ping == None:
+            return
+        token, sent_time = self.lag_ping
+        if token not in event.arguments and token != event.target:
+            return # Not our lag-check (e.g. a keep-alive of the irc -library)
+        self.lag_ping = None
+        self.on_lag_sample(clock.now() - sent_time)
+
+    def on_lag_sample(self, rtt):
+        """ Tune the send-rate with a measured lag (our lag-check PING's PONG / the echo of our own line) """
+        backlogged = self.outbound_queue.backlogged
+        self.outbound_queue.backlogged = False
+        old_rate = self.send_rate.get_rate()
+        rate = self.send_rate.on_rtt(rtt, backlogged)
+        if rate != old_rate:
+            self.update_send_rate(rate)
+            self.debug_print(f"[IRC] Lag {rtt:.2f}s - send-rate changed from {old_rate:.2f} to {rate:.2f} lines/s")
+
+    def on_server_throttling(self, reason):
+        """ The server told us to slow down (263 / Excess Flood) - cut the send-rate """
+        old_rate = self.send_rate.get_rate()
+        rate = self.send_rate.on_throttled()
+        self.update_send_rate(rate)
+        self.debug_print(f"[IRC] Throttled by the server ({reason}) - send-rate changed from {old_rate:.2f} to {rate:.2f} lines/s")
+
     def on_nicknameinuse(self, connection, event):
         """ Renames an irc-bot-client's nickname if given nickname was in use """
         cnick = connection.get_nickname()
@@ -917,52 +1263,81 @@ class IRC:
 
     def on_all_raw(self, connection, event):
         """
-        # Event handler for logging ALL raw data 
+        # Event handler for ALL raw data 
         - From the irc server (used while connecting/debugging)
         - Used to get the topic replies in IRCnet - as unable to catch them otherwise (?)
+        - Only the command of a line is peeked at, and the lines with a handler (self.raw_handlers) parsed & dispatched
         """
 
         # This prints all traffic from irc-server if handled
         # self.debug_print(f"[IRC][RAW] {event.source} - {event.type} - {event.arguments}")
+        if connection != self.connection:
+            return
+        self.raw_handlers.dispatch(event.arguments[0])
 
-        splitArgs = str(event.arguments)#.split()
+    def on_rpl_connecting(self, prefix, params):
+        """ 020 = Connection initializing / handshaking with server """
+        self.debug_print(f"[IRC][RAW] {params}")
 
-        # 020 = Connection initializing / handshaking with server
-        if " 020 " in splitArgs:            
-            self.debug_print(f"[IRC][RAW] {event.arguments}")
-            return
-        # 001 = Welcome message
-        elif " 001 " in splitArgs: # Connection successful & finalized (?)
-            self.irc_connection_successful = 1
-            self.debug_print(f"[IRC][RAW] {event.arguments}")
-            return
-        # 331 - No topic -reply
-        elif " 331 " in splitArgs:
-            self.on_rpl_notopic(connection, event)
-            return
-        # 332 - Topic reply
-        elif " 332 " in splitArgs:
-            self.on_rpl_topic(connection, event)
-            return
-        # 333 - Topic Who / When -reply
-        elif " 332 " in splitArgs:
-            self.on_rpl_topicwhotime(connection, event)
+    def on_rpl_welcome(self, prefix, params):
+        """ 001 = Welcome message - Connection successful & finalized (?) """
+        self.irc_connection_successful = 1
+        self.debug_print(f"[IRC][RAW] {params}")
+
+    def on_rpl_hosthidden(self, prefix, params):
+        """ 396 = RPL_HOSTHIDDEN - the server changed the bot's displayed host (a cloak): the PRIVMSG-prefix changes with it """
+        if len(params) < 2 or not self.myprivmsg_line:
             return
+        nick_user = self.myprivmsg_line[:-len(" PRIVMSG")].partition("@")[0]
+        host = params[1]
+        if "@" in host: # ("user@host" on some servers)
+            nick_user = nick_user.partition("!")[0] + "!" + host.partition("@")[0]
+            host = host.partition("@")[2]
+        self.set_myprivmsg_line(f"{nick_user}@{host}")
+
+    def on_rpl_tryagain(self, prefix, params):
+        """ 263 - RPL_TRYAGAIN - server is throttling our commands """
+        self.on_server_throttling("263")
       
     def on_namreply(self, connection, event):
-        """ Relay the returned names to Discord (per !who -request from Discord) 
-        - Check for channel-specific spam-protection """
+        """ Collect the returned names (353) - a big channel's list comes in several replies, up to the end of names (366) """
 
         if connection != self.connection: 
             return # self.debug_print("error?")
-        
-        channel = event.arguments[1]            
-        names = event.arguments[2]
+
+        channel = event.arguments[1]
+        if channel not in self.names_buffers:
+            self.names_buffers[channel] = []
+        self.names_buffers[channel].extend(event.arguments[2].split())
+
+    def on_endofnames(self, connection, event):
+        """ Apply the complete list of names to the user cache, and relay it to Discord (after joining / per !who -request from Discord) """
+
+        if connection != self.connection: 
+            return # self.debug_print("error?")
+
+        channel = event.arguments[0]
+        entries = self.names_buffers.pop(channel, [])
+        # Update the users
+        self.update_irc_users(channel, entries)
+        self.send_irc_names_to_discord(channel, self.members.format_names(channel, self.get_word("away")))
+
+        # WHO only when some member's host is still unknown - not with IRCv3 userhost-in-names,
+        # nor for the unchanged channels of a roster kept over a short reconnect
+        if channel in self.irc_channel_sets and any(member["host"] == "?" for member in self.members.get_members(channel).values()):
+            self.query_who(channel)
+
+    def send_irc_names_to_discord(self, channel, names):
+        """ Relay the names of an IRC-channel's users to the linked Discord-channel
+        - Check for channel-specific spam-protection """
+        if channel not in self.irc_channel_sets:
+            return
+
         # Check for channel specific spam prot
         if channel in self.channel_spam_prots:
             oldNamesTime = self.channel_spam_prots[channel]["names_told"]
             oldnames = self.channel_spam_prots[channel]["names"]
-            curTime = int(time.time()) # self.debug_print(f"spamtest names_told | oldTime {oldNamesTime} curtime {curTime}")
+            curTime = int(clock.now()) # self.debug_print(f"spamtest names_told | oldTime {oldNamesTime} curtime {curTime}")
             if oldNamesTime == 0 or oldNamesTime + 100 < curTime:
                 self.channel_spam_prots[channel]["names_told"] = curTime
                 self.channel_spam_prots[channel]["names"] = names
@@ -975,27 +1350,61 @@ class IRC:
         finalReply = f'{self.get_word("on_the_channel")} @ {channel} : **{names}**'
         #self.debug_print(finalReply)
 
-        # Update the users
-        self.update_irc_users(channel, names)
-
         # If requested - Send queried irc names to discord with small delay / to make webhook slower than bot itself..
         discord_chan = self.irc_channel_sets[channel]["real_chan"]
         timers.add_timer("", 1.0, self.discord.send_irc_msg_to_discord, discord_chan, None, finalReply)
         #self.discord.send_irc_msg_to_discord(discord_chan, None, finalReply) # self.discord.send_discord_message(discord_chan, finalReply)
 
-    def on_whoreply(self, connection, event):
-        """ Event handler for /who -reply """
+    def query_who(self, channel):
+        """ 
+        # Query WHO
+        - Ask the hosts, statuses & away -states of a channel's members - the replies are collected until the end of WHO (315)
+        - With WHOX (ISUPPORT) only the needed fields are asked: channel, host, nick & flags
+        """
+        if channel in self.who_buffers:
+            return # Already asked
+        self.who_buffers[channel] = {}
+        if self.whox:
+            self.connection.send_raw(f"WHO {channel} %tchnf,{whox_token}")
+        else:
+            self.connection.who(channel)
 
+    def on_whoreply(self, connection, event):
+        """ Event handler for /who -reply (352) - params: [channel, user, host, server, nick, flags, "hops realname"] """
+        if len(event.arguments) < 6:
+            return
+        channel = event.arguments[0]
         host = event.arguments[2]
         nick = event.arguments[4]
         #realname = event.arguments[6].split()[1]
-        channel = event.arguments[0]
+        if channel in self.who_buffers:
+            self.who_buffers[channel][nick] = (event.arguments[5], host)
+
+    def on_whospcrpl(self, connection, event):
+        """ Event handler for WHOX -reply (354) to our "%tchnf" -query - params: [token, channel, host, nick, flags] """
+        if len(event.arguments) < 5 or event.arguments[0] != whox_token:
+            return
+        token, channel, host, nick, flags = event.arguments[:5]
+        if channel in self.who_buffers:
+            self.who_buffers[channel][nick] = (flags, host)
 
-        if channel not in self.irc_channels_lists:
-            self.irc_channels_lists[channel] = {}
+    def on_endofwho(self, connection, event):
+        """ End of WHO (315) - apply the collected replies to the channel's roster in one go """
+        if not event.arguments:
+            return
+        channel = event.arguments[0]
+        entries = self.who_buffers.pop(channel, None)
+        if entries == None or channel not in self.irc_channel_sets:
+            return
 
-        self.irc_channels_lists[channel][nick] = {"host": host}
-        #self.debug_print(self.irc_channels_lists)
+        # Flags: "H" = here / "G" = gone (away), "*" = IRC-operator, then the status prefixes ("@+")
+        names = {}
+        for nick, (flags, host) in entries.items():
+            names[nick] = ("".join(symbol for symbol in flags if symbol in self.members.prefix_symbols), host)
+        joined, left = self.members.replace_channel(channel, names)
+        for nick, (flags, host) in entries.items():
+            self.members.set_user_info(nick, "away", "" if "G" in flags else None)
+        self.debug_print(f"[IRC] WHO of {channel} : {len(names)} users ({len(joined)} new, {len(left)} gone)")
 
     def on_join(self, connection, event):
         """ Event handler for IRC channel joins """
@@ -1010,29 +1419,31 @@ class IRC:
         discord_chan = self.irc_channel_sets[event.target]["real_chan"]
         self.last_used_channel = discord_chan
 
-        # check for ignored user event
-        if event.source.nick in irc_settings["ignore_parts_joins"]:
-            return # do not inform forwards
-        
         # Someone joining IRC channel
         if connection_name != event.source.nick:
-            if event.target not in self.irc_channels_lists:
-                self.irc_channels_lists[event.target] = {}
-
-            # Update the channel - nick -cache
-            self.irc_channels_lists[event.target][event.source.nick] = {"host": event.source.host}
+            # Update the channel - nick -cache (also for the ignored users - the cache is the channel's roster)
+            self.members.add(event.target, event.source.nick, host=event.source.host)
+            # IRCv3 extended-join: "JOIN #channel account :realname" ("*" = not logged in)
+            if self.caps.has("extended-join") and event.arguments:
+                self.members.set_user_info(event.source.nick, "account", None if event.arguments[0] == "*" else event.arguments[0])
+
+            # check for ignored user event (& our own puppets - the Discord user is already on Discord)
+            if event.source.nick in irc_settings["ignore_parts_joins"] or self.puppets.is_puppet(event.source.nick):
+                return # do not inform forwards
+            # Rejoins after a netsplit are told to Discord together, when the batch ends
+            if self.add_to_batch(event, "netjoin", event.target):
+                return
             
-            # Update known irc users / statuses & also notify the linked discord channel of fresh people        
-            self.query_irc_names_to_discord(event.target)
+            # Notify the linked discord channel of fresh people (statuses are kept up to date by the MODE -changes)
             self.discord.send_irc_msg_to_discord(discord_chan, None, f'**{event.source.nick} {self.get_word("joined")} {event.target}**')
 
         # The bot-connection itself joining
         else:
-            connection.who(event.target)
-            self.myprivmsg_line = f"{event.source} PRIVMSG"
+            # (The hosts of the members are asked with WHO after the NAMES, if needed - see on_endofnames)
+            self.members.add(event.target, event.source.nick, host=event.source.host)
+            self.set_myprivmsg_line(event.source)
             #self.debug_print(self.myprivmsg_line)
-
-            time.sleep(2)
+            self.joining.discard(event.target)
             self.debug_print(f"[IRC] Joined to channel {event.target}")
                 
             joinmsg = f"** `!! {self.get_word('connected')} 'IRC {event.target}' - 'Discord #{discord_chan}' -{self.get_word('bridge')} == {self.get_word('msgs_on_channels_being_relayed')} !!` **"
@@ -1040,18 +1451,15 @@ class IRC:
             # DO WE THOUGH ? -> Nope. -> Yep. More clear, maybe not more clean, in Discord.
             self.discord.send_discord_message(discord_chan, joinmsg)
             #self.discord.send_irc_msg_to_discord(discord_chan, None, joinmsg)
-            self.send_message(event.target, joinmsg)
+            self.send_message(event.target, joinmsg, priority=ircqueue.PRIORITY_NOISE)
 
-            # Also query the IRC topic and channel members and inform
-            # to DISCORD as soon as we are connected to IRC-channel
-            self.query_irc_topic_to_discord(event.target)
-            self.query_irc_names_to_discord(event.target)
-            # .. Actually should (?) happen automatically when joining a channel ? Also spam-protected (?)
+            # The IRC topic (332) & the channel members (NAMES) come automatically with the join, 
+            # and are relayed to DISCORD by on_rpl_topic & on_endofnames - no queries needed
 
             # Print discord channel topic on the IRC channel
             # And print the discord user statuses on IRC channel
-            self.print_discord_topic_to_irc(discord_chan, event.target)        
-            self.send_discord_users_to_irc(event.target)
+            self.print_discord_topic_to_irc(discord_chan, event.target, ircqueue.PRIORITY_NOISE)
+            self.send_discord_users_to_irc(event.target, ircqueue.PRIORITY_NOISE)
 
     def on_part(self, connection, event):
         """ Event handler for irc-user parts from channels """
@@ -1061,13 +1469,13 @@ class IRC:
         if connection != self.connection:
             return
 
-        # check for ignored user event
-        if event.source.nick in irc_settings["ignore_parts_joins"]:
-            return # do not inform forwards
-        
         discord_chan = self.irc_channel_sets[event.target]["real_chan"]
         if connection.get_nickname() != event.source.nick:
-            self.irc_channels_lists[event.target].pop(event.source.nick)
+            self.members.remove(event.target, event.source.nick)
+
+            # check for ignored user event (& our own puppets)
+            if event.source.nick in irc_settings["ignore_parts_joins"] or self.puppets.is_puppet(event.source.nick):
+                return # do not inform forwards
             
             if len(event.arguments) > 0:
                 reason = f"({event.arguments[0]})"
@@ -1075,26 +1483,95 @@ class IRC:
                 reason = "no reason"
             self.discord.send_irc_msg_to_discord(discord_chan, None, f'**{event.source.nick} {self.get_word("left_channel")} {event.target} ({self.get_word("reason")}: {reason})**') 
         else:
+            self.members.clear_channel(event.target) # Refreshed by the NAMES -reply after rejoining
             connection.join(event.target)
 
     def on_quit(self, connection, event):
         """ Event handler for irc-user quits """
         if connection != self.connection:
             return
-        if self.discord.is_running == 0:
-            return
-        if event.arguments[0]:
+        if event.arguments and event.arguments[0]:
             reason = str(event.arguments[0])
         else:
             reason = "no reason"
 
-        # check for ignored user event
-        if event.source.nick in irc_settings["ignore_parts_joins"]:
-            return # do not inform forwards
-
-        self.send_to_matching_discord(event.source.nick, f'**{event.source.nick} {self.get_word("quit_irc")} / {self.network} ({self.get_word("reason")}: {reason})**')
+        # Inform Discord - unless the user is ignored or our own puppet (the user leaves the channel caches anyway)
+        # - the quits of a netsplit are told together, when the batch ends
+        if self.puppets.is_puppet(event.source.nick):
+            self.puppets.forget_nick(event.source.nick)
+        elif event.source.nick in irc_settings["ignore_parts_joins"]:
+            pass
+        elif self.add_to_batch(event, "netsplit", *self.members.get_channels_of(event.source.nick)):
+            pass
+        elif self.discord.is_running != 0:
+            self.send_to_matching_discord(event.source.nick, f'**{event.source.nick} {self.get_word("quit_irc")} / {self.network} ({self.get_word("reason")}: {reason})**')
         self.pop_from_channels(event.source.nick)
 
+    def on_cap(self, prefix, params):
+        """ IRCv3 CAP -replies - answer the capability negotiation (see ircproto.CapNegotiation) """
+        for line in self.caps.on_cap(params):
+            self.connection.send_raw(line)
+        if len(params) > 1 and params[1].upper() == "ACK":
+            self.debug_print(f"[IRC] IRCv3 capabilities: {' '.join(sorted(self.caps.enabled))}")
+
+    def on_away(self, prefix, params):
+        """ IRCv3 away-notify: "AWAY :reason" = went away, "AWAY" = back """
+        nick = prefix.partition("!")[0] if prefix else ""
+        self.members.set_user_info(nick, "away", params[0] if params else None)
+
+    def on_batch(self, prefix, params):
+        """ IRCv3 BATCH: "+reference type [params]" opens a batch, "-reference" closes it (see add_to_batch) """
+        if not params or len(params[0]) < 2:
+            return
+        reference = params[0][1:]
+        if params[0][0] == "+":
+            self.batches[reference] = {"type": params[1].lower() if len(params) > 1 else "", "params": params[2:], "channels": {}}
+        else:
+            batch = self.batches.pop(reference, None)
+            if batch != None:
+                self.send_batch_to_discord(batch)
+
+    def add_to_batch(self, event, batch_type, *channels):
+        """ If the event is a part of an open batch of the type (netsplit / netjoin): collect the nick for the batch's Discord notice - returns True if collected """
+        batch = self.batches.get(ircproto.get_tag(event.tags, "batch"))
+        if batch == None or batch["type"] != batch_type:
+            return False
+        for channel in channels:
+            if channel in self.irc_channel_sets:
+                batch["channels"].setdefault(channel, []).append(event.source.nick)
+        return True
+
+    def send_batch_to_discord(self, batch):
+        """ Tell the netsplit / netjoin to the bridged Discord-channels - one notice per channel, instead of a quit / join per user """
+        if self.discord.is_running == 0:
+            return
+        servers = " ".join(batch["params"])
+        for channel, nicks in batch["channels"].items():
+            if channel not in self.irc_channel_sets:
+                continue
+            if batch["type"] == "netsplit":
+                notice = f'**{", ".join(nicks)} {self.get_word("quit_irc")} / {self.network} (netsplit {servers})**'
+            else:
+                notice = f'**{", ".join(nicks)} {self.get_word("joined")} {channel} (netjoin {servers})**'
+            self.discord.send_irc_msg_to_discord(self.irc_channel_sets[channel]["real_chan"], None, notice)
+
+    def on_echo(self, event):
+        """ IRCv3 echo-message: our own line came back - the time since sending it is the send-lag (sampled every echo_sample_interval seconds) """
+        currtime = clock.now()
+        # Find the line first: an echo altered by the server (+c colour stripping, trimming ..) or of a line that
+        # did not go through the queue matches nothing - and must not drop the lines still waiting for their echo
+        for index, (channel, part, sent_time) in enumerate(self.echo_pending):
+            if channel == event.target and part == event.arguments[0]:
+                break
+        else:
+            return
+        # The older lines (before the matched one) will not get their echo anymore
+        for i in range(index + 1):
+            self.echo_pending.popleft()
+        if currtime - self.last_echo_sample >= self.echo_sample_interval:
+            self.last_echo_sample = currtime
+            self.on_lag_sample(currtime - sent_time)
+
     def on_kick(self, connection, event):
         """ Event handler for IRC user kicks on channels """
 
@@ -1109,7 +1586,7 @@ class IRC:
             discord_chan = self.irc_channel_sets[event.target]["real_chan"]
 
             # remove the nick from channel list
-            self.irc_channels_lists[event.target].pop(knick)
+            self.members.remove(event.target, knick)
             try:
                 extras = f"({event.arguments[1]})"
             except IndexError:
@@ -1117,6 +1594,7 @@ class IRC:
             # Inform Discord about the kick
             self.discord.send_irc_msg_to_discord(discord_chan, None, f'**{nick} {self.get_word("kicked_user")} {knick} {extras}**')
             if knick == connection.get_nickname():
+                self.members.clear_channel(event.target)
                 connection.join(event.target)             
         else:
             # I was kicked, try to rejoin the channel
@@ -1136,6 +1614,40 @@ class IRC:
             spl = ce.split("=")
             if spl[0] == "NETWORK":
                 self.network = spl[1]
+            # Channel status modes & their NAMES -symbols: "(ov)@+" / "(qaohv)~&@%+"
+            elif spl[0] == "PREFIX" and len(spl) > 1:
+                self.members.set_prefixes(spl[1])
+            elif spl[0] == "CHANMODES" and len(spl) > 1:
+                self.chanmodes = spl[1]
+            # Max targets per command (JOIN #a,#b,..) & max channels to be on - the joins are packed to fit
+            elif spl[0] == "TARGMAX" and len(spl) > 1:
+                self.targmax = ircproto.parse_targmax(spl[1])
+            elif spl[0] == "CHANLIMIT" and len(spl) > 1:
+                self.chanlimit = ircproto.parse_chanlimit(spl[1])
+            elif spl[0] == "WHOX":
+                self.whox = True
+            elif spl[0] == "MAXCHANNELS" and len(spl) > 1 and not self.chanlimit:
+                self.chanlimit = ircproto.parse_chanlimit(f"#&!+:{spl[1]}")
+            # Longest nick the server allows - the puppets' nicks are made to fit
+            elif spl[0] == "NICKLEN" and len(spl) > 1:
+                self.puppets.set_nicklen(spl[1])
+
+    def on_mode(self, connection, event):
+        """ # Event handler for channel MODE -changes
+        - Keep the cached user statuses (op / voice ..) up to date without new NAMES -queries """
+        if connection != self.connection:
+            return
+        if event.target not in self.irc_channel_sets or not event.arguments:
+            return
+
+        prefix_modes = self.members.prefix_modes
+        for sign, mode, nick in ircstate.parse_mode_changes(event.arguments[0], event.arguments[1:], prefix_modes, self.chanmodes):
+            if mode not in prefix_modes or nick == None:
+                continue
+            if sign == "+":
+                self.members.add_mode(event.target, nick, prefix_modes[mode])
+            else:
+                self.members.remove_mode(event.target, nick, prefix_modes[mode])
 
     def on_nick(self, connection, event):
         """ Event handler for IRC-user nick changes """
@@ -1146,17 +1658,14 @@ class IRC:
         oldnick = event.source.nick # host = event.source.host
         newnick = event.target
 
-        if connection.get_nickname() == event.source.nick:
-            self.myprivmsg_line = f"{event.source} PRIVMSG"
+        # The bot's own nick changed (the irc-library has already taken the new nick in use): new PRIVMSG-prefix
+        if newnick == connection.get_nickname():
+            self.set_myprivmsg_line(f"{newnick}!{event.source.user}@{event.source.host}")
 
         event_msg = f'**{oldnick}** *{self.get_word("new_nick_is")}* **{newnick}**'
 
-        for each_channel in self.irc_channels_lists:
-            x = self.irc_channels_lists[each_channel]
-            if oldnick in x:
-                prev = self.irc_channels_lists[each_channel][oldnick]
-                self.irc_channels_lists[each_channel].pop(oldnick)
-                self.irc_channels_lists[each_channel][newnick] = prev
+        for each_channel in self.members.rename(oldnick, newnick):
+            if each_channel in self.irc_channel_sets:
                 self.discord.send_irc_msg_to_discord(self.irc_channel_sets[each_channel]["real_chan"], None, event_msg) 
                 
     def on_error(self, message):
@@ -1166,6 +1675,7 @@ class IRC:
 
     def on_error_event(self, connection, event):
         """ Event handler for irc-errors / print them to console/terminal """
+        self.last_server_error = f"{event.target} {' '.join(event.arguments)}"
         self.on_error(f"IRC-error {connection} - {event.source} : {event.arguments}")
 
     def on_privmsg(self, connection, event):
@@ -1201,25 +1711,25 @@ class IRC:
     # event.type 'TOPIC' -> function 'on_topic'
     # Does _not_ get called on IRCnet
     # So I have no idea of this function^^ 
-    # IRCnet instead uses the below broken
+    # IRCnet instead uses the below
     # numerical handlers through RAW events ..
 
-    def on_rpl_notopic(self, connection, event):
-        """ 331 - No topic (Called through the RAW Handler) """
-        if connection == self.connection:
-            self.process_and_send_topic_string(event.arguments[0])
+    def on_rpl_notopic(self, prefix, params):
+        """ 331 - No topic (Called through the RAW Handler) - params: [me, channel, "No topic is set"] """
+        if len(params) > 2:
+            self.send_topic_reply(params[1], params[-1])
 
-    def on_rpl_topic(self, connection, event):
-        """ 332 - Topic (Called through the RAW Handler) """
-        if connection == self.connection:
-            self.process_and_send_topic_string(event.arguments[0])
+    def on_rpl_topic(self, prefix, params):
+        """ 332 - Topic (Called through the RAW Handler) - params: [me, channel, topic] """
+        if len(params) > 2:
+            self.send_topic_reply(params[1], params[-1])
 
-    def on_rpl_topicwhotime(self, connection, event):
-        """ 333 - Who / Time (Called through the RAW Handler) """
-        if connection == self.connection:
-            self.process_and_send_topic_string(event.arguments[0])
+    def on_rpl_topicwhotime(self, prefix, params):
+        """ 333 - Who / Time (Called through the RAW Handler) - params: [me, channel, setter, time] """
+        if len(params) > 3:
+            self.debug_print(f"[IRC] Topic of {params[1]} set by {params[2]} at {params[3]}")
         
-    def send_discord_users_to_irc(self, irc_channel): 
+    def send_discord_users_to_irc(self, irc_channel, priority=ircqueue.PRIORITY_CHAT): 
         """         
         # Inform IRC-channel about discord users
         - @ todo - actually filter per discord channel (?)
@@ -1247,7 +1757,7 @@ class IRC:
 
         # Send the known discord users & their statuses to IRC through self.connection-bot
         combinedMessage = f'[Discord] - {self.get_word("online")}: {onlines} | {self.get_word("away")} : {away} | {self.get_word("offline")}: {offlines}'
-        self.send_message(irc_channel, combinedMessage)
+        self.send_message(irc_channel, combinedMessage, priority=priority)
         # @todo - maybe do not show the group & related label if its empty
 
     #####################################
@@ -1265,6 +1775,11 @@ class IRC:
         - Check the message contents of URL's - if URL's found - fetch the web-page <title> and potential video duration and inform them to IRC-channel
         """
 
+        # Our own line (IRCv3 echo-message) - not relayed, but it tells the send-lag
+        if connection == self.connection and event.source.nick == connection.get_nickname():
+            self.on_echo(event)
+            return
+
         # Update last used channels
         self.last_used_channel = event.target
         self.discord.last_used_channel = event.target
@@ -1277,6 +1792,9 @@ class IRC:
             return
         if connection != self.connection:
             return
+        # Our own puppets' lines are Discord messages - already on Discord
+        if self.puppets.is_puppet(event.source.nick):
+            return
         
         #==================================
         # Get the matching discord channel & author info
@@ -1321,19 +1839,18 @@ class IRC:
         if cmd == "!help" or cmd == "!apua" or cmd == "!apuva":
             #send_irc_and_discord(discord_chan, event.target, help["listcommands"])    
             if len(message) == 1:
-                self.send_message(event.target, self.get_help("listcommands"))
+                self.send_message(event.target, self.get_irc_help("listcommands"))
             else:
                 help_dict = self.get_help_dict() # settings["help_dict"]:
                 if message[1] in help_dict:
-                    # Clean the possible linebreaks etc. special-characters from Help -strings before sending to IRC !
-                    cleanHelp = self.get_help(message[1]).replace("\n", "-")
-                    self.send_message(event.target, cleanHelp) 
+                    # The IRC-variant has the possible linebreaks already cleaned from the Help -strings
+                    self.send_message(event.target, self.get_irc_help(message[1])) 
                 else:
                     self.send_message(event.target, f'{self.get_word("invalid_command_param")}')
 
         # Info / short help
         elif cmd == "!info":
-            self.send_message(event.target, self.get_help("!info"))
+            self.send_message(event.target, self.get_irc_help("!info"))
 
         # Status / Uptime (of bridge/bots)
         elif cmd == "!status" or cmd == "!tila":
@@ -1348,19 +1865,19 @@ class IRC:
         elif cmd == "!topic":
             self.print_discord_topic_to_irc(discord_chan, event.target)
             
-        # Report the current BTC/USD value to both linked channels
+        # Report the current BTC/USD value to both linked channels (http-request -> on the I/O pool)
         elif cmd == "!btc":
-            self.report_btc_usd_valuation(event.target)
+            timers.add_timer("", 0, self.report_btc_usd_valuation, event.target, executor=timers.EXEC_IO)
 
         # Report the current MSTR/USD value to both linked channels
         elif cmd == "!mstr":
-            self.report_mstr_valuation(event.target)
+            timers.add_timer("", 0, self.report_mstr_valuation, event.target, executor=timers.EXEC_IO)
 
         # Report the current market value for requested market symbol through yahoo finance
         elif cmd == "!stock" or cmd == "!value" or cmd == "!kurssi":
             if len(message) == 2:
                 symbol_to_query = message[1]
-                self.get_and_report_stock_value(event.target, symbol_to_query)
+                timers.add_timer("", 0, self.get_and_report_stock_value, event.target, symbol_to_query, executor=timers.EXEC_IO)
 
         # Change language
         elif cmd == "!speak" or cmd == "!viännä" or cmd == "!puhu":
@@ -1383,7 +1900,7 @@ class IRC:
                     else:
                         self.send_irc_message(event.target, f'{self.get_word("lang_in_use")} {self.get_word("available_languages")} {avail_langs}')
             else:
-                self.send_irc_message(event.target, f'{self.get_word("lang_in_use")} {self.get_help(cmd)}')
+                self.send_irc_message(event.target, f'{self.get_word("lang_in_use")} {self.get_irc_help(cmd)}')
                     
         ###############################
         #  Regular message processing #
@@ -1402,30 +1919,18 @@ class IRC:
             elif msgi == "@here" or msgii == "@here":
                 message[i] = self.get_word("fix_here")
 
-        # Names from detailed and cached user dictionary
-        # Discord display name-scraped dictionary
-        for i in range(len(message)):
-            # Get known discord users and compare each word of the message to users
-            self.known_discord_users = self.discord.get_known_users()
-            msgi = message[i]
-            
-            # Only look for matches if the word starts with explicit @ for mentioning
-            if msgi.startswith("@"):
-                msgi = msgi[1:]   # remove leading @
-                msgii = msgi[:-1] # remove final char to try to match with nick, or nick: etc.
-                ml = [msgi, msgii]
-                check_dict = [msgi in self.known_discord_users, msgii in self.known_discord_users]
-                if any(check_dict):
-                    knownUser = self.known_discord_users[ml[check_dict.index(True)]]
-                    message[i] = f"<@{str(knownUser.user_id)}>"
-
         #===============================================
         # Combine final message to Discord for sending
-        finalmsg = ' '.join(message)
+        # - and turn the @mentions of known Discord users (display name / nick / user name, any case) into real mentions
+        finalmsg = self.discord.resolve_mentions(' '.join(message))
 
         # Cursive the message to Discord - if it was '/me' -action in IRC
         if event.type == "action":
             finalmsg = f"*{finalmsg}*"
+        # IRCv3 server-time: show when a line held up on the way (lag / reconnect) was actually said
+        sent_time = ircproto.parse_server_time(ircproto.get_tag(event.tags, "time"))
+        if sent_time != None and clock.now() - sent_time > self.late_line_age:
+            finalmsg = f"[{time.strftime('%H:%M:%S', time.localtime(sent_time))}] {finalmsg}"
 
         self.debug_print(f"[IRC] {event.target} > [Discord] #{discord_chan} - {sender} : {finalmsg}")
 
@@ -1435,21 +1940,54 @@ class IRC:
 
         #===============================================
         # Check if the message cointains URL's - and get the titles and report to IRC
-        timers.add_timer("", 1, self.try_to_process_message_urls, finalmsg, event.target)
+        # (on the I/O pool, so slow pages do not hold up the other timers)
+        timers.add_timer("", 1, self.try_to_process_message_urls, finalmsg, event.target, executor=timers.EXEC_IO)
 
-    def slow_join_to_set_channels(self):
+    def join_set_channels(self):
         """ IRC-bot will join the IRC-channels in currently set channel_sets - given/fulfilled by the Discord
-        - If IRC-connection is faster than Discord, this needs to be called when receiving the channels from Discord """
+        - If IRC-connection is faster than Discord, this needs to be called when receiving the channels from Discord
+        - The channels are packed to as few JOIN -lines as the server's TARGMAX allows, and at most CHANLIMIT channels are joined """
+        if not self.is_loop_thread():
+            self.call_in_loop(self.join_set_channels)
+            return
+        if "join-" + self.network_name in timers.timers:
+            timers.cancel_timer("join-" + self.network_name)
+        if not self.connection.is_connected():
+            return
 
-        # "Slow"-join to channels, with increasing delays
-        channel_join_delay = 0.1
+        botnick = self.connection.get_nickname()
+        channels = []
         for irc_channel in self.irc_channel_sets:
-            self.debug_print(f"[IRC] Joining to {irc_channel} in {channel_join_delay} seconds")
-            timers.add_timer(f"join-{irc_channel}", channel_join_delay, self.connection.join, irc_channel)
-            channel_join_delay += 0.4
+            if irc_channel in self.joining or self.members.is_on(irc_channel, botnick):
+                continue # Joined / on the way
+            # CHANLIMIT: the channels of the same prefixes ("#&") count together
+            for prefixes, limit in self.chanlimit.items():
+                if irc_channel[:1] in prefixes and limit != None:
+                    joined = sum(1 for channel in self.members.get_channels_of(botnick) | self.joining | set(channels) if channel[:1] in prefixes)
+                    if joined >= limit:
+                        self.debug_print(f"[IRC] Not joining {irc_channel} - the server allows {limit} '{prefixes}' -channels")
+                        break
+            else:
+                channels.append(irc_channel)
+
+        for line in ircproto.pack_targets("JOIN", channels, self.targmax.get("JOIN")):
+            self.connection.send_raw(line)
+        if channels:
+            self.joining.update(channels)
+            self.debug_print(f"[IRC] Joining to {len(channels)} channels: {', '.join(channels)}")
 
         self.discord.set_status() # start looping the statuses
 
+    def on_join_failed(self, connection, event):
+        """ The server refused a JOIN (471 / 473 / 474 / 475 / 405) - the channel is tried again with the next join_set_channels """
+        if event.arguments:
+            self.joining.discard(event.arguments[0])
+            self.debug_print(f"[IRC] Could not join {event.arguments[0]} : {event.arguments[-1]}")
+
+    def on_endofmotd(self, connection, event):
+        """ End of the MOTD (376 / 422) - the server has told its features (TARGMAX / CHANLIMIT): join the channels """
+        self.join_set_channels()
+
     ########################################################
     # Handling of successfull IRC-server connection
     ########################################################
@@ -1464,20 +2002,41 @@ class IRC:
         self.debug_print(f"[IRC] Successful connection to {event.source}")
         # self.debug_print(str(self.irc_channel_sets))
         
-        # Remove old reconnection timer if there for some reason is/was any
-        if "self.connection-reconn" in timers.timers:
-            timers.cancel_timer("self.connection-reconn")
+        # Registered - the next connection problem starts again from the shortest reconnect delay
+        self.connection_state = ircreconnect.STATE_CONNECTED
+        self.reconnect_backoff.reset()
+        # The rosters kept from the previous connection: too old ones are dropped, the rest are resynced by the NAMES on joining
+        if self.roster_cached_at != None:
+            if clock.now() - self.roster_cached_at > self.roster_cache_ttl:
+                self.members.clear()
+            for channel in list(self.members.channels):
+                if channel not in self.irc_channel_sets:
+                    self.members.clear_channel(channel)
+            self.roster_cached_at = None
+        # Remove old reconnection / registration timers if there for some reason is/was any
+        for timer_name in (f"{self.network_name}-reconn", f"{self.network_name}-register"):
+            if timer_name in timers.timers:
+                timers.cancel_timer(timer_name)
+
+        # Join the channels when the server has told its features (at the end of the MOTD, see on_endofmotd)
+        # - or in a while, if the server says nothing after the welcome
+        if "join-" + self.network_name not in timers.timers:
+            timers.add_timer("join-" + self.network_name, self.join_fallback_delay, self.join_set_channels)
 
-        # "Slow"-join to channels, with increasing delays
-        self.slow_join_to_set_channels()
-
-        # Reset disconnect retries
-        self.disconnectretries = 0
         # Start the Discord Status rotation -loop
         self.discord.set_status()
 
-        # Start bot irc-nick keeping/guarding:
-        timers.add_timer("keep-botnick", 10, self.keep_set_nick_loop)
+        # Start bot irc-nick keeping/guarding (still running, if this is a reconnect):
+        if f"keep-botnick-{self.network_name}" not in timers.timers:
+            timers.add_timer(f"keep-botnick-{self.network_name}", 10, self.keep_set_nick_loop)
+
+        # Start measuring the lag for the adaptive send-rate
+        if f"irc-lagcheck-{self.network_name}" not in timers.timers:
+            timers.add_timer(f"irc-lagcheck-{self.network_name}", self.lag_check_interval, self.send_lag_ping)
+
+        # Start disconnecting the idle puppets (puppet mode)
+        if self.puppets.enabled and f"puppets-reap-{self.network_name}" not in timers.timers:
+            timers.add_timer(f"puppets-reap-{self.network_name}", self.puppet_reap_interval, self.reap_idle_puppets)
 
         # Done with listening the connection - remove all raw message -handler
         ## connection.remove_global_handler("all_raw_messages", on_all_raw)
@@ -1492,42 +2051,46 @@ class IRC:
     def on_disconnect(self, connection, event):
         """            
         # Event handler for IRC-connection lost / disconnection
-        - Try to reconnect back to the server (default max 10 times)
+        - Try to reconnect back to the network (the servers raced again), with a growing delay between the attempts
         """
         connection_name = connection.get_nickname()
         self.discord.set_status("Lost IRC-connection.")
 
-        # retry connection self.maxConnectRetries times
         if connection == self.connection:  
 
             # Report the lost connection to Discord, for one time.
             if self.irc_connection_successful == 1:
-                self.discord.send_to_all_discord_channels(f'[IRC] `Connection to server lost ... trying to re-connect ... Unable to relay the messages at this moment.`')
+                self.send_to_bridged_discord_channels(f'[IRC] `Connection to server lost ... trying to re-connect ... Unable to relay the messages at this moment.`')
 
             self.irc_connection_successful = 0
+            # Lines queued for the lost connection would be stale after re-connecting
+            self.outbound_queue.clear()
+            self.outbound_wait = None
+            # The channel members are kept over a short reconnect (roster_cache_ttl): the NAMES -replies after re-joining
+            # update them as a diff. Our own nick is dropped, so that the channels are joined again
+            self.members.remove_nick(connection.get_nickname())
+            self.roster_cached_at = clock.now()
+            self.names_buffers.clear()
+            self.who_buffers.clear()
+            self.lag_ping = None
+            self.batches.clear()
+            self.echo_pending.clear()
+            self.joining.clear()
+
+            # Kicked out for sending too fast - slow down for the next connection
+            if "Excess Flood" in " ".join(event.arguments) or "Excess Flood" in self.last_server_error:
+                self.on_server_throttling("Excess Flood")
+            self.last_server_error = ""
+            if f"{self.network_name}-register" in timers.timers:
+                timers.cancel_timer(f"{self.network_name}-register")
             if connection.sent_quit == 1:
                 connection.sent_quit = 0
+                self.connection_state = ircreconnect.STATE_STOPPED
                 return
             
-            # Verify that we are not trying to reconnect more than specified amount of times
-            self.disconnectretries += 1
-            if self.disconnectretries >= self.maxConnectRetries:
-                # And print errors and message to discord if unsuccessfull with reconnecting to IRC
-                self.debug_print(f"[IRC] Failed to connect {self.maxConnectRetries} times, aborting.")
-                self.discord.send_to_all_discord_channels(f'`{self.get_word("retried")} {self.maxConnectRetries} {self.get_word("times_no_success")}: {event.source} {event.arguments[0]}`')
-                time.sleep(1)
-                # And then shut down the bot processes
-                self.discord.shutdown()
-                self.stop_loop()
-                return
-            
-            # Remove old reconnection timer if there for some reason is/was any
-            if "self.connection-reconn" in timers.timers:
-                timers.cancel_timer("self.connection-reconn")
-
-            # Add reconnecting timer to reconnect in 5 seconds
-            timers.add_timer("self.connection_reconn", 5, connection.reconnect) # 10
-            self.debug_print("[IRC] Failed to connect... reconnecting...")
+            # Try again - after a delay growing with the failed attempts in a row
+            self.debug_print(f"[IRC] Lost the connection to {self.current_server[0] if self.current_server else self.server} ... reconnecting ...")
+            self.schedule_reconnect()
 
         else:
             self.debug_print("[IRC] What connection did we exactly lose...?")
@@ -0,0 +1,299 @@
+import re
+
+# Tokens (runs of non-whitespace) of an UTF-8 encoded message
+token_pattern = re.compile(rb'\S+')
+# IRC color codes: \x03 with optional fore-/background numbers, \x04 with optional hex colors
+color_code_pattern = re.compile(rb'\x03(?:\d{1,2}(?:,\d{1,2})?)?|\x04(?:[0-9a-fA-F]{6}(?:,[0-9a-fA-F]{6})?)?')
+# Longest color code (\x04RRGGBB,RRGGBB) - how far back a cut has to look for a code it might split
+max_color_code_length = 14
+
+def get_byte_length(text):
+    """ Returns the length of the text in UTF-8 encoded bytes - the unit the IRC-server measures lines in """
+    if text.isascii():
+        return len(text)
+    return len(text.encode("utf-8"))
+
+def find_safe_cut(data, start, cut):
+    """
+    # Find Safe Cut
+    - Move a cut position in the encoded data backwards so that it does not split
+      a multibyte UTF-8 character or an IRC color code
+    - Never moves the cut to or before start (the piece always makes progress)
+    """
+    # Not in the middle of a multibyte character (continuation bytes are 10xxxxxx)
+    safe = cut
+    while safe > start and (data[safe] & 0xC0) == 0x80:
+        safe -= 1
+    # Not in the middle of a color code
+    for position in range(safe - 1, max(start, safe - max_color_code_length) - 1, -1):
+        if data[position] in (3, 4):
+            code = color_code_pattern.match(data, position)
+            if code.end() > safe:
+                safe = position
+            break
+    if safe > start:
+        return safe
+
+    # A single character / code wider than the limit - cut after it instead
+    if data[start] in (3, 4):
+        return color_code_pattern.match(data, start).end()
+    cut = start + 1
+    while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+        cut += 1
+    return cut
+
+def split_message(msg, max_bytes):
+    """
+    # Split Message
+    - Split a message to pieces of at most max_bytes UTF-8 bytes, at whitespace
+    - The whitespace at the split points is dropped, the whitespace inside a piece is kept as it was
+    - A word longer than the limit is cut, but never in the middle of a multibyte character or an IRC color code
+    - The message is encoded once, and each piece is one slice of it
+    - returns the list of pieces
+    """
+    data = msg.encode("utf-8")
+    if len(data) <= max_bytes:
+        stripped = data.strip()
+        return [stripped.decode("utf-8")] if stripped else []
+
+    pieces = []
+    piece_start = -1   # Start of the current piece (-1 = no piece started)
+    piece_end = 0
+    for token in token_pattern.finditer(data):
+        start, end = token.span()
+        if piece_start >= 0 and end - piece_start <= max_bytes:
+            piece_end = end # The token fits to the current piece
+            continue
+        if piece_start >= 0:
+            pieces.append(data[piece_start:piece_end].decode("utf-8"))
+
+        # Cut the words longer than the whole limit
+        while end - start > max_bytes:
+            cut = find_safe_cut(data, start, start + max_bytes)
+            pieces.append(data[start:cut].decode("utf-8"))
+            start = cut
+        if start < end:
+            piece_start = start
+            piece_end = end
+        else:
+            piece_start = -1
+
+    if piece_start >= 0:
+        pieces.append(data[piece_start:piece_end].decode("utf-8"))
+    return pieces
+
+# IRC -> Discord markdown translation
+# - One regex finds everything that needs translating, the plain text between the matches is copied as it is
+#   (plain chat without codes nor odd whitespace is returned right away)
+# - The open formats are kept on a list while scanning, so the markers are balanced in the same scan
+# - The user's own text is never changed: the old translator's placeholder -texts ('\\x31', '\\x1d',
+#   'pholderunderdash95130') are no longer special
+irc_to_markdown_pattern = re.compile(
+    r"\x03(?:\d{1,2}(?:,\d{1,2})?)?"      # color code
+    r"|[\x02\x0f\x1d]"                   # bold, reset & italic
+    r"|[^\S\x1d][^\S\x1d]+|[^\S\x1d ]"  # whitespace other than single spaces between words
+)
+irc_to_markdown_markers = {"\x02": "**", "\x1d": "_"}
+
+def irc_to_markdown(message):
+    """
+    # IRC to Markdown
+    - Translate an IRC message to Discord markdown, in one scan of the message
+    - Color codes are removed, bold (\\x02) becomes '**' and italic (\\x1d) '_'
+    - A reset (\\x0f) closes the open formats, and formats still open are closed at the end of the message
+    - Formats closed out of order (bold on, italic on, bold off) are closed & reopened, as markdown nests them
+    - Whitespace is collapsed to single spaces between words (and trimmed from the ends)
+    """
+    # (single spaces at the ends are not found by the pattern)
+    if message[:1] == " " or message[-1:] == " ":
+        message = message.strip(" ")
+    if message.isprintable() and "  " not in message:
+        return message
+
+    output = []
+    open_markers = []   # The markers of the open formats, in the order they were opened
+    position = 0
+    length = len(message)
+    for match in irc_to_markdown_pattern.finditer(message):
+        start, end = match.span()
+        if start > position:
+            output.append(message[position:start])
+        position = end
+        character = message[start]
+        marker = irc_to_markdown_markers.get(character)
+        if marker != None:
+            if marker in open_markers:
+                # Close the format & the ones opened after it, reopen those
+                index = open_markers.index(marker)
+                output.append("".join(reversed(open_markers[index:])) + "".join(open_markers[index + 1:]))
+                del open_markers[index]
+            else:
+                output.append(marker)
+                open_markers.append(marker)
+        elif character == "\x0f":
+            if open_markers:
+                output.append("".join(reversed(open_markers)))
+                open_markers.clear()
+        elif character == "\x03":
+            pass
+        # Whitespace: trimmed from the ends, a single space between words
+        elif start != 0 and end != length:
+            output.append(" ")
+    output.append(message[position:])
+    if open_markers:
+        output.append("".join(reversed(open_markers)))
+    return "".join(output)
+
+# Discord markdown -> IRC translation
+# - One compiled regex jumps from marker to marker, the plain text between them is copied as it is
+#   (most chat has no markers at all, and is returned right away)
+# - A simple pair of markers at the start of a word (the common **bold**, _italic_ ...) is translated
+#   in one go by an anchored regex match, without going through the stack
+# - Code blocks, inline code & URLs are skipped as a whole, without formatting
+# - Other emphasis marker runs are paired on a stack (CommonMark -style): unpaired markers stay as text
+markdown_markers = ("*", "_", "~", "`")
+markdown_marker_pattern = re.compile(r"[*_~`]")
+# A simple pair: the same markers around text without any markers (nor URLs: no ':') that starts & ends with a non-space,
+# the closing markers not followed by more markers ('_' not by a letter either) - group 1: the markers, group 2: the text
+markdown_pair_pattern = re.compile(r"(\*{1,3}|_{1,3}|~~)([^*_~`: ](?:[^*_~`:]*[^*_~`: ])?)\1(?![*_~`]|(?<=_)[^\W_])")
+url_starts = ("http://", "https://", "<http://", "<https://")
+# IRC control codes for a pair of markers: (marker character, markers used) -> code
+markdown_codes = {
+    ("*", 1): "\x1d",         # *italic*
+    ("*", 2): "\x02",         # **bold**
+    ("*", 3): "\x1d\x02",     # ***bold italic***
+    ("_", 1): "\x1d",         # _italic_
+    ("_", 2): "\x1f",         # __underline__
+    ("_", 3): "\x1d\x1f",     # ___underline italic___
+    ("~", 2): "\x1e",         # ~~strikethrough~~
+}
+
+def markdown_to_irc(message):
+    """
+    # Markdown to IRC
+    - Translate Discord markdown of a message to IRC control codes, in one scan of the message
+    - *italic* / _italic_ -> \\x1d, **bold** -> \\x02, ***both*** -> \\x1d\\x02, __underline__ -> \\x1f, ~~strike~~ -> \\x1e
+    - Markers only pair up when they open before / close after a non-space (and '_' never inside a word, like in snake_case)
+    - Unpaired markers are left as they are
+    - Code blocks lose their ``` -fences, inline code & URLs (words starting with http) are kept as they are
+    - Whitespace is collapsed to single spaces between words (and trimmed from the ends)
+    - returns the IRC -formatted string
+    """
+    # Tabs, newlines & other odd whitespace are rare - normalize them only when there are any
+    if "  " in message or not message.isprintable():
+        message = " ".join(message.split())
+    elif message[:1] == " " or message[-1:] == " ":
+        message = message.strip(" ")
+
+    for marker in markdown_markers:
+        if marker in message:
+            break
+    else:
+        return message # Most messages have no markdown at all
+    has_urls = "://" in message
+
+    find_marker = markdown_marker_pattern.search
+    match_pair = markdown_pair_pattern.match
+    length = len(message)
+    output = []
+    openers = []   # Stack of unpaired opening markers: [character, markers left, index in output, codes]
+    open_counts = {"*": 0, "_": 0, "~": 0} # Openers on the stack per marker character
+    position = 0   # Everything before this is in the output
+    while True:
+        found = find_marker(message, position)
+        if found == None:
+            break
+        start = found.start()
+        if start > position:
+            output.append(message[position:start])
+        character = message[start]
+        word_start = start == 0 or message[start - 1] == " "
+
+        # URLs are copied as they are, up to the end of the word (a marker starting a word is never in one)
+        if not word_start and has_urls and message.startswith(url_starts, message.rfind(" ", 0, start) + 1):
+            end = message.find(" ", start)
+            end = length if end < 0 else end
+            output.append(message[start:end])
+        # Code: a block loses its fences, inline code is kept as it is, and an unclosed one is just text
+        elif character == "`":
+            if message.startswith("```", start):
+                end = message.find("```", start + 3)
+                if end >= 0:
+                    output.append(message[start + 3:end])
+                    end += 3
+                else:
+                    end = start + 3
+                    output.append("```")
+            else:
+                end = message.find("`", start + 1) + 1
+                end = start + 1 if end == 0 else end
+                output.append(message[start:end])
+        else:
+            pair = match_pair(message, start) if word_start else None
+            if pair != None:
+                end = pair.end()
+                code = markdown_codes[(character, len(pair.group(1)))]
+                output.append(code + pair.group(2) + code)
+            else:
+                end = start + 1
+                while end < length and message[end] == character:
+                    end += 1
+                append_markers(output, openers, open_counts, message, character, start, end)
+        position = end
+
+    if position < length:
+        output.append(message[position:])
+    return "".join(output)
+
+def append_markers(output, openers, open_counts, message, character, start, end):
+    """
+    # Append Markers
+    - Pair a run of emphasis markers (message[start:end]) with the openers on the stack, or open new ones
+    - open_counts (openers on the stack per character) keeps a closer from walking a stack without its opener:
+      every opener is walked over at most once, when it is dropped as unpaired
+    - Paired markers are replaced by the IRC control codes, the others are appended as text
+    """
+    count = end - start
+    if count > 3 or (character == "~" and count != 2):
+        output.append(message[start:end])
+        return
+
+    before = message[start - 1] if start > 0 else " "
+    after = message[end] if end < len(message) else " "
+    can_open = after != " "
+    can_close = before != " "
+    if character == "_":
+        can_open = can_open and not before.isalnum()
+        can_close = can_close and not after.isalnum()
+
+    # Close the nearest opener(s) of the same character
+    closing_codes = ""
+    while can_close and count > 0 and open_counts[character]:
+        depth = len(openers) - 1
+        while openers[depth][0] != character:
+            open_counts[openers[depth][0]] -= 1 # (the openers in between stay unpaired)
+            depth -= 1
+        opener = openers[depth]
+        del openers[depth + 1:]
+        used = min(count, opener[1])
+        code = markdown_codes.get((character, used))
+        if code == None:
+            break
+        count -= used
+        opener[1] -= used
+        opener[3] = code + opener[3]
+        output[opener[2]] = character * opener[1] + opener[3]
+        closing_codes += code
+        if opener[1] == 0:
+            openers.pop()
+            open_counts[character] -= 1
+    if closing_codes:
+        output.append(closing_codes)
+    if count == 0:
+        return
+
+    # What is left of the markers opens, or stays as text
+    if can_open:
+        openers.append([character, count, len(output), ""])
+        open_counts[character] += 1
+    output.append(character * count)
@@ -0,0 +1,207 @@
+# IRC protocol line parsing for the bridge
+# - The lines the server sends: [@tags] [:prefix] COMMAND [params ..] [:trailing param]
+# - Most of the traffic is of no interest to the bridge's raw handlers: the command is peeked first,
+#   and only the lines with a handler are parsed further
+# - IRCv3: the capability negotiation (CAP) & the message tags
+import datetime
+
+def get_command(line):
+    """ Returns the command (or 3-digit numeric) of a raw IRC-line, upper case - without parsing the rest of the line """
+    if line[:1] == "@": # IRCv3 message tags
+        line = line.partition(" ")[2].lstrip(" ")
+    # The usual line: ":prefix COMMAND ..." - one split, the rest of the line is left as it is
+    parts = line.split(" ", 2)
+    if line[:1] != ":":
+        return parts[0].upper()
+    if len(parts) > 1 and parts[1]:
+        return parts[1].upper()
+    # (extra spaces after the prefix)
+    parts = line.split(None, 2)
+    return parts[1].upper() if len(parts) > 1 else ""
+
+def parse_line(line):
+    """
+    # Parse Line
+    - Split a raw IRC-line to its parts
+    - returns (tags, prefix, command, params):
+    -- tags: the raw IRCv3 tag -string or None
+    -- prefix: "nick!user@host" / "server" or None
+    -- command: upper case command or the 3-digit numeric
+    -- params: list of the parameters, the trailing (":..") parameter last
+    """
+    tags = None
+    prefix = None
+    if line[:1] == "@":
+        tags, _, line = line[1:].partition(" ")
+        line = line.lstrip(" ")
+    if line[:1] == ":":
+        prefix, _, line = line[1:].partition(" ")
+        line = line.lstrip(" ")
+    command, _, rest = line.partition(" ")
+
+    if rest[:1] == ":":
+        params = [rest[1:]]
+    else:
+        middle, separator, trailing = rest.partition(" :")
+        params = middle.split()
+        if separator:
+            params.append(trailing)
+    return tags, prefix, command.upper(), params
+
+class LineDispatcher:
+    """
+    # Line Dispatcher
+    - Dispatch raw IRC-lines to handlers by their command / numeric, through one dictionary lookup
+    - Handlers are called as handler(prefix, params) - see parse_line()
+    - Lines without a handler are not parsed at all
+    """
+
+    def __init__(self):
+        self.handlers = {}
+
+    def add_handler(self, command, handler):
+        """ Set the handler of a command ("PRIVMSG") or a numeric ("332") - one handler per command """
+        self.handlers[command.upper()] = handler
+
+    def remove_handler(self, command):
+        self.handlers.pop(command.upper(), None)
+
+    def dispatch(self, line):
+        """ Parse & hand a raw line to its handler - returns True if the line had a handler """
+        handler = self.handlers.get(get_command(line))
+        if handler == None:
+            return False
+        tags, prefix, command, params = parse_line(line)
+        handler(prefix, params)
+        return True
+
+def parse_targmax(value):
+    """ Parse a TARGMAX -feature "PRIVMSG:4,NOTICE:4,JOIN:" to {command: max targets} (None = no limit) """
+    targmax = {}
+    for entry in value.split(","):
+        command, _, limit = entry.partition(":")
+        if command:
+            targmax[command.upper()] = int(limit) if limit.isdigit() else None
+    return targmax
+
+def parse_chanlimit(value):
+    """ Parse a CHANLIMIT -feature "#&:120,+:" to {channel prefixes: max channels joined} (None = no limit) """
+    chanlimit = {}
+    for entry in value.split(","):
+        prefixes, _, limit = entry.partition(":")
+        if prefixes:
+            chanlimit[prefixes] = int(limit) if limit.isdigit() else None
+    return chanlimit
+
+def pack_targets(command, targets, max_targets=None, max_length=510):
+    """
+    # Pack Targets
+    - Pack the targets (channels) to as few comma-separated lines as possible: "JOIN #a,#b,#c"
+    - At most max_targets per line (None = no limit) & max_length bytes per line (without the CRLF)
+    - returns the list of lines
+    """
+    lines = []
+    packed = []
+    length = len(command) + 1
+    for target in targets:
+        target_length = len(target.encode("utf-8")) + (1 if packed else 0)
+        if packed and ((max_targets and len(packed) >= max_targets) or length + target_length > max_length):
+            lines.append(f"{command} {','.join(packed)}")
+            packed = []
+            length = len(command) + 1
+            target_length -= 1
+        packed.append(target)
+        length += target_length
+    if packed:
+        lines.append(f"{command} {','.join(packed)}")
+    return lines
+
+# IRCv3 capabilities the bridge asks for, when the server offers them
+# - multi-prefix & userhost-in-names: all the statuses & the hosts in NAMES (no WHO -polling)
+# - away-notify & extended-join: away -states & accounts pushed by the server
+# - server-time, message-tags & batch: the time of the lines, the netsplits as one batch
+# - echo-message: our own lines back from the server (the send-lag without PINGs)
+wanted_caps = ("multi-prefix", "userhost-in-names", "away-notify", "extended-join", "server-time", "message-tags", "batch", "echo-message")
+
+class CapNegotiation:
+    """
+    # IRCv3 capability negotiation
+    - Started with "CAP LS 302" before the registration (NICK / USER)
+    - on_cap() takes the server's CAP -replies (the params of the line) & returns the lines to send back:
+      the wanted capabilities the server lists are REQuested, and the registration is let to finish with CAP END
+    - Servers without IRCv3 don't know CAP: nothing is enabled and the registration goes on as before
+    """
+
+    def __init__(self, wanted=wanted_caps):
+        self.wanted = wanted
+        self.offered = set()           # Capabilities the server listed (values dropped: "sasl=PLAIN" -> "sasl")
+        self.enabled = set()           # Capabilities the server ACKed
+        self.ended = False             # CAP END sent - the registration goes on
+
+    def has(self, cap):
+        """ Returns True if the capability is enabled """
+        return cap in self.enabled
+
+    def get_request(self, caps):
+        """ Returns the CAP REQ -line for the wanted capabilities among the caps (None if none of them) """
+        requested = [cap for cap in self.wanted if cap in caps and cap not in self.enabled]
+        if not requested:
+            return None
+        return "CAP REQ :" + " ".join(requested)
+
+    def end(self):
+        """ Returns [CAP END] the first time - the later negotiations (CAP NEW) happen after the registration """
+        if self.ended:
+            return []
+        self.ended = True
+        return ["CAP END"]
+
+    def on_cap(self, params):
+        """ Handle a CAP -reply (params: target, subcommand, [*], capabilities) - returns the list of lines to send """
+        if len(params) < 3:
+            return []
+        subcommand = params[1].upper()
+        caps = params[-1].split()
+        more = len(params) > 3 and params[2] == "*" # Multi-line LS: "CAP * LS * :..." - more to come
+
+        if subcommand == "LS":
+            self.offered.update(cap.partition("=")[0] for cap in caps)
+            if more:
+                return []
+            request = self.get_request(self.offered)
+            return [request] if request else self.end()
+        elif subcommand == "ACK":
+            for cap in caps:
+                if cap.startswith("-"):
+                    self.enabled.discard(cap[1:])
+                else:
+                    self.enabled.add(cap)
+            return self.end()
+        elif subcommand == "NAK":
+            return self.end()
+        elif subcommand == "NEW":
+            new_caps = [cap.partition("=")[0] for cap in caps]
+            self.offered.update(new_caps)
+            request = self.get_request(new_caps)
+            return [request] if request else []
+        elif subcommand == "DEL":
+            for cap in caps:
+                self.offered.discard(cap)
+                self.enabled.discard(cap)
+        return []
+
+def get_tag(tags, key):
+    """ Returns the value of a message tag from the irc-library's event.tags ([{"key": .., "value": ..}] or None) - None if not there """
+    for tag in tags or ():
+        if tag["key"] == key:
+            return tag["value"]
+    return None
+
+def parse_server_time(value):
+    """ Parse a server-time -tag ("2024-01-01T12:34:56.789Z") to seconds since epoch - None if not valid """
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=datetime.timezone.utc).timestamp()
+    except ValueError:
+        return None
@@ -0,0 +1,178 @@
+import collections
+import clock
+
+# Priority lanes of the outbound IRC-queue (lower number goes first)
+PRIORITY_CHAT = 0  # Relayed chat & replies to commands
+PRIORITY_NOISE = 1 # Bot noise: URL previews, join announcements etc.
+
+class TokenBucket:
+    """
+    # Token Bucket
+    - Flood control for the lines sent to the IRC-server
+    - Holds up to 'burst' tokens, refilled with 'rate' tokens per second
+    - Each sent line takes one token
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = clock.now()
+
+    def refill(self, currtime):
+        """ Add the tokens earned since the last refill (up to the burst size) """
+        if currtime > self.updated:
+            self.tokens = min(self.burst, self.tokens + (currtime - self.updated) * self.rate)
+        self.updated = currtime
+
+    def try_take(self, currtime):
+        """ Take one token if available - returns True if a line may be sent now """
+        self.refill(currtime)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def get_wait_time(self, currtime):
+        """ Returns the seconds until the next token is available """
+        self.refill(currtime)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def set_rate(self, rate):
+        """ Change the refill rate (tokens per second) - tokens earned so far are kept """
+        self.refill(clock.now())
+        self.rate = float(rate)
+
+class OutboundQueue:
+    """
+    # Outbound IRC-queue
+    - Lines waiting to be sent to the IRC-server, in priority lanes (PRIORITY_CHAT before PRIORITY_NOISE)
+    - Inside a lane each channel is its own FIFO, so the parts of a long message are never overtaken
+      by a later message to the same channel
+    - Channels with queued lines take turns (round-robin), so one busy channel does not starve the others
+    - The global token bucket decides how fast the lines may go out
+    """
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.lanes = {PRIORITY_CHAT: collections.OrderedDict(), PRIORITY_NOISE: collections.OrderedDict()}
+        self.length = 0
+        self.backlogged = False # Set when flush() had to leave lines waiting for the token bucket
+
+    def put(self, channel, line, priority=PRIORITY_CHAT):
+        """ Queue a line for a channel - line is any item that the send function of flush() understands """
+        lane = self.lanes[priority]
+        if channel not in lane:
+            lane[channel] = collections.deque()
+        lane[channel].append(line)
+        self.length += 1
+
+    def pop_next(self):
+        """ Returns the next line to send (highest priority lane, channels round-robin) - or None if the queue is empty """
+        for priority in sorted(self.lanes):
+            lane = self.lanes[priority]
+            if not lane:
+                continue
+            channel, lines = next(iter(lane.items()))
+            line = lines.popleft()
+            if lines:
+                lane.move_to_end(channel) # Give the next channel its turn
+            else:
+                del lane[channel]
+            self.length -= 1
+            return line
+        return None
+
+    def flush(self, send):
+        """
+        # Flush
+        - Send queued lines with the given send-function as long as the token bucket allows
+        - returns the seconds until the next line can be sent (None if the queue is empty)
+        """
+        currtime = clock.now()
+        while self.length > 0 and self.bucket.try_take(currtime):
+            send(self.pop_next())
+        if self.length == 0:
+            return None
+        self.backlogged = True
+        return self.bucket.get_wait_time(currtime)
+
+    def clear(self):
+        """ Drop all the queued lines (e.g. when the connection is lost) """
+        for lane in self.lanes.values():
+            lane.clear()
+        self.length = 0
+
+class AdaptiveRate:
+    """
+    # Adaptive send-rate
+    - Learns how fast the IRC-server lets us send, and keeps the token bucket's rate close to that limit
+    - Additive increase: while the queue is held back by the bucket and the lag stays low, the rate is raised a step
+    - Multiplicative decrease: growing PING/PONG lag cuts the rate by 'backoff', a throttling reply from the
+      server (263 / Excess Flood) halves it and sets a ceiling just below the rate that got us throttled
+    """
+
+    def __init__(self, bucket, min_rate=0.5, max_rate=10.0, step=0.25, backoff=0.75, lag_margin=1.0, samples=10):
+        self.bucket = bucket
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.step = float(step)            # Lines per second added per good lag-sample
+        self.backoff = float(backoff)      # Multiplier for the rate when the lag grows
+        self.lag_margin = float(lag_margin)# Seconds of lag over the baseline that count as "growing lag"
+        self.ceiling = None                # Rate cap learned from the server throttling us (None = not throttled yet)
+        self.rtt_samples = collections.deque(maxlen=samples)
+        self.last_rtt = None
+
+    def get_rate(self):
+        """ Returns the current send-rate (lines per second) """
+        return self.bucket.rate
+
+    def get_baseline_rtt(self):
+        """ Returns the lowest round-trip time of the recent samples - the lag of an idle connection """
+        if not self.rtt_samples:
+            return None
+        return min(self.rtt_samples)
+
+    def set_rate(self, rate):
+        """ Clamp and apply a new rate to the token bucket - returns the applied rate """
+        upper = self.max_rate
+        if self.ceiling != None:
+            upper = min(upper, self.ceiling)
+        rate = max(self.min_rate, min(upper, rate))
+        self.bucket.set_rate(rate)
+        return rate
+
+    def on_rtt(self, rtt, backlogged):
+        """
+        # On RTT
+        - Feed a PING/PONG round-trip time (seconds)
+        - backlogged tells whether the flood control held lines back since the previous sample
+        - returns the new rate
+        """
+        baseline = self.get_baseline_rtt()
+        self.rtt_samples.append(rtt)
+        self.last_rtt = rtt
+        if baseline == None:
+            return self.get_rate()
+        # The server delays (fake-lags) the commands of a client that sends too fast - PONGs included
+        if rtt > baseline * 2 + self.lag_margin:
+            return self.set_rate(self.get_rate() * self.backoff)
+        # Only probe for more speed when the speed was actually needed
+        if backlogged:
+            return self.set_rate(self.get_rate() + self.step)
+        return self.get_rate()
+
+    def reset(self, rate):
+        """ Start over on a (new) server connection: forget the lag samples & the ceiling, and start from the given rate (clamped) - returns the applied rate """
+        self.ceiling = None
+        self.rtt_samples.clear()
+        self.last_rtt = None
+        return self.set_rate(rate)
+
+    def on_throttled(self):
+        """ The server told us to slow down (263 / Excess Flood) - halve the rate and never go back above ~90% of it - returns the new rate """
+        rate = self.get_rate()
+        self.ceiling = max(self.min_rate, rate * 0.9)
+        return self.set_rate(rate * 0.5)
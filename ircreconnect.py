@@ -0,0 +1,150 @@
+# IRC (re)connecting for the bridge
+# - The states of a network's connection, the delays between the connection attempts
+#   and the race of the parallel connection attempts to the network's servers
+import random
+import socket
+import threading
+import timers
+
+# The states of a network's connection (IRC.connection_state)
+STATE_DISCONNECTED = "disconnected" # Not connected, nothing going on (before the start)
+STATE_CONNECTING = "connecting"     # Racing the TCP-connections to the servers
+STATE_REGISTERING = "registering"   # Connected, waiting for the server's welcome (001)
+STATE_CONNECTED = "connected"       # Registered - the bridge is running
+STATE_WAITING = "waiting"           # Lost the connection / failed to connect - waiting for the next attempt
+STATE_STOPPED = "stopped"           # Quit on purpose - no more attempts
+
+class Backoff:
+    """
+    # Reconnect backoff
+    - Capped exponential delay between the connection attempts: min_delay, 2 x min_delay, 4 x .. up to max_delay
+    - With jitter: the delay is picked from the upper half of the step, so that the bridges (and the puppets)
+      knocked out by the same netsplit don't all come back at the same second
+    """
+
+    def __init__(self, min_delay=2.0, max_delay=300.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.attempts = 0              # Failed attempts in a row (since the last successful connection)
+
+    def next_delay(self):
+        """ Returns the seconds to wait before the next attempt - and counts the attempt """
+        step = min(self.max_delay, self.min_delay * (2 ** self.attempts))
+        self.attempts += 1
+        return step / 2 + random.uniform(0, step / 2)
+
+    def reset(self):
+        """ Connected - start again from the shortest delay """
+        self.attempts = 0
+
+def get_server_list(network_settings):
+    """
+    # Get Server List
+    - Returns the (host, port) -list of a network's servers in the order of preference:
+      "server" & "port" first, then the "alternative_servers" ("host" or "host:port", the port defaults to "port")
+    """
+    port = network_settings["port"]
+    servers = [(network_settings["server"], port)]
+    for entry in network_settings.get("alternative_servers", []):
+        host, separator, entry_port = entry.rpartition(":")
+        if not separator or not entry_port.isdigit():
+            host, entry_port = entry, port
+        server = (host, int(entry_port))
+        if server not in servers:
+            servers.append(server)
+    return servers
+
+class ConnectRace:
+    """
+    # Connect Race
+    - Parallel TCP-connection attempts to a network's servers, the first connection made wins (see race_connect)
+    - The attempts run on the timers' connect pool, the stagger & the deadline are timers: no thread waits for the race
+      (the connect pool is their own: a burst of slow URL -fetches on the I/O pool can't hold up or drop them)
+    - Decided once: the winner's socket (or the error) goes to on_done, a socket that finishes later is closed
+    """
+
+    def __init__(self, servers, on_done, timeout, stagger):
+        self.servers = list(servers)
+        self.on_done = on_done         # on_done(socket, (host, port), None) - or (None, None, OSError) if none answered
+        self.timeout = timeout
+        self.stagger = stagger
+        self.lock = threading.Lock()   # Guards the fields below (the attempts finish on the pool threads)
+        self.started = 0               # Attempts started (the servers are tried in the list's order)
+        self.errors = []               # "host:port (error)" of the failed attempts
+        self.decided = False           # True once on_done has got (or is getting) its result
+        self.deadline_timer = None
+
+    def start(self):
+        """ Start the first attempt, and the deadline for the whole race """
+        if not self.servers:
+            self.on_done(None, None, OSError("No servers to connect to"))
+            return
+        deadline = self.stagger * (len(self.servers) - 1) + self.timeout + 1
+        self.deadline_timer = timers.add_timer("", deadline, self.on_deadline)
+        self.start_next()
+
+    def start_next(self):
+        """ Start the next attempt - called 'stagger' seconds after the previous one started, or right away when it failed """
+        with self.lock:
+            if self.decided or self.started == len(self.servers):
+                return
+            server = self.servers[self.started]
+            self.started += 1
+            more = self.started < len(self.servers)
+        timers.add_timer("", 0, self.attempt, server, executor=timers.EXEC_CONNECT)
+        if more:
+            timers.add_timer("", self.stagger, self.start_next)
+
+    def attempt(self, server):
+        """ Connect to one server (on the connect pool) """
+        try:
+            sock = socket.create_connection(server, self.timeout)
+        except OSError as e:
+            self.on_attempt_failed(server, e)
+            return
+        with self.lock:
+            lost = self.decided
+            self.decided = True
+        if lost: # Another server won, or the race already gave up
+            sock.close()
+            return
+        self.deadline_timer.cancel()
+        sock.settimeout(None)
+        self.on_done(sock, server, None)
+
+    def on_attempt_failed(self, server, error):
+        """ An attempt failed - start the next one right away, or end the race if all of them have failed """
+        with self.lock:
+            self.errors.append(f"{server[0]}:{server[1]} ({error})")
+            all_failed = not self.decided and len(self.errors) == len(self.servers)
+            if all_failed:
+                self.decided = True
+        if all_failed:
+            self.deadline_timer.cancel()
+            self.on_done(None, None, OSError("; ".join(self.errors)))
+        else:
+            self.start_next()
+
+    def on_deadline(self):
+        """ None of the servers answered in time (the attempts still running are closed when they finish) """
+        with self.lock:
+            if self.decided:
+                return
+            self.decided = True
+            answered = len(self.servers) - len(self.errors)
+        self.on_done(None, None, OSError(f"No answer from {answered} server(s) in {self.timeout} seconds"))
+
+def race_connect(servers, on_done, timeout=10.0, stagger=0.5):
+    """
+    # Race Connect
+    - Open a TCP-connection to the first of the servers that answers
+    - The attempts are started in the order of preference, the next one 'stagger' seconds after the previous
+      (or right away when the previous one fails) - the first connection made wins, the late ones are closed
+    - Does not block: the attempts run on the timers' connect pool, and the result is passed to
+      on_done(socket, (host, port), None) - or on_done(None, None, OSError) if none of the servers could be reached
+    - on_done is called on a pool or timer thread: hand the result over to the IRC-thread from there
+    - returns the ConnectRace
+    """
+    race = ConnectRace(servers, on_done, timeout, stagger)
+    race.start()
+    return race
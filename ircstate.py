@@ -0,0 +1,232 @@
+class MembershipStore:
+    """
+    # IRC channel membership store
+    - Who is on which IRC-channel, with each member's host & channel modes (as NAMES -prefixes, highest first: "@+")
+    - channels:      channel -> {nick -> {"host": host, "modes": modes}}
+    - nick_channels: nick -> set of channels (reverse index)
+    - users:         nick -> {"away": reason, "account": account} - pushed by the server (IRCv3 away-notify / extended-join),
+                     kept while the nick is on some channel, and shown in the names (format_names)
+    - The modes follow the server's PREFIX (ISUPPORT), and are updated live from MODE -changes
+    - Quits, nick changes & "where is this nick" -lookups cost O(channels the nick is on),
+      instead of scanning every channel
+    """
+
+    def __init__(self):
+        self.channels = {}
+        self.nick_channels = {}
+        self.users = {}
+        self.prefix_modes = parse_prefix_feature(default_prefix) # Mode letter -> NAMES -symbol ("o" -> "@"), highest first
+        self.prefix_symbols = "".join(self.prefix_modes.values())
+
+    def add(self, channel, nick, host=None, modes=None):
+        """
+        # Add
+        - Add a nick to a channel, or update the member's host / modes if already there
+        - None keeps the old value (a new member gets host "?" & no modes)
+        """
+        members = self.channels.get(channel)
+        if members == None:
+            members = self.channels[channel] = {}
+        member = members.get(nick)
+        if member == None:
+            members[nick] = {"host": host if host != None else "?", "modes": modes if modes != None else ""}
+            self.nick_channels.setdefault(nick, set()).add(channel)
+            return
+        if host != None:
+            member["host"] = host
+        if modes != None:
+            member["modes"] = modes
+
+    def remove(self, channel, nick):
+        """ Remove a nick from a channel (part / kick) - returns True if the nick was there """
+        members = self.channels.get(channel)
+        if members == None or members.pop(nick, None) == None:
+            return False
+        channels = self.nick_channels[nick]
+        channels.discard(channel)
+        if not channels:
+            del self.nick_channels[nick]
+            self.users.pop(nick, None)
+        return True
+
+    def remove_nick(self, nick):
+        """ Remove a nick from all the channels (quit) - returns the set of channels the nick was on """
+        channels = self.nick_channels.pop(nick, set())
+        for channel in channels:
+            del self.channels[channel][nick]
+        self.users.pop(nick, None)
+        return channels
+
+    def rename(self, oldnick, newnick):
+        """ Move a nick's memberships to a new nick (nick change) - returns the set of channels of the nick """
+        channels = self.nick_channels.pop(oldnick, None)
+        if channels == None:
+            return set()
+        if oldnick == newnick:
+            self.nick_channels[newnick] = channels
+            return channels
+        # (a stale entry of the new nick - from missed quit - is overwritten)
+        for channel in self.nick_channels.pop(newnick, ()):
+            del self.channels[channel][newnick]
+        self.users.pop(newnick, None)
+        for channel in channels:
+            members = self.channels[channel]
+            members[newnick] = members.pop(oldnick)
+        self.nick_channels[newnick] = channels
+        if oldnick in self.users:
+            self.users[newnick] = self.users.pop(oldnick)
+        return channels
+
+    def clear_channel(self, channel):
+        """ Forget everyone on a channel (the bot left it / a fresh NAMES -list) """
+        members = self.channels.pop(channel, {})
+        for nick in members:
+            channels = self.nick_channels[nick]
+            channels.discard(channel)
+            if not channels:
+                del self.nick_channels[nick]
+                self.users.pop(nick, None)
+
+    def clear(self):
+        """ Forget everything (disconnected) """
+        self.channels = {}
+        self.nick_channels = {}
+        self.users = {}
+
+    def get_channels_of(self, nick):
+        """ Returns the set of channels the nick is on (don't modify) """
+        return self.nick_channels.get(nick, set())
+
+    def get_members(self, channel):
+        """ Returns the nick -> member -dictionary of a channel (don't modify) """
+        return self.channels.get(channel, {})
+
+    def is_on(self, channel, nick):
+        """ Returns True if the nick is on the channel """
+        return nick in self.channels.get(channel, ())
+
+    def get_modes(self, channel, nick):
+        """ Returns the nick's mode prefixes on the channel, highest first ("" if none / not there) """
+        member = self.channels.get(channel, {}).get(nick)
+        if member == None:
+            return ""
+        return member["modes"]
+
+    def get_prefix(self, channel, nick):
+        """ Returns the nick's highest mode prefix on the channel ('@', '+', ..) or "" """
+        return self.get_modes(channel, nick)[:1]
+
+    def set_user_info(self, nick, key, value):
+        """ Set what the server told about a nick ("away" / "account") - only for the nicks on our channels """
+        if nick in self.nick_channels:
+            self.users.setdefault(nick, {})[key] = value
+
+    def get_user_info(self, nick, key):
+        """ Returns what the server told about a nick ("away" / "account") - None if nothing """
+        return self.users.get(nick, {}).get(key)
+
+    def format_names(self, channel, away_word="away"):
+        """
+        # Format Names
+        - Returns the channel's users as a NAMES -like text ("@op +voice user"), the highest statuses first
+        - With what the server told about the users: logged in to an account "user✓", away "user (away_word)"
+        """
+        members = self.channels.get(channel, {})
+        ranks = {symbol: rank for rank, symbol in enumerate(self.prefix_symbols)}
+        unranked = len(ranks)
+        ordered = sorted(members.items(), key=lambda item: (ranks.get(item[1]["modes"][:1], unranked), item[0].lower()))
+        names = []
+        for nick, member in ordered:
+            name = member["modes"][:1] + nick
+            info = self.users.get(nick)
+            if info != None:
+                if info.get("account") != None:
+                    name += "✓"
+                if info.get("away") != None:
+                    name += f" ({away_word})"
+            names.append(name)
+        return " ".join(names)
+
+    def set_modes(self, channel, nick, modes):
+        """ Set the member's mode prefixes - kept in the order of the server's PREFIX (highest first) """
+        member = self.channels.get(channel, {}).get(nick)
+        if member == None:
+            return False
+        member["modes"] = "".join(symbol for symbol in self.prefix_symbols if symbol in modes)
+        return True
+
+    def add_mode(self, channel, nick, symbol):
+        """ Give a member a mode prefix (MODE +o / +v ..) - returns False if the nick is not on the channel """
+        return self.set_modes(channel, nick, self.get_modes(channel, nick) + symbol)
+
+    def remove_mode(self, channel, nick, symbol):
+        """ Take a mode prefix from a member (MODE -o / -v ..) - returns False if the nick is not on the channel """
+        return self.set_modes(channel, nick, self.get_modes(channel, nick).replace(symbol, ""))
+
+    def set_prefixes(self, prefix):
+        """ Use the server's PREFIX -feature ("(ov)@+") for the mode letters & their NAMES -symbols """
+        parsed = parse_prefix_feature(prefix)
+        if parsed:
+            self.prefix_modes = parsed
+            self.prefix_symbols = "".join(parsed.values())
+
+    def split_names_entry(self, entry):
+        """ Split a NAMES -entry ("@+nick" or with userhost-in-names "@nick!user@host") to (modes, nick, host) """
+        start = 0
+        while start < len(entry) and entry[start] in self.prefix_symbols:
+            start += 1
+        nick, separator, host = entry[start:].partition("!")
+        if separator:
+            host = host.partition("@")[2]
+        return entry[:start], nick, (host or None)
+
+    def replace_channel(self, channel, names):
+        """
+        # Replace Channel
+        - Apply a complete NAMES -list ({nick: (modes, host)}) to a channel, as a diff:
+          leavers are removed, newcomers added, modes updated, known hosts kept
+        - returns (joined, left) -sets of nicks
+        """
+        members = self.channels.get(channel, {})
+        left = {nick for nick in members if nick not in names}
+        joined = {nick for nick in names if nick not in members}
+        for nick in left:
+            self.remove(channel, nick)
+        for nick, (modes, host) in names.items():
+            self.add(channel, nick, host=host)
+            self.set_modes(channel, nick, modes)
+        return joined, left
+
+# Default ISUPPORT -values (RFC 1459 / 2812 servers that don't send them)
+default_prefix = "(ov)@+"
+default_chanmodes = "beI,k,l,imnpst"
+
+def parse_prefix_feature(prefix):
+    """ Parse a PREFIX -feature "(ov)@+" to an ordered {mode letter: symbol} -dictionary (highest first) - or None if invalid """
+    if not prefix.startswith("(") or ")" not in prefix:
+        return None
+    letters, symbols = prefix[1:].split(")", 1)
+    if len(letters) != len(symbols):
+        return None
+    return dict(zip(letters, symbols))
+
+def parse_mode_changes(modestring, params, prefix_modes, chanmodes=default_chanmodes):
+    """
+    # Parse Mode Changes
+    - Parse a channel MODE ("+ov-v", ["nick1", "nick2", "nick3"]) to a list of (sign, mode letter, parameter)
+    - Which modes take a parameter comes from PREFIX (always) & CHANMODES (types A & B always, C when set, D never)
+    """
+    types = (chanmodes.split(",") + ["", "", "", ""])[:4]
+    always = types[0] + types[1]
+    params = list(params)
+    changes = []
+    sign = "+"
+    for letter in modestring:
+        if letter in "+-":
+            sign = letter
+            continue
+        param = None
+        if letter in prefix_modes or letter in always or (sign == "+" and letter in types[2]):
+            param = params.pop(0) if params else None
+        changes.append((sign, letter, param))
+    return changes
@@ -1,4 +1,4 @@
-from ircc import IRC
+from ircc import IRC, IRCLoop
 from discordc import Discord
 import timers
 
@@ -11,20 +11,26 @@ settings = json.loads(f.read())
 f.close()
 
 # Init with settings 
-irc = IRC(settings)
+# - One IRC-loop drives the connections to all the IRC-networks: the "irc" -settings & the ones in "irc_networks"
+irc_loop = IRCLoop()
+irc = IRC(settings, irc_loop)
+for network_name in settings.get("irc_networks", {}):
+    IRC(settings, irc_loop, network_name)
 discord = Discord(settings)
 # & share "pointers" between IRC & Discord
-irc.set_discord(discord)
+for network in irc_loop.networks.values():
+    network.set_discord(discord)
 discord.set_irc(irc)
 
 # Shared mutex/thread lock for everyone who are error printing on the console log (?)
 thread_lock = threading.Lock()
-irc.set_thread_lock(thread_lock)
+for network in irc_loop.networks.values():
+    network.set_thread_lock(thread_lock)
 discord.set_thread_lock(thread_lock)
 timers.set_thread_lock(thread_lock)
 
-# Thread 1 : IRC
-t1 = threading.Thread(target=irc.run)
+# Thread 1 : IRC (all the networks)
+t1 = threading.Thread(target=irc_loop.run)
 t1.daemon = True # Thread dies when main thread (only non-daemon thread) exits.
 t1.start()
 
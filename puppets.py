@@ -0,0 +1,286 @@
+import collections
+import irc.client
+import clock
+import timers
+import ircformat
+import ircqueue
+import ircreconnect
+
+# Characters allowed in IRC-nicknames (RFC 2812: letters, digits & []\`_^{|} and '-', not first)
+nick_special_characters = "[]\\`_^{|}-"
+# Longest user@host the server might put in front of a puppet's lines (the split budget is counted for the worst case)
+max_userhost_length = 10 + 1 + 63
+
+class Puppet:
+    """ One Discord user's own IRC-connection (see PuppetPool) """
+
+    def __init__(self, user_id, name, nick, connection, bucket):
+        self.user_id = user_id
+        self.name = name               # Discord name the nick was made from
+        self.nick = nick
+        self.connection = connection
+        self.outbound_queue = ircqueue.OutboundQueue(bucket) # Own flood budget per connection
+        self.outbound_wait = None      # Seconds until the queued lines can continue (None = nothing queued)
+        self.ready = False             # Registered on the server (001) - lines are held back until then
+        self.channels = set()          # Channels the puppet has JOINed
+        self.nick_tries = 0            # Nicknames tried after the first one was taken
+        self.fallback_lines = []       # (channel, line) -list: what the bot relays instead, if the puppet never gets connected
+        self.register_timer = None     # Timer handle: gives up on the puppet if it is not registered in time
+        self.last_active = clock.now()
+
+    def connection_send(self, line):
+        """ Send a single line from the outbound queue: (command, channel, text) """
+        command, channel, text = line
+        if command == "JOIN":
+            self.connection.join(channel)
+        else:
+            self.connection.privmsg(channel, text)
+
+class PuppetPool:
+    """
+    # Puppet pool
+    - Optional "puppet mode" of an IRC-network: active Discord users get their own IRC-connection,
+      so their messages come from their own nick instead of '[R] <name>' through the bot
+    - Connections are made on the user's first message and reaped after 'idle_timeout' seconds of silence
+    - At most 'max_puppets' connections at a time - when the pool is full, the messages go through the bot as before
+    - Every puppet has its own outbound queue & token bucket: the Discord traffic is spread over the connections'
+      flood budgets instead of all of it waiting on the bot's
+    - Runs on the IRC-thread: the connections are on the shared reactor, and the IRCLoop flushes the puppets' queues
+    - The TCP-connects are raced on the connect pool and handed back to the IRC-thread through 'call_in_loop'
+    - 'fallback' (channel, line) sends a line through the bot - for the messages of a puppet that could not connect
+    - 'get_servers' () returns the network's (host, port) -list to connect to: the server the bot is on first,
+      then the failover servers
+    """
+
+    def __init__(self, reactor, get_servers, pool_settings, call_in_loop, fallback, debug_print=print):
+        self.reactor = reactor
+        self.get_servers = get_servers
+        self.call_in_loop = call_in_loop
+        self.fallback = fallback
+        self.debug_print = debug_print
+        self.connect_timeout = pool_settings.get("connect_timeout", 10)
+        self.register_timeout = pool_settings.get("puppet_register_timeout", 60) # Seconds from connecting to the welcome (001)
+        self.enabled = pool_settings.get("puppets", False)
+        self.max_puppets = pool_settings.get("puppet_max", 10)
+        self.idle_timeout = pool_settings.get("puppet_idle_timeout", 1800)
+        self.nick_postfix = pool_settings.get("puppet_nick_postfix", "[d]")
+        self.realname = pool_settings.get("puppet_realname", "Discord user")
+        self.flood_rate = pool_settings.get("puppet_flood_rate", 1.0)
+        self.flood_burst = pool_settings.get("puppet_flood_burst", 4)
+        self.nicklen = 9                   # NICKLEN of the server (RFC 1459 default until the server tells, see set_nicklen)
+
+        self.puppets = collections.OrderedDict() # Discord user ID -> Puppet (least recently active first)
+        self.by_connection = {}                  # connection -> Puppet
+        self.nicks = set()                       # The nicks of the puppets (the bridge must not relay them back to Discord)
+
+        if self.enabled:
+            self.reactor.add_global_handler("welcome", self.on_welcome)
+            self.reactor.add_global_handler("nicknameinuse", self.on_nick_taken)
+            self.reactor.add_global_handler("erroneusnickname", self.on_nick_taken)
+            self.reactor.add_global_handler("unavailresource", self.on_nick_taken)
+            self.reactor.add_global_handler("kick", self.on_kick)
+            self.reactor.add_global_handler("disconnect", self.on_disconnect)
+
+    #####################################
+    #        SENDING                    #
+    #####################################
+
+    def send(self, user_id, name, channel, message, fallback_line):
+        """
+        # Send
+        - Send a Discord user's message to an IRC-channel through the user's own puppet connection
+        - Connects the puppet (and JOINs the channel) on first use
+        - returns False if the message could not be taken (puppet mode off / pool full):
+          the caller relays it through the bot instead
+        - If a new puppet fails to connect, the bot relays the 'fallback_line' (see remove_puppet)
+        """
+        if not self.enabled:
+            return False
+        puppet = self.puppets.get(user_id)
+        if puppet == None:
+            puppet = self.add_puppet(user_id, name)
+            if puppet == None:
+                return False
+        puppet.last_active = clock.now()
+        self.puppets.move_to_end(user_id)
+        if not puppet.ready:
+            puppet.fallback_lines.append((channel, fallback_line))
+
+        if channel not in puppet.channels:
+            puppet.channels.add(channel)
+            puppet.outbound_queue.put(channel, ("JOIN", channel, None))
+        for part in ircformat.split_message(message, self.get_split_limit(puppet, channel)):
+            puppet.outbound_queue.put(channel, ("PRIVMSG", channel, part))
+        self.flush_puppet(puppet)
+        return True
+
+    def get_split_limit(self, puppet, channel):
+        """ Returns the byte budget of a puppet's message on a channel (":nick!user@host PRIVMSG #channel :" counted for the worst case) """
+        prefix_length = 1 + len(puppet.nick) + 1 + max_userhost_length + len(" PRIVMSG ") + ircformat.get_byte_length(channel) + 2
+        return 510 - prefix_length
+
+    def flush_puppet(self, puppet):
+        """ Send the puppet's queued lines that its flood control allows right now """
+        if not puppet.ready:
+            return
+        if not puppet.connection.is_connected():
+            puppet.outbound_queue.clear()
+            puppet.outbound_wait = None
+            return
+        puppet.outbound_wait = puppet.outbound_queue.flush(puppet.connection_send)
+
+    def flush(self):
+        """ Flush the queues of all the puppets (called by the IRCLoop) """
+        for puppet in self.puppets.values():
+            if puppet.outbound_queue.length > 0:
+                self.flush_puppet(puppet)
+
+    def get_outbound_wait(self):
+        """ Returns the seconds until the next queued puppet-line can be sent (None = nothing queued) """
+        waits = [puppet.outbound_wait for puppet in self.puppets.values() if puppet.ready and puppet.outbound_wait != None]
+        if not waits:
+            return None
+        return min(waits)
+
+    #####################################
+    #   CONNECTIONS                     #
+    #####################################
+
+    def make_nick(self, name, tries=0):
+        """ Returns an IRC-nickname for a Discord name: the allowed characters + postfix, within the server's NICKLEN ('tries' -number added for taken nicks) """
+        base = "".join(character for character in name if character.isascii() and (character.isalnum() or character in nick_special_characters))
+        base = base.lstrip("-0123456789") or "discord"
+        postfix = self.nick_postfix + (str(tries) if tries > 0 else "")
+        return base[:max(1, self.nicklen - len(postfix))] + postfix
+
+    def set_nicklen(self, nicklen):
+        """ Use the server's NICKLEN (from the bot connection's ISUPPORT) for the new puppets """
+        if nicklen:
+            self.nicklen = int(nicklen)
+
+    def add_puppet(self, user_id, name):
+        """ Start connecting a new puppet for a Discord user (on the connect pool) - returns the Puppet, or None if the pool is full """
+        if len(self.puppets) >= self.max_puppets:
+            return None
+        nick = self.make_nick(name)
+        puppet = Puppet(user_id, name, nick, self.reactor.server(), ircqueue.TokenBucket(self.flood_rate, self.flood_burst))
+        self.puppets[user_id] = puppet
+        self.by_connection[puppet.connection] = puppet
+        self.debug_print(f"[IRC] Puppet {nick} connecting for Discord user {name} ({len(self.puppets)}/{self.max_puppets})")
+        ircreconnect.race_connect(self.get_servers(), lambda sock, server, error: self.on_race_done(puppet, sock, server, error), self.connect_timeout)
+        puppet.register_timer = timers.add_timer("", self.register_timeout, self.call_in_loop, self.on_register_timeout, puppet)
+        return puppet
+
+    def on_race_done(self, puppet, sock, server, error):
+        """ The puppet's TCP-connection is made or failed (on a pool / timer thread) - hand it to the IRC-thread """
+        if error != None:
+            self.call_in_loop(self.on_connect_failed, puppet, str(error))
+            return
+        self.call_in_loop(self.on_puppet_socket, puppet, sock, server)
+
+    def on_puppet_socket(self, puppet, sock, server):
+        """ The puppet's socket is connected - register on the server with it """
+        if self.puppets.get(puppet.user_id) is not puppet:
+            sock.close() # Removed meanwhile
+            return
+        try:
+            host, port = server
+            puppet.connection.connect(host, port, puppet.nick, None, puppet.nick, self.realname, connect_factory=lambda server_address: sock)
+        except (irc.client.ServerConnectionError, OSError) as e:
+            sock.close()
+            self.on_connect_failed(puppet, str(e))
+
+    def on_register_timeout(self, puppet):
+        """ The puppet did not get registered in time (no answer / no welcome) - free its place, its messages go through the bot """
+        if self.puppets.get(puppet.user_id) is not puppet or puppet.ready:
+            return
+        self.debug_print(f"[IRC] Puppet {puppet.nick} not registered in {self.register_timeout} seconds, giving up")
+        self.remove_puppet(puppet, "Registration timed out")
+
+    def on_connect_failed(self, puppet, reason):
+        """ The puppet could not connect - its messages go through the bot """
+        self.debug_print(f"[IRC] Puppet connection for {puppet.name} failed: {reason}")
+        self.remove_puppet(puppet)
+
+    def remove_puppet(self, puppet, message=None):
+        """ Drop a puppet from the pool - and disconnect it with a quit message, if given
+        - The connection is closed for good (removed from the reactor)
+        - The messages of a puppet that never got registered are relayed through the bot """
+        self.puppets.pop(puppet.user_id, None)
+        self.by_connection.pop(puppet.connection, None)
+        if puppet.register_timer != None:
+            puppet.register_timer.cancel()
+            puppet.register_timer = None
+        if message != None and puppet.connection.is_connected():
+            puppet.connection.disconnect(message)
+        puppet.connection.close()
+        if not puppet.ready:
+            for channel, line in puppet.fallback_lines:
+                self.fallback(channel, line)
+            puppet.fallback_lines = []
+
+    def reap_idle(self):
+        """ Disconnect the puppets that have been quiet for idle_timeout seconds (least recently active are first in the pool) """
+        currtime = clock.now()
+        for puppet in list(self.puppets.values()):
+            if currtime - puppet.last_active < self.idle_timeout:
+                break
+            if puppet.outbound_queue.length == 0:
+                self.debug_print(f"[IRC] Puppet {puppet.nick} idle, disconnecting")
+                self.remove_puppet(puppet, "Idle")
+
+    def shutdown(self, message):
+        """ Disconnect all the puppets """
+        for puppet in list(self.puppets.values()):
+            self.remove_puppet(puppet, message)
+
+    def is_puppet(self, nick):
+        """ Returns True if the nick belongs to (or recently belonged to) one of our puppets """
+        return nick in self.nicks
+
+    def forget_nick(self, nick):
+        """ The nick left the network - it is no longer one of ours """
+        self.nicks.discard(nick)
+
+    #####################################
+    #   EVENTS OF THE PUPPET CONNECTIONS #
+    #####################################
+
+    def on_welcome(self, connection, event):
+        """ Puppet registered on the server - send what was waiting """
+        puppet = self.by_connection.get(connection)
+        if puppet == None:
+            return
+        puppet.nick = connection.get_nickname()
+        puppet.ready = True
+        puppet.fallback_lines = []
+        if puppet.register_timer != None:
+            puppet.register_timer.cancel()
+            puppet.register_timer = None
+        self.nicks.add(puppet.nick)
+        self.flush_puppet(puppet)
+
+    def on_nick_taken(self, connection, event):
+        """ The puppet's nick is taken / not allowed - try the next one, give up after a few tries """
+        puppet = self.by_connection.get(connection)
+        if puppet == None or puppet.ready:
+            return
+        puppet.nick_tries += 1
+        if puppet.nick_tries > 5:
+            self.debug_print(f"[IRC] No free nickname for puppet {puppet.nick}, giving up")
+            self.remove_puppet(puppet, "No free nickname")
+            return
+        puppet.nick = self.make_nick(puppet.name, puppet.nick_tries)
+        connection.nick(puppet.nick)
+
+    def on_kick(self, connection, event):
+        """ Puppet kicked - re-JOIN with the user's next message """
+        puppet = self.by_connection.get(connection)
+        if puppet != None and event.arguments and event.arguments[0] == connection.get_nickname():
+            puppet.channels.discard(event.target)
+
+    def on_disconnect(self, connection, event):
+        """ Puppet lost its connection - the user's next message makes a new one """
+        puppet = self.by_connection.get(connection)
+        if puppet != None:
+            self.remove_puppet(puppet)
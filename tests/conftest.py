@@ -0,0 +1,22 @@
+# The bridge's modules are flat in the repository root - make them importable when running: python -m pytest tests
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import timers
+
+@pytest.fixture
+def timer_thread():
+    """ The timer thread running on the real clock (for the code that schedules its work as timers) """
+    timers.set_thread_lock(threading.Lock())
+    thread = threading.Thread(target=timers.run, daemon=True)
+    thread.start()
+    yield
+    timers.shutdown_timers()
+    thread.join(5)
+    with timers.condition:
+        for timer in list(timers.timers.values()):
+            timers.remove_timer(timer)
@@ -0,0 +1,93 @@
+"""
+# clock tests
+- SimulatedClock: time moves only when advanced, waits wake up on the moves & time out on the simulated time
+- set_clock notifies the clock listeners
+"""
+import threading
+
+import clock
+
+def test_simulated_time():
+    sim = clock.SimulatedClock(10)
+    assert sim.time() == 10.0
+    sim.advance(2.5)
+    sim.sleep(0.5)
+    assert sim.time() == 13.0
+    sim.set_time(5) # never backwards
+    assert sim.time() == 13.0
+    sim.set_time(20)
+    assert sim.time() == 20.0
+
+def test_wait_passed_timeout():
+    sim = clock.SimulatedClock()
+    condition = threading.Condition()
+    with condition:
+        assert sim.wait(condition, 0) == False
+        assert sim.wait(condition, -1) == False
+
+def wait_in_thread(sim, condition, timeout, results):
+    """ Start a thread waiting on the clock - returns after the thread is waiting """
+    def waiter():
+        with condition:
+            results.append(sim.wait(condition, timeout))
+    thread = threading.Thread(target=waiter, daemon=True)
+    thread.start()
+    while True:
+        with sim.lock:
+            if condition in sim.waiting:
+                return thread
+
+def test_wait_times_out_on_advance():
+    sim = clock.SimulatedClock()
+    condition = threading.Condition()
+    results = []
+    thread = wait_in_thread(sim, condition, 5, results)
+    sim.advance(5)
+    thread.join(5)
+    assert results == [False]
+    assert sim.waiting == {}
+
+def test_wait_notified_before_timeout():
+    sim = clock.SimulatedClock()
+    condition = threading.Condition()
+    results = []
+    thread = wait_in_thread(sim, condition, 5, results)
+    with condition:
+        condition.notify_all()
+    thread.join(5)
+    assert results == [True]
+
+def test_watch():
+    """ A watched condition is notified on every move of the clock """
+    sim = clock.SimulatedClock()
+    condition = threading.Condition()
+    sim.watch(condition)
+    woken = []
+    def waiter():
+        with condition:
+            started.set()
+            woken.append(condition.wait(5))
+    started = threading.Event()
+    with condition:
+        thread = threading.Thread(target=waiter, daemon=True)
+        thread.start()
+    started.wait(5)
+    with condition: # (the waiter is in wait() once it let go of the condition)
+        pass
+    sim.advance(1)
+    thread.join(5)
+    assert woken == [True]
+
+def test_set_clock_listeners():
+    changes = []
+    listener = lambda old, new: changes.append((old, new))
+    clock.add_clock_listener(listener)
+    try:
+        old = clock.get_clock()
+        sim = clock.SimulatedClock(42)
+        clock.set_clock(sim)
+        assert clock.now() == 42
+        clock.set_clock(old)
+    finally:
+        clock.clock_listeners.remove(listener)
+    assert changes == [(old, sim), (sim, old)]
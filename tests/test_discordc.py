@@ -0,0 +1,158 @@
+"""
+# discordc tests
+- A Discord -side of the bridge made from settings.json, never connected
+- Coalescing: the author's messages merged within the window, sent on an author change / on the window timer,
+  and the default window (0) relaying every message right away
+- MentionIndex: the longest name wins, case-insensitively - and the index follows the member join / leave / rename events
+"""
+import asyncio
+import atexit
+import json
+import logging
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import clock
+import discordc
+import timers
+
+class StandInNetwork:
+    """ The IRC -network of a channel: records the lines sent to IRC """
+    network_name = "default"
+
+    def __init__(self):
+        self.sent = []
+
+    def get_split_limit(self, irc_chan):
+        return 60
+
+    def send_irc_message(self, irc_chan, message):
+        self.sent.append((irc_chan, message))
+
+@pytest.fixture
+def discord_side(monkeypatch):
+    # (no error log file from the tests)
+    monkeypatch.setattr(logging, "FileHandler", lambda *arguments, **keywords: logging.NullHandler())
+    with open("settings.json", encoding="utf-8") as settings_file:
+        settings = json.load(settings_file)
+    settings["discord"]["server"] = "1234"
+    discord_side = discordc.Discord(settings)
+    atexit.unregister(discord_side.shutdown)
+    return discord_side
+
+@pytest.fixture
+def simulated():
+    """ Fresh timers on a SimulatedClock - returns the clock """
+    timers.set_thread_lock(threading.Lock())
+    sim = clock.SimulatedClock(1000.0)
+    clock.set_clock(sim)
+    yield sim
+    with timers.condition:
+        for timer in list(timers.timers.values()):
+            timers.remove_timer(timer)
+    clock.set_clock(clock.RealClock())
+
+def test_coalesce_off_by_default(discord_side, simulated):
+    network = StandInNetwork()
+    assert discord_side.coalesce_window == 0
+    discord_side.send_coalesced_to_irc(network, "#chan", 1, "<a> one", "one")
+    discord_side.send_coalesced_to_irc(network, "#chan", 1, "<a> two", "two")
+    assert network.sent == [("#chan", "<a> one"), ("#chan", "<a> two")]
+    assert discord_side.coalesced == {}
+
+def test_coalesce_merges_within_window(discord_side, simulated):
+    network = StandInNetwork()
+    discord_side.coalesce_window = 1.5
+    discord_side.send_coalesced_to_irc(network, "#chan", 1, "<a> one", "one")
+    simulated.advance(1)
+    discord_side.send_coalesced_to_irc(network, "#chan", 1, "<a> two", "two")
+    timers.check_timers()
+    assert network.sent == []
+
+    # The window runs from the first message
+    simulated.advance(0.5)
+    timers.check_timers()
+    assert network.sent == [("#chan", "<a> one | two")]
+    assert discord_side.coalesced == {}
+
+def test_coalesce_author_change_sends_waiting_line(discord_side, simulated):
+    network = StandInNetwork()
+    discord_side.coalesce_window = 1.5
+    discord_side.send_coalesced_to_irc(network, "#chan", 1, "<a> one", "one")
+    discord_side.send_coalesced_to_irc(network, "#chan", 2, "<b> hi", "hi")
+    assert network.sent == [("#chan", "<a> one")]
+    simulated.advance(1.5)
+    timers.check_timers()
+    assert network.sent == [("#chan", "<a> one"), ("#chan", "<b> hi")]
+
+def test_coalesce_line_full_sends_waiting_line(discord_side, simulated):
+    network = StandInNetwork()
+    discord_side.coalesce_window = 1.5
+    discord_side.send_coalesced_to_irc(network, "#chan", 1, "<a> " + "x" * 40, "x" * 40)
+    discord_side.send_coalesced_to_irc(network, "#chan", 1, "<a> " + "y" * 40, "y" * 40)
+    assert network.sent == [("#chan", "<a> " + "x" * 40)]
+
+def test_flush_coalesced(discord_side, simulated):
+    network = StandInNetwork()
+    discord_side.coalesce_window = 1.5
+    discord_side.send_coalesced_to_irc(network, "#chan", 1, "<a> one", "one")
+    discord_side.send_coalesced_to_irc(network, "#other", 1, "<a> two", "two")
+    discord_side.flush_coalesced(network, "#chan")
+    assert network.sent == [("#chan", "<a> one")]
+
+    # The flushed line's timer is stopped, the other channel's line waits for its own
+    simulated.advance(1.5)
+    timers.check_timers()
+    assert network.sent == [("#chan", "<a> one"), ("#other", "<a> two")]
+
+def make_member(user_id, name, nick=None, global_name=None):
+    """ A stand-in Discord member on the bridged server """
+    return SimpleNamespace(id=user_id, name=name, nick=nick, global_name=global_name, display_name=nick or global_name or name,
+                           status="online", guild=SimpleNamespace(id=1234))
+
+def test_mention_longest_name_wins():
+    index = discordc.MentionIndex()
+    index.add_user(1, [("Bob", discordc.MENTION_DISPLAY_NAME)])
+    index.add_user(2, [("Bob Smith", discordc.MENTION_DISPLAY_NAME)])
+    assert index.resolve("hi @Bob Smith!") == "hi <@2>!"
+    assert index.resolve("hi @Bob Smithers") == "hi <@1> Smithers"
+    assert index.resolve("@Bobby, a@Bob") == "@Bobby, a@Bob"
+
+def test_mention_case_insensitive():
+    index = discordc.MentionIndex()
+    index.add_user(1, [("Straße", discordc.MENTION_DISPLAY_NAME)])
+    assert index.resolve("@STRASSE: @straße") == "<@1>: <@1>"
+
+def test_mention_rank_and_ambiguous():
+    index = discordc.MentionIndex()
+    index.add_user(1, [("sam", discordc.MENTION_DISPLAY_NAME)])
+    index.add_user(2, [("Sam", discordc.MENTION_USER_NAME)])
+    assert index.resolve("@sam") == "<@1>"
+    index.add_user(3, [("SAM", discordc.MENTION_DISPLAY_NAME)])
+    assert index.resolve("@sam") == "@sam"
+
+def test_mention_member_events(discord_side, monkeypatch):
+    channel = object()
+    monkeypatch.setattr(discord_side, "get_bridged_channels_of", lambda member: [channel])
+    member = make_member(1, "alice_b", nick="Alice")
+    asyncio.run(discordc.on_member_join(member))
+    assert discord_side.resolve_mentions("@alice @alice_b") == "<@1> <@1>"
+    assert discord_side.known_users["Alice"].user_id == 1
+
+    # Server nickname changed: the old nick no longer pings
+    renamed = make_member(1, "alice_b", nick="Ally")
+    asyncio.run(discordc.on_member_update(member, renamed))
+    assert discord_side.resolve_mentions("@alice @ally") == "@alice <@1>"
+    assert "Alice" not in discord_side.known_users
+
+    # User name changed
+    server = SimpleNamespace(get_member=lambda user_id: make_member(1, "alice_c", nick="Ally"))
+    monkeypatch.setattr(discordc.discord_bot, "get_guild", lambda guild_id: server)
+    asyncio.run(discordc.on_user_update(make_member(1, "alice_b"), make_member(1, "alice_c")))
+    assert discord_side.resolve_mentions("@alice_b @alice_c") == "@alice_b <@1>"
+
+    asyncio.run(discordc.on_member_remove(renamed))
+    assert discord_side.resolve_mentions("@ally @alice_c") == "@ally @alice_c"
+    assert discord_side.mention_index.root == {}
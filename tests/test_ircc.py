@@ -0,0 +1,80 @@
+"""
+# ircc tests
+- An IRC -bridge made from settings.json, never connected: its event handlers are called with made-up events
+- Localization: a language's missing words & help texts fall back to English, unknown ones to '<missingword>'
+"""
+import json
+import logging
+
+import irc.client
+import pytest
+
+import ircc
+
+class StandInDiscord:
+    """ The Discord -side of the bridge: takes everything, does nothing """
+
+    def __getattr__(self, name):
+        return lambda *arguments, **keywords: None
+
+@pytest.fixture
+def bridge():
+    logging.getLogger("ircc").addHandler(logging.NullHandler()) # (no error log file from the tests)
+    with open("settings.json", encoding="utf-8") as settings_file:
+        settings = json.load(settings_file)
+    bridge = ircc.IRC(settings, ircc.IRCLoop())
+    bridge.set_discord(StandInDiscord())
+    bridge.debug_print = lambda *arguments, **keywords: None
+    return bridge
+
+def test_split_limit_after_own_nick_change(bridge):
+    bridge.connection.real_nickname = "bot"
+    bridge.set_myprivmsg_line("bot!bridge@host.example")
+    limit = bridge.get_split_limit("#chan")
+
+    # (the irc-library takes the new nick in use before the handlers run)
+    bridge.connection.real_nickname = "muchlongerbot"
+    bridge.on_nick(bridge.connection, irc.client.Event("nick", irc.client.NickMask("bot!bridge@host.example"), "muchlongerbot"))
+    assert bridge.myprivmsg_line == "muchlongerbot!bridge@host.example PRIVMSG"
+    assert bridge.get_split_limit("#chan") == limit - len("muchlonger")
+
+def test_split_limit_other_nick_change(bridge):
+    bridge.connection.real_nickname = "bot"
+    bridge.set_myprivmsg_line("bot!bridge@host.example")
+    limit = bridge.get_split_limit("#chan")
+    bridge.on_nick(bridge.connection, irc.client.Event("nick", irc.client.NickMask("someone!u@h"), "someone_else"))
+    assert bridge.get_split_limit("#chan") == limit
+
+def test_split_limit_after_host_change(bridge):
+    bridge.set_myprivmsg_line("bot!bridge@host.example")
+    limit = bridge.get_split_limit("#chan")
+    bridge.raw_handlers.dispatch(":irc.local 396 bot a.much.longer.cloak.example :is now your displayed host")
+    assert bridge.myprivmsg_line == "bot!bridge@a.much.longer.cloak.example PRIVMSG"
+    assert bridge.get_split_limit("#chan") == limit - len("a.much.longer.cloak.example") + len("host.example")
+
+def test_localization_fallback_to_english(bridge):
+    english = ircc.settings["localization"]["en"]
+    ircc.settings["localization"]["xx"] = {"quitmessage": "Heippa", "help_dict": {"!help": "apua\nlisää"}}
+    bridge.change_language("xx")
+    assert bridge.get_word("quitmessage") == "Heippa"
+    assert bridge.get_word("new_language_announce") == english["new_language_announce"]
+    assert bridge.get_help("!help") == "apua\nlisää"
+    assert bridge.get_help("!topic") == english["help_dict"]["!topic"]
+    assert bridge.get_help_dict().keys() == english["help_dict"].keys()
+
+def test_localization_missing_word(bridge):
+    assert bridge.get_word("no_such_word") == "<missingword>"
+    assert bridge.get_help("!no_such_command") == "<missingword>"
+    assert bridge.get_irc_help("!no_such_command") == "<missingword>"
+
+    # An unknown language keeps the tables in use
+    bridge.change_language("zz")
+    assert bridge.get_word("quitmessage") == ircc.settings["localization"]["en"]["quitmessage"]
+
+def test_localization_irc_help_texts(bridge):
+    ircc.settings["localization"]["xx"] = {"help_dict": {"!help": "apua\nlisää"}}
+    bridge.change_language("xx")
+    assert bridge.get_irc_help("!help") == "apua-lisää"
+    shutdown_help = ircc.settings["localization"]["en"]["help_dict"]["!shutdown"]
+    assert "\n" in shutdown_help
+    assert bridge.get_irc_help("!shutdown") == shutdown_help.replace("\n", "-")
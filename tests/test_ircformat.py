@@ -0,0 +1,69 @@
+"""
+# ircformat tests
+- split_message: byte limits, whitespace & the cuts inside multibyte characters / color codes
+- markdown_to_irc & irc_to_markdown: the common markdown, code, URLs & unpaired markers
+"""
+import random
+
+import pytest
+
+import ircformat
+
+def test_split_message_fits():
+    assert ircformat.split_message(" a  b ", 10) == ["a  b"]
+    assert ircformat.split_message("   ", 5) == []
+
+def test_split_message_at_whitespace():
+    assert ircformat.split_message("hello world foo", 11) == ["hello world", "foo"]
+
+def test_split_message_multibyte():
+    # 'ä' is 2 bytes: never cut in the middle of one
+    assert ircformat.split_message("ä" * 10, 5) == ["ää"] * 5
+
+def test_split_message_color_codes():
+    assert ircformat.split_message("\x0312abc", 3) == ["\x0312", "abc"]
+    assert ircformat.split_message("aa \x0312,05bbbb", 8) == ["aa", "\x0312,05bb", "bb"]
+
+def test_split_message_random():
+    """ Every piece within the limit, and the words of the pieces are the words of the message """
+    rand = random.Random(7)
+    alphabet = ["a", "b", "ä", "€", "😀", " ", " ", "\x0304", "\x02"]
+    for i in range(2000):
+        message = "".join(rand.choice(alphabet) for j in range(rand.randint(0, 60)))
+        max_bytes = rand.randint(4, 30)
+        pieces = ircformat.split_message(message, max_bytes)
+        assert all(0 < ircformat.get_byte_length(piece) <= max_bytes for piece in pieces)
+        assert "".join("".join(pieces).split()) == "".join(message.split())
+
+@pytest.mark.parametrize("markdown, irc", [
+    ("plain text", "plain text"),
+    ("**bold** text", "\x02bold\x02 text"),
+    ("_it_ and snake_case_name", "\x1dit\x1d and snake_case_name"),
+    ("***bi***", "\x1d\x02bi\x1d\x02"),
+    ("__u__", "\x1fu\x1f"),
+    ("___ui___", "\x1d\x1fui\x1d\x1f"),
+    ("~~s~~", "\x1es\x1e"),
+    ("~s~", "~s~"),
+    ("a*b*c", "a\x1db\x1dc"),
+    ("*a **b** c*", "\x1da \x02b\x02 c\x1d"),
+    ("**unclosed", "**unclosed"),
+    ("`co*de*` x", "`co*de*` x"),
+    ("```block **x**```", "block **x**"),
+    ("see http://a.b/c_d_e and *x*", "see http://a.b/c_d_e and \x1dx\x1d"),
+    ("  a \t b  ", "a b"),
+])
+def test_markdown_to_irc(markdown, irc):
+    assert ircformat.markdown_to_irc(markdown) == irc
+
+@pytest.mark.parametrize("irc, markdown", [
+    ("\x02bold\x02 \x0312blue\x03  x  ", "**bold** blue x"),
+    ("\x02open", "**open**"),
+    ("\x1dit\x1d", "_it_"),
+    ("\x1dopen italic", "_open italic_"),
+    ("\x02bold \x1dboth\x0f plain", "**bold _both_** plain"),
+    ("\x02a\x1db\x02c\x1d", "**a_b_**_c_"),
+    ("a lone ** stays", "a lone ** stays"),
+    ("pholderunderdash95130 \\x31 \\x1d", "pholderunderdash95130 \\x31 \\x1d"),
+])
+def test_irc_to_markdown(irc, markdown):
+    assert ircformat.irc_to_markdown(irc) == markdown
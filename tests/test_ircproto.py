@@ -0,0 +1,76 @@
+"""
+# ircproto tests
+- Raw line parsing & the dispatch table
+- ISUPPORT -values, the JOIN -packing & the IRCv3 capability negotiation
+"""
+import ircproto
+
+def test_get_command():
+    assert ircproto.get_command(":nick!u@h privmsg #a :hi") == "PRIVMSG"
+    assert ircproto.get_command("PING :x") == "PING"
+    assert ircproto.get_command("@time=1 :server 353 me = #a :x") == "353"
+    assert ircproto.get_command(":server  366 me #a") == "366"
+    assert ircproto.get_command(":server") == ""
+
+def test_parse_line():
+    assert ircproto.parse_line("@a=b;c :n!u@h PRIVMSG #chan :hello there") == ("a=b;c", "n!u@h", "PRIVMSG", ["#chan", "hello there"])
+    assert ircproto.parse_line("PING :token") == (None, None, "PING", ["token"])
+    assert ircproto.parse_line(":s 005 me A=1 B :are supported") == (None, "s", "005", ["me", "A=1", "B", "are supported"])
+
+def test_dispatcher():
+    dispatcher = ircproto.LineDispatcher()
+    seen = []
+    dispatcher.add_handler("privmsg", lambda prefix, params: seen.append((prefix, params)))
+    assert dispatcher.dispatch(":n PRIVMSG #a :hi")
+    assert not dispatcher.dispatch(":n NOTICE #a :hi")
+    dispatcher.remove_handler("PRIVMSG")
+    assert not dispatcher.dispatch(":n PRIVMSG #a :hi")
+    assert seen == [("n", ["#a", "hi"])]
+
+def test_parse_isupport():
+    assert ircproto.parse_targmax("PRIVMSG:4,notice:4,JOIN:") == {"PRIVMSG": 4, "NOTICE": 4, "JOIN": None}
+    assert ircproto.parse_chanlimit("#&:120,+:") == {"#&": 120, "+": None}
+
+def test_pack_targets():
+    channels = [f"#c{i}" for i in range(5)]
+    assert ircproto.pack_targets("JOIN", channels) == ["JOIN #c0,#c1,#c2,#c3,#c4"]
+    assert ircproto.pack_targets("JOIN", channels, 2) == ["JOIN #c0,#c1", "JOIN #c2,#c3", "JOIN #c4"]
+    assert ircproto.pack_targets("JOIN", []) == []
+
+def test_pack_targets_length():
+    channels = [f"#channel-{i:03}" for i in range(200)]
+    lines = ircproto.pack_targets("JOIN", channels, max_length=100)
+    assert all(len(line.encode("utf-8")) <= 100 for line in lines)
+    assert [target for line in lines for target in line[5:].split(",")] == channels
+    # A line is filled as full as it can be
+    assert all(len(line) + len(",#channel-000") > 100 for line in lines[:-1])
+
+def test_caps_negotiated():
+    caps = ircproto.CapNegotiation()
+    assert caps.on_cap(["*", "LS", "*", "multi-prefix sasl=PLAIN"]) == [] # more to come
+    assert caps.on_cap(["*", "LS", "away-notify unknown-cap"]) == ["CAP REQ :multi-prefix away-notify"]
+    assert "sasl" in caps.offered
+    assert caps.on_cap(["*", "ACK", "multi-prefix away-notify"]) == ["CAP END"]
+    assert caps.has("multi-prefix") and caps.has("away-notify")
+    # After the registration: CAP NEW / DEL
+    assert caps.on_cap(["me", "NEW", "echo-message"]) == ["CAP REQ :echo-message"]
+    assert caps.on_cap(["me", "ACK", "echo-message"]) == [] # (CAP END only once)
+    assert caps.on_cap(["me", "DEL", "away-notify"]) == []
+    assert not caps.has("away-notify") and caps.has("echo-message")
+
+def test_caps_none_wanted_or_nak():
+    caps = ircproto.CapNegotiation()
+    assert caps.on_cap(["*", "LS", "sasl"]) == ["CAP END"]
+    caps = ircproto.CapNegotiation()
+    caps.on_cap(["*", "LS", "*", "batch"])
+    assert caps.on_cap(["*", "LS", "server-time"]) == ["CAP REQ :server-time batch"]
+    assert caps.on_cap(["*", "NAK", "server-time batch"]) == ["CAP END"]
+    assert caps.enabled == set()
+    assert caps.on_cap(["*"]) == []
+
+def test_tags():
+    tags = [{"key": "time", "value": "2024-01-01T00:00:01.500Z"}]
+    assert ircproto.get_tag(tags, "time") == "2024-01-01T00:00:01.500Z"
+    assert ircproto.get_tag(None, "time") == None
+    assert ircproto.parse_server_time(ircproto.get_tag(tags, "time")) == 1704067201.5
+    assert ircproto.parse_server_time("yesterday") == None
@@ -0,0 +1,80 @@
+"""
+# ircqueue tests
+- TokenBucket & OutboundQueue on a SimulatedClock: the burst, the refill rate, priorities & the round-robin
+- AdaptiveRate: increase on backlog, backoff on lag & throttling, the clamping & reset
+"""
+import pytest
+
+import clock
+import ircqueue
+
+@pytest.fixture
+def simulated():
+    sim = clock.SimulatedClock(1000.0)
+    clock.set_clock(sim)
+    yield sim
+    clock.set_clock(clock.RealClock())
+
+def test_bucket_burst_and_refill(simulated):
+    bucket = ircqueue.TokenBucket(2, 3)
+    now = clock.now()
+    assert [bucket.try_take(now) for i in range(4)] == [True, True, True, False]
+    assert bucket.get_wait_time(now) == pytest.approx(0.5)
+    assert bucket.try_take(now + 0.5)
+    # Refilled up to the burst size only
+    assert [bucket.try_take(now + 100) for i in range(4)] == [True, True, True, False]
+
+def test_queue_priorities_and_round_robin(simulated):
+    queue = ircqueue.OutboundQueue(ircqueue.TokenBucket(1, 100))
+    queue.put("#a", "a1")
+    queue.put("#a", "a2")
+    queue.put("#a", "a3")
+    queue.put("#b", "b1")
+    queue.put("#a", "noise", ircqueue.PRIORITY_NOISE)
+    queue.put("#b", "b2")
+    sent = []
+    assert queue.flush(sent.append) == None
+    assert sent == ["a1", "b1", "a2", "b2", "a3", "noise"]
+    assert queue.length == 0
+
+def test_queue_flood_limit(simulated):
+    queue = ircqueue.OutboundQueue(ircqueue.TokenBucket(2, 2))
+    for i in range(5):
+        queue.put("#a", i)
+    sent = []
+    assert queue.flush(sent.append) == pytest.approx(0.5)
+    assert sent == [0, 1] and queue.backlogged
+    simulated.advance(1)
+    queue.flush(sent.append)
+    assert sent == [0, 1, 2, 3]
+    queue.clear()
+    assert queue.pop_next() == None
+
+def make_rate(rate=2.0):
+    return ircqueue.AdaptiveRate(ircqueue.TokenBucket(rate, 5), min_rate=0.5, max_rate=10.0)
+
+def test_rate_increases_when_backlogged(simulated):
+    rate = make_rate()
+    assert rate.on_rtt(0.1, True) == 2.0 # first sample: only the baseline
+    assert rate.on_rtt(0.1, False) == 2.0
+    assert rate.on_rtt(0.1, True) == 2.25
+
+def test_rate_backs_off_on_lag(simulated):
+    rate = make_rate(4.0)
+    rate.on_rtt(0.1, False)
+    assert rate.on_rtt(5.0, True) == 3.0
+
+def test_rate_throttled_ceiling(simulated):
+    rate = make_rate(4.0)
+    assert rate.on_throttled() == 2.0
+    assert rate.ceiling == pytest.approx(3.6)
+    assert rate.set_rate(100) == pytest.approx(3.6)
+    assert rate.set_rate(0) == 0.5
+
+def test_rate_reset(simulated):
+    rate = make_rate(4.0)
+    rate.on_rtt(0.1, False)
+    rate.on_throttled()
+    assert rate.reset(8.0) == 8.0
+    assert rate.ceiling == None and rate.last_rtt == None and not rate.rtt_samples
+    assert rate.reset(50.0) == 10.0 # clamped to max_rate
@@ -0,0 +1,102 @@
+"""
+# ircreconnect tests
+- The backoff delays & the server list
+- race_connect against local listening sockets (on the timer thread & the connect pool)
+"""
+import queue
+import random
+import socket
+import threading
+
+import pytest
+
+import ircreconnect
+import timers
+
+def test_backoff():
+    random.seed(1)
+    backoff = ircreconnect.Backoff(2, 30)
+    steps = [2, 4, 8, 16, 30, 30]
+    for step in steps:
+        assert step / 2 <= backoff.next_delay() <= step
+    backoff.reset()
+    assert backoff.next_delay() <= 2
+
+def test_server_list():
+    settings = {"server": "irc.a", "port": 6667, "alternative_servers": ["irc.b", "irc.c:7000", "irc.a:6667", "[::1]:6697"]}
+    assert ircreconnect.get_server_list(settings) == [("irc.a", 6667), ("irc.b", 6667), ("irc.c", 7000), ("[::1]", 6697)]
+    assert ircreconnect.get_server_list({"server": "irc.a", "port": 6667}) == [("irc.a", 6667)]
+
+@pytest.fixture
+def listeners():
+    """ Returns a function making listening sockets - returns (socket, (host, port)) """
+    opened = []
+    def listen():
+        server = socket.socket()
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+        opened.append(server)
+        return server, server.getsockname()
+    yield listen
+    for server in opened:
+        server.close()
+
+def refused_address():
+    """ A local address nothing listens on """
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    address = closed.getsockname()
+    closed.close()
+    return address
+
+def race(servers, timeout=5, stagger=0.5):
+    """ Run a race to the end - returns its (socket, server, error) """
+    results = queue.Queue()
+    ircreconnect.race_connect(servers, lambda *result: results.put(result), timeout, stagger)
+    return results.get(timeout=10)
+
+def test_race_first_that_answers(timer_thread, listeners):
+    server, address = listeners()
+    sock, winner, error = race([refused_address(), address])
+    assert winner == address and error == None
+    sock.close()
+
+def test_race_all_refused(timer_thread):
+    sock, winner, error = race([refused_address(), refused_address()])
+    assert sock == None and winner == None
+    assert isinstance(error, OSError)
+
+def test_race_no_servers(timer_thread):
+    sock, winner, error = race([])
+    assert sock == None and isinstance(error, OSError)
+
+def test_race_late_socket_closed(timer_thread, listeners):
+    """ With no stagger both servers are tried at once: one wins, the other's socket is closed """
+    first, first_address = listeners()
+    second, second_address = listeners()
+    sock, winner, error = race([first_address, second_address], stagger=0)
+    loser = second if winner == first_address else first
+    loser.settimeout(5)
+    try:
+        accepted = loser.accept()[0]
+    except socket.timeout: # The losing attempt never got as far as connecting
+        sock.close()
+        return
+    accepted.settimeout(5)
+    assert accepted.recv(1) == b"" # closed by the race
+    accepted.close()
+    sock.close()
+
+def test_race_with_io_pool_full(timer_thread, listeners):
+    """ The attempts have their own pool: a full I/O pool (slow URL -fetches) doesn't hold them up """
+    release = threading.Event()
+    io_limit = timers.executor_limits[timers.EXEC_IO][1]
+    for i in range(io_limit):
+        timers.add_timer("", 0, release.wait, 10, executor=timers.EXEC_IO)
+    try:
+        server, address = listeners()
+        sock, winner, error = race([address])
+        assert winner == address
+        sock.close()
+    finally:
+        release.set()
@@ -0,0 +1,115 @@
+"""
+# ircstate tests
+- MembershipStore: joins, parts, quits, nick changes, modes & the NAMES -diffs, with the nick -> channels index kept in sync
+- The PREFIX & MODE parsing
+"""
+import ircstate
+
+def check_index(store):
+    """ The nick -> channels index matches the channels """
+    index = {}
+    for channel, members in store.channels.items():
+        for nick in members:
+            index.setdefault(nick, set()).add(channel)
+    assert store.nick_channels == index
+    assert set(store.users) <= set(index)
+
+def make_store():
+    store = ircstate.MembershipStore()
+    store.add("#a", "alice", "a.host", "@")
+    store.add("#a", "bob")
+    store.add("#b", "alice")
+    store.set_user_info("alice", "away", "lunch")
+    return store
+
+def test_add_remove():
+    store = make_store()
+    assert store.get_channels_of("alice") == {"#a", "#b"}
+    assert store.get_modes("#a", "alice") == "@"
+    assert store.get_members("#a")["bob"] == {"host": "?", "modes": ""}
+    assert store.remove("#a", "alice")
+    assert not store.remove("#a", "alice")
+    assert store.get_user_info("alice", "away") == "lunch" # still on #b
+    assert store.remove_nick("alice") == {"#b"}
+    assert store.get_user_info("alice", "away") == None
+    check_index(store)
+
+def test_rename():
+    store = make_store()
+    assert store.rename("alice", "alice2") == {"#a", "#b"}
+    assert not store.is_on("#a", "alice")
+    assert store.get_members("#a")["alice2"] == {"host": "a.host", "modes": "@"}
+    assert store.get_user_info("alice2", "away") == "lunch"
+    check_index(store)
+
+def test_rename_unknown_and_same():
+    store = make_store()
+    assert store.rename("nobody", "somebody") == set()
+    assert store.rename("bob", "bob") == {"#a"}
+    check_index(store)
+
+def test_rename_over_stale_nick():
+    """ A stale entry of the new nick (from a missed quit) is replaced """
+    store = make_store()
+    store.add("#c", "carol")
+    assert store.rename("bob", "carol") == {"#a"}
+    assert store.get_channels_of("carol") == {"#a"}
+    assert store.get_members("#c") == {}
+    check_index(store)
+
+def test_replace_channel():
+    store = make_store()
+    joined, left = store.replace_channel("#a", {"alice": ("+", None), "dave": ("", "d.host")})
+    assert joined == {"dave"} and left == {"bob"}
+    assert store.get_members("#a")["alice"] == {"host": "a.host", "modes": "+"} # the known host kept
+    assert store.get_members("#a")["dave"] == {"host": "d.host", "modes": ""}
+    assert "bob" not in store.nick_channels
+    check_index(store)
+
+def test_replace_channel_new():
+    store = ircstate.MembershipStore()
+    joined, left = store.replace_channel("#new", {"x": ("@+", None)})
+    assert joined == {"x"} and left == set()
+    assert store.get_modes("#new", "x") == "@+"
+    check_index(store)
+
+def test_clear_channel():
+    store = make_store()
+    store.clear_channel("#a")
+    assert store.get_channels_of("alice") == {"#b"}
+    assert "bob" not in store.nick_channels
+    check_index(store)
+
+def test_modes_and_names():
+    store = make_store()
+    store.set_prefixes("(qov)~@+")
+    assert store.add_mode("#a", "bob", "+")
+    assert store.add_mode("#a", "bob", "~")
+    assert store.get_modes("#a", "bob") == "~+"
+    assert store.remove_mode("#a", "bob", "~")
+    assert not store.add_mode("#a", "nobody", "@")
+    store.add("#a", "Carl")
+    assert store.format_names("#a") == "@alice (away) +bob Carl"
+    assert store.split_names_entry("@+nick!user@host") == ("@+", "nick", "host")
+    assert store.split_names_entry("nick") == ("", "nick", None)
+
+def test_parse_prefix_feature():
+    assert ircstate.parse_prefix_feature("(ov)@+") == {"o": "@", "v": "+"}
+    assert ircstate.parse_prefix_feature("(ov)@") == None
+    assert ircstate.parse_prefix_feature("ov") == None
+
+def test_parse_mode_changes():
+    prefix_modes = ircstate.parse_prefix_feature("(ov)@+")
+    changes = ircstate.parse_mode_changes("+ov-v+l-l+k", ["n1", "n2", "n3", "10", "key"], prefix_modes)
+    assert changes == [("+", "o", "n1"), ("+", "v", "n2"), ("-", "v", "n3"), ("+", "l", "10"), ("-", "l", None), ("+", "k", "key")]
+    # Type A (lists) without a parameter (a list query), type D never takes one
+    assert ircstate.parse_mode_changes("+b", [], prefix_modes) == [("+", "b", None)]
+    assert ircstate.parse_mode_changes("+nt", ["extra"], prefix_modes) == [("+", "n", None), ("+", "t", None)]
+
+def test_names_show_away_and_account():
+    store = make_store()
+    store.set_user_info("bob", "account", "bobby")
+    assert store.format_names("#a", "Away") == "@alice (Away) bob✓"
+    store.set_user_info("alice", "away", None) # back
+    store.set_user_info("bob", "account", None) # logged out
+    assert store.format_names("#a", "Away") == "@alice bob"
@@ -0,0 +1,158 @@
+"""
+# puppets tests
+- Nicknames, the pool limits & the idle reaping
+- The connections against a local stand-in for an IRC-server: registering & sending, the nick taken,
+  and the fallback to the bot when a puppet can't connect or doesn't get registered in time
+"""
+import collections
+import socket
+import socketserver
+import threading
+import time
+
+import irc.client
+import pytest
+
+import clock
+import puppets
+
+CHANNEL = "#test"
+
+class StandInServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, silent=False, taken_nicks=()):
+        super().__init__(("127.0.0.1", 0), StandInClient)
+        self.silent = silent               # Never answers - the registration times out
+        self.taken_nicks = set(taken_nicks)
+        self.lines = []                    # The lines the clients sent (except NICK / USER)
+        self.clients = 0                   # Connections still open
+
+class StandInClient(socketserver.StreamRequestHandler):
+    """ Registers the clients (001), refuses the taken nicks (433) & records the rest """
+
+    def handle(self):
+        self.server.clients += 1
+        try:
+            nick = None
+            for raw in self.rfile:
+                words = raw.decode("utf-8").rstrip("\r\n").split(" ")
+                if self.server.silent:
+                    continue
+                if words[0] == "NICK":
+                    if words[1] in self.server.taken_nicks:
+                        self.wfile.write(f":irc.local 433 * {words[1]} :Nickname is already in use\r\n".encode("utf-8"))
+                    elif nick == None:
+                        nick = words[1]
+                        self.wfile.write(f":irc.local 001 {nick} :Welcome\r\n".encode("utf-8"))
+                elif words[0] != "USER":
+                    self.server.lines.append(" ".join(words))
+        finally:
+            self.server.clients -= 1
+
+@pytest.fixture
+def stand_in():
+    """ Returns a function starting a stand-in server - returns the server """
+    servers = []
+    def start(**options):
+        server = StandInServer(**options)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+class PoolLoop:
+    """ A PuppetPool with a reactor & call_in_loop -queue, driven from the test's thread like the IRCLoop does """
+
+    def __init__(self, servers, **pool_settings):
+        self.reactor = irc.client.Reactor()
+        self.calls = collections.deque()
+        self.fallbacks = []
+        settings = {"puppets": True, "connect_timeout": 2}
+        settings.update(pool_settings)
+        self.pool = puppets.PuppetPool(self.reactor, lambda: servers, settings, self.call_in_loop,
+                                       lambda channel, line: self.fallbacks.append((channel, line)), lambda text: None)
+
+    def call_in_loop(self, target, *arguments):
+        self.calls.append((target, arguments))
+
+    def run_until(self, done, timeout=10):
+        """ Run the loop until done() - returns False on a timeout """
+        deadline = time.monotonic() + timeout
+        while not done():
+            if time.monotonic() > deadline:
+                return False
+            self.reactor.process_once(0.02)
+            while self.calls:
+                target, arguments = self.calls.popleft()
+                target(*arguments)
+            self.pool.flush()
+        return True
+
+def test_make_nick():
+    pool = PoolLoop([]).pool
+    assert pool.make_nick("Alice") == "Alice[d]"
+    assert pool.make_nick("Bob Smith") == "BobSmi[d]" # within the default NICKLEN 9
+    assert pool.make_nick("123ääkkönen") == "kknen[d]"
+    assert pool.make_nick("ää") == "discor[d]"
+    assert pool.make_nick("Alice", 2) == "Alice[d]2"
+    pool.set_nicklen("30")
+    assert pool.make_nick("Bob Smith") == "BobSmith[d]"
+
+def test_disabled_and_full(timer_thread):
+    assert not PoolLoop([], puppets=False).pool.send("1", "a", CHANNEL, "hi", "[R] <a> hi")
+    loop = PoolLoop([("127.0.0.1", 1)], puppet_max=1)
+    assert loop.pool.send("1", "a", CHANNEL, "hi", "[R] <a> hi")
+    assert not loop.pool.send("2", "b", CHANNEL, "hi", "[R] <b> hi") # pool full: through the bot
+    loop.pool.shutdown("done")
+
+def test_send_through_puppet(timer_thread, stand_in):
+    server = stand_in(taken_nicks={"alice[d]"})
+    loop = PoolLoop([server.server_address])
+    assert loop.pool.send("1", "alice", CHANNEL, "hello world", "[R] <alice> hello world")
+    assert loop.run_until(lambda: f"PRIVMSG {CHANNEL} :hello world" in server.lines)
+    assert server.lines[0] == f"JOIN {CHANNEL}"
+    puppet = loop.pool.puppets["1"]
+    assert puppet.ready and puppet.nick == "alice[d]1"
+    assert loop.pool.is_puppet("alice[d]1")
+    assert loop.fallbacks == []
+
+    loop.pool.shutdown("bye")
+    assert loop.run_until(lambda: server.clients == 0)
+    assert server.lines[-1] == "QUIT :bye"
+    assert loop.reactor.connections == []
+
+def test_connect_failed_falls_back(timer_thread):
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    address = closed.getsockname()
+    closed.close()
+    loop = PoolLoop([address])
+    loop.pool.send("1", "alice", CHANNEL, "hi", "[R] <alice> hi")
+    assert loop.run_until(lambda: loop.fallbacks)
+    assert loop.fallbacks == [(CHANNEL, "[R] <alice> hi")]
+    assert loop.pool.puppets == {} and loop.reactor.connections == []
+
+def test_register_timeout_falls_back(timer_thread, stand_in):
+    server = stand_in(silent=True)
+    loop = PoolLoop([server.server_address], puppet_register_timeout=0.3)
+    loop.pool.send("1", "alice", CHANNEL, "hi", "[R] <alice> hi")
+    assert loop.run_until(lambda: loop.fallbacks)
+    assert loop.fallbacks == [(CHANNEL, "[R] <alice> hi")]
+    assert loop.pool.puppets == {} and loop.reactor.connections == []
+    assert loop.run_until(lambda: server.clients == 0) # the socket was closed
+
+def test_reap_idle(timer_thread, stand_in):
+    server = stand_in()
+    loop = PoolLoop([server.server_address], puppet_idle_timeout=60)
+    loop.pool.send("1", "alice", CHANNEL, "hi", "")
+    loop.pool.send("2", "bob", CHANNEL, "hi", "")
+    assert loop.run_until(lambda: len(server.lines) == 4)
+    loop.pool.puppets["1"].last_active = clock.now() - 61
+    loop.pool.reap_idle()
+    assert list(loop.pool.puppets) == ["2"]
+    loop.pool.shutdown("done")
@@ -0,0 +1,153 @@
+"""
+# timers tests
+- Run on a SimulatedClock, without the timer thread (check_timers) - and once with it
+- Both the heap -only and the timing wheel -mode
+"""
+import threading
+
+import pytest
+
+import clock
+import timers
+
+@pytest.fixture(params=[0, 1], ids=["heap", "wheel"])
+def simulated(request):
+    """ Fresh timers on a SimulatedClock - returns the clock """
+    timers.set_thread_lock(threading.Lock())
+    timers.use_timing_wheel = request.param
+    sim = clock.SimulatedClock(1000.0)
+    clock.set_clock(sim)
+    with timers.condition:
+        for timer in list(timers.timers.values()):
+            timers.remove_timer(timer)
+        timers.timer_heap.clear()
+        timers.cancelled_in_heap = 0
+        timers.wheel = None
+    yield sim
+    with timers.condition:
+        for timer in list(timers.timers.values()):
+            timers.remove_timer(timer)
+    clock.set_clock(clock.RealClock())
+    timers.use_timing_wheel = 0
+
+def test_fire_in_due_order(simulated):
+    fired = []
+    timers.add_timer("", 0.3, fired.append, "c")
+    timers.add_timer("", 0.1, fired.append, "a")
+    timers.add_timer("", 0.2, fired.append, "b")
+    timers.add_timer("", 0.2, fired.append, "b2") # same due time: in the order added
+    simulated.advance(1)
+    timers.check_timers()
+    assert fired == ["a", "b", "b2", "c"]
+
+def test_never_fires_early(simulated):
+    fired = []
+    timers.add_timer("", 0.125, fired.append, 1)
+    simulated.advance(0.12)
+    timers.check_timers()
+    assert fired == []
+    # The heap fires right at the due time, the wheel on its first tick at or after it
+    simulated.advance(0.005)
+    timers.check_timers()
+    if not timers.use_timing_wheel:
+        assert fired == [1]
+    simulated.advance(timers.WHEEL_TICK)
+    timers.check_timers()
+    assert fired == [1]
+
+def test_wheel_exact_tick(simulated):
+    """ A timer due right on a tick fires on that tick, also when the clock is set right to it """
+    fired = []
+    timers.add_timer("", 0.5, fired.append, 1)
+    simulated.set_time(1000.5)
+    timers.check_timers()
+    assert fired == [1]
+
+def test_long_delays(simulated):
+    fired = []
+    timers.add_timer("", 3.0, fired.append, "outer")
+    timers.add_timer("", 600.0, fired.append, "heap")
+    if timers.use_timing_wheel:
+        assert timers.timers["ID#" + str(timers.unnamed_index - 1)].wheel_tick == None
+    simulated.advance(2.99)
+    timers.check_timers()
+    assert fired == []
+    simulated.advance(0.02)
+    timers.check_timers()
+    assert fired == ["outer"]
+    simulated.advance(600)
+    timers.check_timers()
+    assert fired == ["outer", "heap"]
+
+def test_cancel(simulated):
+    fired = []
+    handle = timers.add_timer("", 0.1, fired.append, "handle")
+    timers.add_timer("named", 0.1, fired.append, "named")
+    assert handle.cancel()
+    assert not handle.cancel()
+    timers.cancel_timer("named")
+    with pytest.raises(Exception):
+        timers.cancel_timer("named")
+    simulated.advance(1)
+    timers.check_timers()
+    assert fired == []
+    assert timers.timers == {}
+
+def test_duplicate_name(simulated):
+    timers.add_timer("join-#a", 1, lambda: None)
+    with pytest.raises(Exception):
+        timers.add_timer("join-#a", 1, lambda: None)
+
+def test_name_reusable_after_firing(simulated):
+    fired = []
+    timers.add_timer("name", 0.1, fired.append, 1)
+    simulated.advance(0.2)
+    timers.check_timers()
+    timers.add_timer("name", 0.1, fired.append, 2)
+    simulated.advance(0.2)
+    timers.check_timers()
+    assert fired == [1, 2]
+
+def test_bad_arguments(simulated):
+    with pytest.raises(TypeError):
+        timers.add_timer("", "1", lambda: None)
+    with pytest.raises(ValueError):
+        timers.add_timer("", 1, lambda: None, executor="gpu")
+
+def test_timer_family():
+    assert timers.get_timer_family("ID#123") == "ID#*"
+    assert timers.get_timer_family("join-#channel") == "join-*"
+    assert timers.get_timer_family("set_status") == "set_status"
+
+def test_histogram():
+    histogram = timers.Histogram()
+    for value in (0.0005, 0.002, 0.02, 20.0):
+        histogram.add(value)
+    assert histogram.count == 4
+    assert histogram.max == 20.0
+    assert histogram.get_percentile(50) == 0.0025
+    assert histogram.get_percentile(100) == 20.0
+
+def test_timer_thread(simulated):
+    """ The timer thread wakes up on every advance - no missed timers """
+    fired = threading.Semaphore(0)
+    thread = threading.Thread(target=timers.run, daemon=True)
+    thread.start()
+    try:
+        for i in range(200):
+            timers.add_timer("", 0.05, fired.release)
+            simulated.advance(0.05)
+            assert fired.acquire(timeout=5), f"timer {i} did not fire"
+    finally:
+        timers.shutdown_timers()
+        thread.join(5)
+
+def test_io_pool(simulated):
+    """ EXEC_IO -targets run on the I/O pool, not on the calling thread """
+    ran_on = []
+    done = threading.Event()
+    timers.add_timer("", 0.1, lambda: (ran_on.append(threading.current_thread().name), done.set()), executor=timers.EXEC_IO)
+    simulated.advance(1)
+    timers.check_timers()
+    assert done.wait(5)
+    assert ran_on[0].startswith("timers-io")
@@ -1,8 +1,293 @@
+import bisect
+import heapq
+import itertools
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+import clock
+
+# Execution classes for the timer targets
+EXEC_INLINE = "inline" # Run on the timer thread itself - for cheap & quick targets (message sends etc.)
+EXEC_IO = "io"         # Run on the I/O pool - for blocking targets (http-requests etc.)
+EXEC_CPU = "cpu"       # Run on the CPU pool - for heavier processing
+EXEC_CONNECT = "connect" # Run on the connect pool - the TCP-connects of the IRC (re)connections, never stuck behind slow I/O -jobs
 
 is_running = 0
-timers = {}
+timers = {}                       # Name -> Timer handle, for the name based add/cancel API
+timer_heap = []                   # Min-heap of (due time, sequence, Timer) -entries
 unnamed_index = 0
+cancelled_in_heap = 0             # Cancelled entries still sitting in the heap (lazily removed)
+sequence = itertools.count()      # Tie-breaker for timers with the same due time (keeps FIFO order)
+condition = threading.Condition() # Guards the timers & heap, wakes the timer thread on new/earlier timers
+
+wake_time = 0                     # When the sleeping timer thread wakes up next (None = only when notified)
+
+# Timing wheel -mode (opt-in): short delays go to the timing wheel, long ones to the heap
+# - The trade-off (benchmarks/bench_timers.py): the wheel expires ~25-30 % faster than the heap, but inserts & cancels
+#   are slower than with the heap (both are slower than a plain dict on those) - and it fires up to a tick (10 ms) late
+# - Worth it only with very many short timers that mostly expire; the bridge's timers are few, so the heap is the default
+use_timing_wheel = 0
+wheel = None                       # The TimingWheel, created on the first short timer
+
+# Timing wheel sizes: 10 ms ticks, inner wheel spans 2.56 s, outer wheel ~164 s (longer delays use the heap)
+WHEEL_TICK = 0.01
+WHEEL_SLOTS = 256
+WHEEL_OUTER_SLOTS = 64
+
+# Instrumentation: lateness & callback duration histograms + pending counts per timer family
+HISTOGRAM_BOUNDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # seconds
+stats_log_interval = 600           # Seconds between the stats summaries on the console log (0 = no summaries)
+family_stats = {}                  # Timer family -> TimerFamilyStats
+stats_lock = threading.Lock()      # Guards the histograms (pool threads record too)
+
+executor_limits = {                # Execution class -> (max worker threads, max jobs queued or running)
+    EXEC_IO: (4, 32),
+    EXEC_CPU: (2, 16),
+    EXEC_CONNECT: (8, 256),        # (a race has an attempt per server: the bot & every puppet reconnecting at once still fit)
+}
+executors = {}                     # Execution class -> (ThreadPoolExecutor, BoundedSemaphore), created on first use
+executors_lock = threading.Lock()
+
+class Timer:
+    """
+    # Timer handle
+    - Returned by add_timer()
+    - Holds the due time, target function & args of one scheduled timer
+    - Call .cancel() to stop the timer from running its target function
+    """
+    __slots__ = ("name", "family", "time", "target", "arguments", "executor", "cancelled", "sequence", "wheel_tick")
+
+    def __init__(self, name, due_time, target, arguments, executor=EXEC_INLINE, family=None):
+        self.name = name
+        self.family = family if family != None else get_timer_family(name)
+        self.time = due_time
+        self.target = target
+        self.arguments = arguments
+        self.executor = executor
+        self.cancelled = False
+        self.sequence = next(sequence)
+        self.wheel_tick = None # Due tick when held by the timing wheel, None when in the heap
+
+    def cancel(self):
+        """ Cancel this timer - returns False if it was already finished or cancelled """
+        with condition:
+            return remove_timer(self)
+
+class TimingWheel:
+    """
+    # Timing Wheel
+    - Hierarchical (two level) timing wheel for the short timers
+    - O(1) insert, cancel & expire - flood of message-part / send-delay timers stays cheap
+    - Inner wheel: one slot per WHEEL_TICK, outer wheel: one slot per full inner wheel turn
+    - Outer slots are cascaded down to the inner wheel when the inner wheel comes around
+    - Timers are fired at most one tick (10 ms) late
+    """
+
+    def __init__(self, currtime):
+        self.current_tick = int(currtime / WHEEL_TICK) # Next tick to be processed
+        self.inner = [[] for i in range(WHEEL_SLOTS)]
+        self.outer = [[] for i in range(WHEEL_OUTER_SLOTS)]
+        self.count = 0                                  # Live (not cancelled) timers in the wheel
+
+    def insert(self, timer):
+        """
+        # Insert
+        - Put the timer to its inner or outer slot
+        - returns False (without inserting) if the due time is beyond the wheels' span - the timer belongs to the heap
+        - Kept to plain arithmetic, this runs for every message-part timer
+        """
+        # The first tick at or after the due time: never before it, at most one tick late (no ceil / max calls)
+        due_tick = int(timer.time / WHEEL_TICK)
+        if due_tick * WHEEL_TICK < timer.time:
+            due_tick += 1
+        current_tick = self.current_tick
+        if due_tick - current_tick < WHEEL_SLOTS:
+            if due_tick < current_tick:
+                due_tick = current_tick
+            self.inner[due_tick % WHEEL_SLOTS].append(timer)
+        elif due_tick // WHEEL_SLOTS - current_tick // WHEEL_SLOTS < WHEEL_OUTER_SLOTS:
+            self.outer[(due_tick // WHEEL_SLOTS) % WHEEL_OUTER_SLOTS].append(timer)
+        else:
+            return False
+        timer.wheel_tick = due_tick
+        self.count += 1
+        return True
+
+    def cascade(self, block):
+        """ Move the timers of an outer slot down to the inner wheel, as the inner wheel reaches their block """
+        index = block % WHEEL_OUTER_SLOTS
+        slot = self.outer[index]
+        if slot:
+            self.outer[index] = []
+            for timer in slot:
+                if not timer.cancelled:
+                    self.inner[timer.wheel_tick % WHEEL_SLOTS].append(timer)
+
+    def advance(self, currtime, due_timers):
+        """
+        # Advance the wheel
+        - Process all the ticks up to the current time
+        - Append the finished (not cancelled) timers to due_timers
+        """
+        target_tick = int(currtime / WHEEL_TICK + 1e-6) # (float slack, so a wake-up right at a tick boundary finds its tick)
+        while self.count > 0 and self.current_tick <= target_tick:
+            tick = self.current_tick
+            if tick % WHEEL_SLOTS == 0:
+                self.cascade(tick // WHEEL_SLOTS)
+            index = tick % WHEEL_SLOTS
+            slot = self.inner[index]
+            if slot:
+                self.inner[index] = []
+                for timer in slot:
+                    if not timer.cancelled:
+                        self.count -= 1
+                        due_timers.append(timer)
+            self.current_tick += 1
+
+        # Empty wheel - jump straight to the current time
+        if self.count == 0 and self.current_tick <= target_tick:
+            self.current_tick = target_tick + 1
+
+    def get_next_expiry(self):
+        """ Returns the time when the wheel next has work to do (a filled slot or a cascade) - or None if empty """
+        if self.count == 0:
+            return None
+        for tick in range(self.current_tick, self.current_tick + WHEEL_SLOTS):
+            if tick % WHEEL_SLOTS == 0 and self.outer[(tick // WHEEL_SLOTS) % WHEEL_OUTER_SLOTS]:
+                return tick * WHEEL_TICK
+            if self.inner[tick % WHEEL_SLOTS]:
+                return tick * WHEEL_TICK
+        first_block = self.current_tick // WHEEL_SLOTS + 1
+        for block in range(first_block, first_block + WHEEL_OUTER_SLOTS):
+            if self.outer[block % WHEEL_OUTER_SLOTS]:
+                return block * WHEEL_SLOTS * WHEEL_TICK
+        return None
+
+class Histogram:
+    """
+    # Histogram
+    - Counts of recorded values (seconds) in the HISTOGRAM_BOUNDS -buckets
+    - Keeps also the sum & max for mean / max reporting
+    """
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS) + 1) # The last bucket is for values over the last bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        """ Record a value to its bucket """
+        self.counts[bisect.bisect_left(HISTOGRAM_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def get_percentile(self, percentile):
+        """ Returns the upper bound of the bucket where the given percentile (0-100) falls (or the max, for the last bucket) """
+        if self.count == 0:
+            return 0.0
+        needed = self.count * percentile / 100
+        cumulative = 0
+        for i in range(len(HISTOGRAM_BOUNDS)):
+            cumulative += self.counts[i]
+            if cumulative >= needed:
+                return min(HISTOGRAM_BOUNDS[i], self.max)
+        return self.max
+
+    def as_dict(self):
+        """ Returns the histogram as plain dictionary (buckets keyed by their upper bounds) """
+        buckets = {f"<={bound}": self.counts[i] for i, bound in enumerate(HISTOGRAM_BOUNDS)}
+        buckets[f">{HISTOGRAM_BOUNDS[-1]}"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.get_percentile(50),
+            "p90": self.get_percentile(90),
+            "p99": self.get_percentile(99),
+            "buckets": buckets,
+        }
+
+class TimerFamilyStats:
+    """ Utility data struct for the instrumentation of one timer family """
+    __slots__ = ("pending", "max_pending", "lateness", "duration")
+
+    def __init__(self):
+        self.pending = 0              # Scheduled & not yet fired/cancelled (updated with the condition held)
+        self.max_pending = 0
+        self.lateness = Histogram()   # Actual - scheduled run time of the target
+        self.duration = Histogram()   # Wall time of the target function
+
+def get_timer_family(name):
+    """
+    # Get Timer Family
+    - Group the timer names for the stats: 'ID#123' -> 'ID#*', 'join-#channel' -> 'join-*'
+    - Other names are their own family ('set_status', 'keep-botnick' ...)
+    """
+    if name.startswith("ID#"):
+        return "ID#*"
+    channel_at = name.find("-#")
+    if channel_at != -1:
+        return f"{name[:channel_at]}-*"
+    return name
+
+def get_family_stats(family):
+    """ Returns the TimerFamilyStats of the family - creating it on first use """
+    stats = family_stats.get(family)
+    if stats == None:
+        with stats_lock:
+            stats = family_stats.setdefault(family, TimerFamilyStats())
+    return stats
+
+def get_timer_stats(reset=False):
+    """
+    # Get Timer Stats
+    - Returns the instrumentation per timer family as dictionary:
+    -- pending / max_pending timers, lateness & callback duration histograms
+    - Also the total amount of pending timers under "pending_total"
+    - @param reset : clear the histograms & max_pending after reading them
+    """
+    result = {}
+    pending_total = 0
+    with stats_lock:
+        for family, stats in sorted(family_stats.items()):
+            result[family] = {
+                "pending": stats.pending,
+                "max_pending": stats.max_pending,
+                "lateness": stats.lateness.as_dict(),
+                "duration": stats.duration.as_dict(),
+            }
+            pending_total += stats.pending
+            if reset:
+                stats.max_pending = stats.pending
+                stats.lateness = Histogram()
+                stats.duration = Histogram()
+    return {"pending_total": pending_total, "families": result}
+
+def log_timer_stats():
+    """
+    # Log Timer Stats
+    - Print a summary of the timer stats (since the last summary) on the console log
+    - Self-repeating loop, every stats_log_interval seconds
+    """
+    stats = get_timer_stats(reset=True)
+    lines = [f"[TIMERS] Stats - pending timers: {stats['pending_total']}"]
+    for family, fstats in stats["families"].items():
+        late = fstats["lateness"]
+        dur = fstats["duration"]
+        if late["count"] == 0 and fstats["pending"] == 0:
+            continue
+        lines.append(f"[TIMERS]  {family}: fired {late['count']}, pending {fstats['pending']} (max {fstats['max_pending']})"
+                     f" | late ms p50 {late['p50']*1000:.1f} p99 {late['p99']*1000:.1f} max {late['max']*1000:.1f}"
+                     f" | run ms p50 {dur['p50']*1000:.1f} p99 {dur['p99']*1000:.1f} max {dur['max']*1000:.1f}")
+    with thread_lock:
+        print("\n".join(lines))
+
+    if stats_log_interval > 0 and is_running:
+        add_timer("timer-stats", stats_log_interval, log_timer_stats)
 
 def set_thread_lock(lock):
     """ Sets the global thread_lock -variable from given param """
@@ -10,10 +295,10 @@ def set_thread_lock(lock):
     thread_lock = lock
 
 def run():
-    """ 
+    """
     # Run Timers
     - Timers should run / loop in separate thread loop
-    - Advance the timers 
+    - Sleep until the next timer is due (or until an earlier timer is added)
     - Process the finished timers' target functions & args
     """
     global is_running
@@ -23,84 +308,289 @@ def run():
     with thread_lock:
         print(f"[TIMERS] : Starting timer loop")
 
+    # A simulated clock wakes the timer thread whenever it is moved (registered before any time is read)
+    clock.watch(condition)
+
+    # Start the periodic stats summaries
+    if stats_log_interval > 0 and "timer-stats" not in timers:
+        add_timer("timer-stats", stats_log_interval, log_timer_stats)
+
+    global wake_time
     while is_running:
         try:
-            check_timers()
-            time.sleep(0.1)
+            with condition:
+                due_timers = pop_due_timers(clock.now())
+                if not due_timers:
+                    currtime = clock.now()
+                    wait_time = get_wait_time(currtime)
+                    wake_time = None if wait_time == None else currtime + wait_time
+                    clock.wait(condition, wait_time)
+                    wake_time = 0
+                    continue
+            run_targets(due_timers)
         except Exception as e:
             with thread_lock:
                 print(f"[TIMERS] : Caught an error: {e}")
 
 def shutdown_timers():
-    """ 
+    """
     # Shutdown Timers
-    - Stop running the timer loop 
+    - Stop running the timer loop
     """
     global is_running
     is_running = 0
+    with condition:
+        condition.notify_all()
+
+    # Stop the pools - drop the jobs that have not started yet
+    with executors_lock:
+        for pool, slots in executors.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        executors.clear()
 
 def check_timers():
-    """ 
+    """
     # Check Timers
-    - Advance the timers 
-    - Run their function with args, if Finished 
+    - Run the function with args of every finished timer
+    - (The timer loop does this by itself, call only if running timers without the loop)
+    """
+    with condition:
+        due_timers = pop_due_timers(clock.now())
+    run_targets(due_timers)
+
+def pop_due_timers(currtime):
+    """
+    # Pop Due Timers
+    - Pop the finished timers from the timing wheel & heap (call with the condition held)
+    - returns the list of finished timers in their due order
+    """
+    global cancelled_in_heap
+    due_timers = []
+    if wheel != None:
+        wheel.advance(currtime, due_timers)
+    while timer_heap and timer_heap[0][0] <= currtime:
+        timer = heapq.heappop(timer_heap)[2]
+        if timer.cancelled:
+            cancelled_in_heap -= 1
+            continue
+        due_timers.append(timer)
+
+    for timer in due_timers:
+        timers.pop(timer.name, None)
+        get_family_stats(timer.family).pending -= 1
+    if len(due_timers) > 1:
+        due_timers.sort(key=lambda timer: (timer.time, timer.sequence))
+    return due_timers
+
+def get_wait_time(currtime):
+    """ Returns the seconds until the next timer is due - or None (= wait until notified) if there are no timers """
+    next_times = []
+    if timer_heap:
+        next_times.append(timer_heap[0][0])
+    if wheel != None and wheel.count > 0:
+        next_times.append(wheel.get_next_expiry())
+    if not next_times:
+        return None
+    return max(min(next_times) - currtime, 0)
+
+def run_targets(due_timers):
+    """
+    # Run Targets
+    - Run the target functions of the given finished timers (outside of the timer condition)
+    - Inline timers run right here on the timer thread, others are handed to their pool
+    """
+    for timer in due_timers:
+        if timer.executor == EXEC_INLINE:
+            run_target(timer)
+        else:
+            submit_to_pool(timer)
+
+def run_target(timer):
+    """ Run the target function with args of a single timer - catch & print its errors, record its lateness & duration """
+    started = clock.now()
+    run_begin = time.perf_counter()
+    try:
+        if timer.arguments != None:
+            timer.target(*timer.arguments)
+        else:
+            timer.target()
+    except Exception as e:
+        with thread_lock:
+            print(f"[TIMERS] : Caught an error from timer {timer.name}: {e}")
+
+    stats = get_family_stats(timer.family)
+    with stats_lock:
+        stats.lateness.add(max(started - timer.time, 0.0))
+        stats.duration.add(time.perf_counter() - run_begin)
+
+def get_executor(executor):
+    """ Returns the (pool, job slots) -pair of the execution class - creating the bounded pool on first use """
+    with executors_lock:
+        if executor not in executors:
+            max_workers, max_jobs = executor_limits[executor]
+            pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"timers-{executor}")
+            executors[executor] = (pool, threading.BoundedSemaphore(max_jobs))
+        return executors[executor]
+
+def submit_to_pool(timer):
+    """
+    # Submit to Pool
+    - Hand the timer's target to its execution class' thread pool
+    - If the pool already has its max amount of jobs queued, the timer is dropped
+      (instead of letting a pile of slow jobs grow without limits)
+    """
+    pool, slots = get_executor(timer.executor)
+    if not slots.acquire(blocking=False):
+        with thread_lock:
+            print(f"[TIMERS] : {timer.executor} -pool is full, dropping timer {timer.name}")
+        return
+
+    def run_and_release():
+        try:
+            run_target(timer)
+        finally:
+            slots.release()
+
+    try:
+        pool.submit(run_and_release)
+    except RuntimeError: # Pool was shut down
+        slots.release()
+
+def remove_timer(timer):
+    """
+    # Remove Timer
+    - Mark the timer cancelled & forget its name (call with the condition held)
+    - The heap entry is dropped lazily when it comes up, or when too many cancelled entries pile up
+    """
+    global timer_heap
+    global cancelled_in_heap
+    if timer.cancelled or timers.get(timer.name) is not timer:
+        return False
+    timer.cancelled = True
+    timers.pop(timer.name)
+    get_family_stats(timer.family).pending -= 1
+    if timer.wheel_tick != None:
+        wheel.count -= 1
+        return True
+    cancelled_in_heap += 1
+
+    # Compact the heap if it is mostly cancelled timers
+    if cancelled_in_heap > 64 and cancelled_in_heap * 2 > len(timer_heap):
+        timer_heap = [entry for entry in timer_heap if not entry[2].cancelled]
+        heapq.heapify(timer_heap)
+        cancelled_in_heap = 0
+    return True
+
+def add_timer(name, delay, target, *arguments, executor=EXEC_INLINE):
     """
-    global timers
-    for i in timers.copy():
-        timer = timers[i]
-        timertime = timer["time"]
-        currtime = time.time()
-
-        if currtime >= timertime:
-            target = timer["target"]
-            arguments = timer["arguments"]
-            timers.pop(i)
-
-            if arguments != None:
-                target(*arguments)
-            else:
-                target()
-
-def add_timer(name, delay, target, *arguments):
-    """ 
     # Add Timer
     - @param name for the timer
     - @param delay time for timer
     - @param target function to run once finished
     - @param args / params to run the target function with
+    - @param executor (keyword) execution class to run the target on: EXEC_INLINE / EXEC_IO / EXEC_CPU
+    - returns the Timer handle (which can be cancelled)
     """
     global timers
-    
-    currtime = time.time()
-    if name == "":
-        global unnamed_index
-        name = f"ID#{str(unnamed_index)}"
-        unnamed_index += 1
-        #name = str(currtime)
-
-    if name in timers:
+
+    if executor != EXEC_INLINE and executor not in executor_limits:
         with thread_lock:
-            print(f"[TIMERS] a timer with this name already exists: {name}")
-        raise Exception(f"[TIMERS] a timer with this name already exists: {name}")
-    
+            print(f"[TIMERS] unknown execution class for timer {name}: {executor}")
+        raise ValueError(f"[TIMERS] unknown execution class for timer {name}: {executor}")
+
     if type(delay) != int and type(delay) != float:
         with thread_lock:
             print(f"[TIMERS] delay argument is expected to be int or float :{delay}")
         raise TypeError(f"[TIMERS] delay argument is expected to be int or float:{delay}")
-    
-    timetodo = currtime + float(delay)
-    timers[name] = {"time": timetodo, "target": target, "arguments": arguments}
+
+    with condition:
+        currtime = clock.now()
+        family = None
+        if name == "":
+            global unnamed_index
+            name = f"ID#{unnamed_index}"
+            family = "ID#*" # (no need to work out the family of the unnamed timers)
+            unnamed_index += 1
+
+        name_in_use = name in timers
+        if not name_in_use:
+            timer = Timer(name, currtime + delay, target, arguments, executor, family)
+            timers[name] = timer
+            schedule(timer, currtime)
+            stats = get_family_stats(timer.family)
+            stats.pending += 1
+            if stats.pending > stats.max_pending:
+                stats.max_pending = stats.pending
+
+    # Print & raise outside of the condition, the thread_lock may be held by the caller
+    if name_in_use:
+        with thread_lock:
+            print(f"[TIMERS] a timer with this name already exists: {name}")
+        raise Exception(f"[TIMERS] a timer with this name already exists: {name}")
+    return timer
+
+def schedule(timer, currtime):
+    """
+    # Schedule
+    - Put the timer to the timing wheel (short delays) or to the heap (long delays) (call with the condition held)
+    - Wake the timer thread only if the new timer is due before the time it is sleeping until
+    """
+    global wheel
+    global wake_time
+
+    if use_timing_wheel:
+        if wheel == None:
+            wheel = TimingWheel(currtime)
+        elif wheel.count == 0:
+            wheel.current_tick = max(wheel.current_tick, int(currtime / WHEEL_TICK)) # Idle wheel catches up to the current time
+        if wheel.insert(timer):
+            due_time = timer.wheel_tick * WHEEL_TICK
+        else:
+            heapq.heappush(timer_heap, (timer.time, timer.sequence, timer))
+            due_time = timer.time
+    else:
+        heapq.heappush(timer_heap, (timer.time, timer.sequence, timer))
+        due_time = timer.time
+
+    if wake_time == None or due_time < wake_time:
+        wake_time = due_time
+        condition.notify()
+
+def on_clock_changed(old_clock, new_clock):
+    """
+    # On Clock Changed
+    - Re-schedule the pending timers (with their remaining delays) on the new clock
+    - The timing wheel is rebuilt, as its ticks are counted on the old clock's time
+    """
+    global wheel
+    global timer_heap
+    global cancelled_in_heap
+    global wake_time
+    new_clock.watch(condition)
+    with condition:
+        old_time = old_clock.time()
+        currtime = new_clock.time()
+        wheel = None
+        timer_heap = []
+        cancelled_in_heap = 0
+        wake_time = 0
+        for timer in timers.values():
+            timer.time = currtime + max(timer.time - old_time, 0)
+            timer.wheel_tick = None
+            schedule(timer, currtime)
+        condition.notify_all()
+
+clock.add_clock_listener(on_clock_changed)
 
 def cancel_timer(name):
-    """ 
+    """
     # Cancel Timer
     - Remove the timer object
     - so it does not run its target function & args
     """
-    global timers
-    if name in timers:
-        timers.pop(name)
-    else:
+    with condition:
+        found = name in timers and remove_timer(timers[name])
+    if not found:
         with thread_lock:
             print(f"[TIMERS] No timer with name {name} found.")
         raise Exception(f"[TIMERS] No timer with name {name} found.")